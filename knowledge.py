@@ -69,6 +69,7 @@ By using Knowledge, you agree to abide by the conditions here.
         print("Thank you for choosing us, And welcome to Knowledge!\n")
 
 from library.auth import setup_selfsigned, setup_certbot_ssl, get_ssl_filepaths
+from contextlib import asynccontextmanager
 from fastapi.responses import HTMLResponse, PlainTextResponse
 from modules.browser.routes import show_apps as apps_route
 from modules.login.routes import show_login as login_route
@@ -83,9 +84,24 @@ import uvicorn
 import asyncio
 import secrets
 
-fastapi = FastAPI()
+# Route modules can define startup() for background work. Each one is run once, when the server starts.
+startup_hooks = []
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for hook in startup_hooks:
+        try:
+            hook()
+        except Exception as err:
+            logbook.error(f"[✗] Startup hook {hook.__module__}.{hook.__name__} failed: {err}", exception=err)
+    yield
+
+fastapi = FastAPI(lifespan=lifespan)
 if __name__ == "__main__":
     database.modernize()
+    # Files from before duplicate detection existed are indexed here, so no request has to do it
+    from modules.centralfiles.classes import centralfiles
+    centralfiles.duplicates.backfill()
 logbook = LogBookHandler('root')
 DEBUG = os.environ.get("DEBUG", "False").lower() == "true"
 
@@ -241,6 +257,8 @@ for root, dirs, files in os.walk(modules_dir):
                 fastapi.include_router(module.router)
                 loaded_routers.add(module_import_path)
                 logbook.info(f"[✓] Loaded router from {module_import_path}")
+                if hasattr(module, "startup"):
+                    startup_hooks.append(module.startup)
             else:
                 logbook.info(f"[!] No 'router' found in {module_import_path}")
         except Exception as err:
@@ -3,10 +3,12 @@ from cryptography.hazmat.primitives.asymmetric import rsa
 from library.logbook import LogBookHandler
 from fastapi import HTTPException, Request
 from cryptography.x509.oid import NameOID
-from library.authperms import AuthPerms
+from library.authperms import AuthPerms, valid_perms
 from library.settings import get, set
-from library.database import DB_PATH
+from library.database import database
+from collections import OrderedDict
 from cryptography import x509
+import threading
 import datetime
 import sqlite3
 import secrets
@@ -22,6 +24,12 @@ expiration_hours = 168  # 1 Week
 _login_attempts = {}
 arrested_ips = []
 
+# Resolved auth contexts keyed by token. Bounded LRU, entries live for at most auth_cache_ttl seconds.
+auth_cache_ttl = 60
+auth_cache_size = 1024
+_auth_cache = OrderedDict()
+_auth_cache_lock = threading.Lock()
+
 
 # -----------------------------
 # Utility Helpers
@@ -252,23 +260,166 @@ def setup_selfsigned():
 
     print("Warning: These certificates are self-signed. To get a trusted, free certificate, use cert bot.")
 
+# -----------------------------
+# Per-request Auth Context
+# -----------------------------
+class AuthContext:
+    """
+    Everything a route needs to know about the caller, resolved once per request.
+    """
+    def __init__(self, token, username=None, expires_at=None, arrested=False, is_admin=False, cfid=None, permissions=None):
+        self.token = token
+        self.username = username
+        self.expires_at = expires_at
+        self.arrested = arrested
+        self.is_admin = is_admin
+        self.cfid = cfid
+        self.permissions = permissions or {}
+
+    @property
+    def valid(self):
+        return self.username is not None
+
+    def copy(self):
+        """A copy with its own permissions dict, so a route changing it can't change the cached context."""
+        return AuthContext(
+            self.token, self.username, self.expires_at, self.arrested, self.is_admin, self.cfid, dict(self.permissions)
+        )
+
+def _auth_cache_get(token: str):
+    with _auth_cache_lock:
+        entry = _auth_cache.get(token)
+        if entry is None:
+            return None
+        context, cached_until = entry
+        if time.time() >= cached_until:
+            del _auth_cache[token]
+            return None
+        _auth_cache.move_to_end(token)
+        return context.copy()
+
+def _auth_cache_put(context: AuthContext):
+    cached_until = time.time() + auth_cache_ttl
+    # Never keep a session cached past its own expiry
+    try:
+        expires_at = datetime.datetime.fromisoformat(str(context.expires_at)).timestamp()
+        cached_until = min(cached_until, expires_at)
+    except (TypeError, ValueError):
+        pass
+
+    with _auth_cache_lock:
+        _auth_cache[context.token] = (context.copy(), cached_until)
+        _auth_cache.move_to_end(context.token)
+        while len(_auth_cache) > auth_cache_size:
+            _auth_cache.popitem(last=False)
+
+def invalidate_auth_cache(token: str = None, username: str = None):
+    """
+    Drops cached auth contexts for a token, for every token of a user, or everything if neither is given.
+    Call this after anything that changes what resolve_auth would return.
+    """
+    with _auth_cache_lock:
+        if token is None and username is None:
+            _auth_cache.clear()
+            return
+
+        stale = [
+            cached_token for cached_token, (context, _) in _auth_cache.items()
+            if cached_token == token or (username is not None and context.username == username)
+        ]
+        for cached_token in stale:
+            del _auth_cache[cached_token]
+
+def resolve_auth(token: str) -> AuthContext:
+    """
+    Resolves a token to its owner, arrest flag, admin flag, CFID and permissions in a single query.
+    """
+    if not token:
+        return AuthContext(None)
+
+    cached = _auth_cache_get(str(token))
+    if cached is not None:
+        return cached
+
+    try:
+        with database.read() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT s.username, s.expires_at, a.username, a.arrested, a.admin, c.cfid, p.permission, p.allowed
+                FROM user_sessions s
+                LEFT JOIN authbook a ON a.username = s.username
+                LEFT JOIN cf_staff_usernames c ON c.username = s.username
+                LEFT JOIN auth_permissions p ON p.username = s.username
+                WHERE s.token = ? AND s.expires_at > ?
+                AND NOT EXISTS (SELECT 1 FROM revoked_tokens r WHERE r.token = s.token)
+                """,
+                (str(token), datetime.datetime.now())
+            )
+            rows = cur.fetchall()
+    except sqlite3.Error as err:
+        logbook.error("Database error while resolving auth context", exception=err)
+        return AuthContext(token)
+
+    if not rows:
+        return AuthContext(token)
+
+    username, expires_at, account, arrested, is_admin, cfid = rows[0][:6]
+    is_admin = bool(is_admin)
+
+    permissions = {
+        perm: bool(allowed)
+        for *_, perm, allowed in rows
+        if perm in valid_perms
+    }
+    for valid_perm in valid_perms:
+        permissions.setdefault(valid_perm, is_admin)
+
+    context = AuthContext(
+        token=str(token),
+        username=username,
+        expires_at=expires_at,
+        # Sessions without an account behind them are treated as arrested, same as check_arrested.
+        arrested=bool(arrested) if account is not None else True,
+        is_admin=is_admin,
+        cfid=cfid,
+        permissions=permissions,
+    )
+    _auth_cache_put(context)
+    return context
+
+def get_auth_context(request: Request) -> AuthContext:
+    """
+    Resolves the caller's auth context once and keeps it on request.state.auth for the rest of the request.
+    Usable directly or as a FastAPI dependency.
+    """
+    context = getattr(request.state, "auth", None)
+    if context is None:
+        token = request.cookies.get("sessionKey") or request.headers.get("Authorization")
+        context = resolve_auth(token)
+        request.state.auth = context
+    return context
+
 # -----------------------------
 # Central Access Validator
 # -----------------------------
-def validate_access(token: str, path: str, ip=None, do_ip_ban=False):
+def validate_access(token: str, path: str, ip=None, do_ip_ban=False, context: AuthContext = None):
     if not token:
         return {"ok": False, "reason": "NO_TOKEN"}
 
-    username = authbook.token_owner(token)
+    if context is None or context.token != token:
+        context = resolve_auth(token)
+
+    username = context.username
     if not username:
         return {"ok": False, "reason": "INVALID_TOKEN"}
 
-    if authbook.check_arrested(username):
+    if context.arrested:
         if do_ip_ban:
             flag_ip(ip)
         return {"ok": False, "reason": "ARRESTED", "username": username}
 
-    if not AuthPerms.verify_user(username, path):
+    if not AuthPerms.verify_user(username, path, user_perms=context.permissions):
         return {"ok": False, "reason": "NO_PERMISSION", "username": username}
 
     return {"ok": True, "username": username}
@@ -278,13 +429,13 @@ def validate_access(token: str, path: str, ip=None, do_ip_ban=False):
 # Request Helpers
 # -----------------------------
 def route_prechecks(request: Request):
-    token = request.cookies.get("sessionKey") or request.headers.get("Authorization")
-    result = validate_access(token, request.url.path, request.client.host)
+    context = get_auth_context(request)
+    result = validate_access(context.token, request.url.path, request.client.host, context=context)
 
     if not result["ok"]:
         raise HTTPException(status_code=403, detail=result["reason"])
 
-    return token
+    return context.token
 
 
 def check_valid_login(token, url_target, client_ip, do_IP_ban: bool = False):
@@ -293,92 +444,93 @@ def check_valid_login(token, url_target, client_ip, do_IP_ban: bool = False):
 
 
 def get_user(request: Request):
-    token = request.cookies.get("sessionKey") or request.headers.get("Authorization")
-    if not token:
-        return {"token": None, "username": None}
-
-    username = authbook.token_owner(token)
-    return {"token": token, "username": username}
+    context = get_auth_context(request)
+    return {"token": context.token, "username": context.username}
 
 def __destroy_user_data(username: str):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    with database.write() as conn:
+        cur = conn.cursor()
 
-    try:
-        # Check they exist
-        cur.execute("SELECT username FROM authbook WHERE username = ?", (username,))
-        if not cur.fetchone():
-            print("User not found.")
-            return False
-
-        # Get CFID if they have one
-        cur.execute("SELECT cfid FROM cf_staff_usernames WHERE username = ?", (username,))
-        row = cur.fetchone()
-        cfid = row[0] if row else None
-
-        # Username based tables
-        username_tables = [
-            ("auth_permissions", "username"),
-            ("user_sessions", "username"),
-            ("bulletin_archives", "owner"),
-            ("finance_accounts", "owner"),
-            ("battleplans", "owner"),
-            ("bp_tasks", "owner"),
-            ("bp_quotas", "owner"),
-            ("odometer_entries", "user"),
-        ]
+        try:
+            # Check they exist
+            cur.execute("SELECT username FROM authbook WHERE username = ?", (username,))
+            if not cur.fetchone():
+                print("User not found.")
+                return False
 
-        for table, column in username_tables:
-            cur.execute(f"DELETE FROM {table} WHERE {column} = ?", (username,))
-
-        # CFID Based tables
-        if cfid is not None:
-            cfid_tables = [
-                "cf_names",
-                "cf_name_types",
-                "cf_ages",
-                "cf_pronouns",
-                "cf_profile_notes",
-                "cf_pc_contact_details",
-                "cf_is_dianetics_pc",
-                "cf_dn_stuck_case",
-                "cf_dn_control_case",
-                "cf_dn_shutoffs",
-                "cf_dn_fabricator_case",
-                "cf_dn_action_records",
-                "cf_tonescale_records",
-                "cf_pc_mind_class",
-                "cf_profile_images",
-                "cf_occupations",
-                "cf_dates_of_birth",
-                "cf_pc_theta_endowments",
-                "cf_pc_can_handle_life",
-                "cf_agreements",
-                "sessions_list",
-                "session_actions",
-                "session_engrams",
-                "cf_chem_assist",
-                "dn_schedule_data",
-                "dn_scheduling_data_repeating",
-                "cf_dynamic_strengths",
-                "CF_hubbard_chard_of_eval",
+            # Get CFID if they have one
+            cur.execute("SELECT cfid FROM cf_staff_usernames WHERE username = ?", (username,))
+            row = cur.fetchone()
+            cfid = row[0] if row else None
+
+            # Username based tables
+            username_tables = [
+                ("auth_permissions", "username"),
+                ("user_sessions", "username"),
+                ("bulletin_archives", "owner"),
+                ("finance_accounts", "owner"),
+                ("battleplans", "owner"),
+                ("bp_tasks", "owner"),
+                ("bp_quotas", "owner"),
+                ("odometer_entries", "user"),
             ]
 
-            for table in cfid_tables:
-                cur.execute(f"DELETE FROM {table} WHERE cfid = ?", (cfid,))
+            for table, column in username_tables:
+                cur.execute(f"DELETE FROM {table} WHERE {column} = ?", (username,))
+
+            # CFID Based tables
+            if cfid is not None:
+                cfid_tables = [
+                    "cf_names",
+                    "cf_name_types",
+                    "cf_ages",
+                    "cf_pronouns",
+                    "cf_profile_notes",
+                    "cf_pc_contact_details",
+                    "cf_is_dianetics_pc",
+                    "cf_dn_stuck_case",
+                    "cf_dn_control_case",
+                    "cf_dn_shutoffs",
+                    "cf_dn_fabricator_case",
+                    "cf_dn_action_records",
+                    "cf_tonescale_records",
+                    "cf_pc_mind_class",
+                    "cf_profile_images",
+                    "cf_profile_thumbnails",
+                    "cf_dupe_keys",
+                    "cf_name_trigrams",
+                    "cf_occupations",
+                    "cf_dates_of_birth",
+                    "cf_pc_theta_endowments",
+                    "cf_pc_can_handle_life",
+                    "cf_agreements",
+                    "sessions_list",
+                    "session_actions",
+                    "session_engrams",
+                    "cf_chem_assist",
+                    "dn_schedule_data",
+                    "dn_scheduling_data_repeating",
+                    "cf_dynamic_strengths",
+                    "CF_hubbard_chard_of_eval",
+                ]
+
+                for table in cfid_tables:
+                    cur.execute(f"DELETE FROM {table} WHERE cfid = ?", (cfid,))
+
+            # Remove auth records
+            cur.execute("DELETE FROM authbook WHERE username = ?", (username,))
+            cur.execute("DELETE FROM cf_staff_usernames WHERE username = ?", (username,))
 
-        # Remove auth records
-        cur.execute("DELETE FROM authbook WHERE username = ?", (username,))
-        cur.execute("DELETE FROM cf_staff_usernames WHERE username = ?", (username,))
-
-        conn.commit()
-        return True
-    except sqlite3.OperationalError as err:
-        conn.rollback()
-        logbook.error("Error deleting a user's data.", err)
-        return False
-    finally:
-        conn.close()
+            conn.commit()
+            invalidate_auth_cache(username=username)
+            if cfid is not None:
+                from modules.centralfiles.classes import profile_cache
+                database.after_commit(lambda: profile_cache.invalidate(cfid))
+            return True
+        except sqlite3.OperationalError as err:
+            conn.rollback()
+            logbook.error("Error deleting a user's data.", err)
+            return False
 
 # -----------------------------
 # Errors
@@ -430,7 +582,7 @@ class authbook:
                 pass
 
         def get_assosciated_cfid(self):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.read() as conn:
                 cur = conn.cursor()
                 cur.execute("SELECT cfid FROM cf_staff_usernames WHERE username = ?", (self.username,))
                 row = cur.fetchone()
@@ -447,7 +599,7 @@ class authbook:
 
         def get_is_admin(self):
             try:
-                with sqlite3.connect(DB_PATH) as conn:
+                with database.read() as conn:
                     cur = conn.cursor()
                     cur.execute(
                         "SELECT admin FROM authbook WHERE username = ?",
@@ -464,7 +616,7 @@ class authbook:
 
         def get_is_arrested(self):
             try:
-                with sqlite3.connect(DB_PATH) as conn:
+                with database.read() as conn:
                     cur = conn.cursor()
                     cur.execute(
                         "SELECT arrested FROM authbook WHERE username = ?",
@@ -488,7 +640,7 @@ class authbook:
 
         if cfid:
             try:
-                with sqlite3.connect(DB_PATH) as conn:
+                with database.read() as conn:
                     cur = conn.cursor()
                     cur.execute(
                         "SELECT username FROM cf_staff_usernames WHERE cfid = ?",
@@ -502,7 +654,7 @@ class authbook:
 
         if username:
             try:
-                with sqlite3.connect(DB_PATH) as conn:
+                with database.read() as conn:
                     cur = conn.cursor()
                     cur.execute(
                         "SELECT admin FROM authbook WHERE username = ?",
@@ -523,15 +675,13 @@ class authbook:
             is_admin = user_count == 0
 
         try:
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 cur = conn.cursor()
                 hashed = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode('utf-8')
                 cur.execute(
                     "INSERT INTO authbook (username, password, admin) VALUES (?, ?, ?)",
                     (username, hashed, is_admin),
                 )
-                conn.commit()
-                logbook.info(f"Account under the name {username} created")
 
                 if is_admin:
                     okay = AuthPerms.give_all_perms(username)
@@ -540,8 +690,14 @@ class authbook:
 
                 # Create a CF Entry for the staff member too
                 from modules.centralfiles.routes import centralfiles
-                centralfiles.add_name(alias=username, profile_type="individual", staff_username=username)
+                cfid = centralfiles.add_name(alias=username, profile_type="individual", staff_username=username)
+                if cfid is None:
+                    logbook.error(f"Could not create a CF entry for {username}, account creation rolled back")
+                    conn.rollback()
+                    return False
 
+                # Committed together with the perms and CF entry when the block ends
+                logbook.info(f"Account under the name {username} created")
                 return True
         except sqlite3.IntegrityError as err:
             logbook.info(f"Attempted creation of existing account: {username}")
@@ -552,30 +708,29 @@ class authbook:
 
     @staticmethod
     def token_owner(token: str):
+        return resolve_auth(token).username
+
+    @staticmethod
+    def revoke_token(token: str):
+        """
+        Revokes a session token. Takes effect immediately, including for cached sessions.
+        """
         try:
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 cur = conn.cursor()
-                cur.execute(
-                    "SELECT username FROM user_sessions WHERE token = ? AND expires_at > ? ORDER BY created_at DESC",
-                    (str(token), datetime.datetime.now())
-                )
-                row = cur.fetchone()
-                if not row:
-                    return None
-
-                cur.execute("SELECT 1 FROM revoked_tokens WHERE token = ?", (str(token),))
-                if cur.fetchone():
-                    return None
-
-                return row[0]
+                cur.execute("INSERT OR IGNORE INTO revoked_tokens (token) VALUES (?)", (str(token),))
+                conn.commit()
         except sqlite3.Error as err:
-            logbook.error("Database error in token_owner", exception=err)
-            return None
+            logbook.error("Database error revoking a token", exception=err)
+            return False
+        finally:
+            invalidate_auth_cache(token=str(token))
+        return True
 
     @staticmethod
     def is_user_admin(username):
         try:
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.read() as conn:
                 cur = conn.cursor()
                 cur.execute(
                     "SELECT admin FROM authbook WHERE username = ?",
@@ -599,7 +754,7 @@ class authbook:
     @staticmethod
     def check_arrested(username: str):
         try:
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.read() as conn:
                 cur = conn.cursor()
                 cur.execute("SELECT arrested FROM authbook WHERE username = ?", (username,))
                 row = cur.fetchone()
@@ -621,7 +776,7 @@ class authbook:
             return False
 
         try:
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 cur = conn.cursor()
                 cur.execute("SELECT password FROM authbook WHERE username = ?", (username,))
                 row = cur.fetchone()
@@ -647,7 +802,7 @@ class authbook:
     @staticmethod
     def list_users():
         try:
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.read() as conn:
                 cur = conn.cursor()
                 cur.execute("SELECT username, arrested, admin FROM authbook")
                 rows = cur.fetchall()
@@ -696,7 +851,7 @@ class UserLogin:
 
     def store_token(self, token: str):
         expires_at = datetime.datetime.now() + datetime.timedelta(hours=expiration_hours)
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.write() as conn:
             cur = conn.cursor()
             cur.execute(
                 "INSERT INTO user_sessions (username, token, created_at, expires_at) VALUES (?, ?, ?, ?)",
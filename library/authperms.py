@@ -1,6 +1,6 @@
 from library.settings import make_settings_file, SETTINGS_PATH
 from library.logbook import LogBookHandler
-from library.database import DB_PATH
+from library.database import database
 from fastapi import Request
 from functools import wraps
 import sqlite3
@@ -57,6 +57,11 @@ valid_perms = [
 _settings_write_lock = Lock()
 _registered_routes = set()
 
+# In-memory index of route_permissions. Built once from the table on first lookup and
+# dropped whenever set_permission writes a row, so lookups never touch the database.
+_route_index = None
+_route_index_lock = Lock()
+
 
 def lock_and_load_settings(path: str):
     if not os.path.exists(path):
@@ -111,6 +116,108 @@ def _normalize_path(path: str):
     return path
 
 
+class _RouteNode:
+    __slots__ = ("children", "patterns", "param", "perms")
+
+    def __init__(self):
+        self.children = {}  # Literal segment -> node
+        self.patterns = []  # (compiled segment regex, node) for segments like "file-{name}"
+        self.param = None   # Node for a whole-segment parameter like "{cfid}"
+        self.perms = None
+
+
+class _RouteIndex:
+    """
+    Segment trie over every parameterized route, plus a dict for the static ones.
+    Lookups are O(path segments) and all regexes are compiled once when the index is built.
+    """
+    def __init__(self, route_perms: dict):
+        self.exact = {}
+        self.root = _RouteNode()
+        for route, perms in route_perms.items():
+            self.add(route, perms)
+
+    def add(self, route: str, perms):
+        route = _normalize_path(route)
+        if "{" not in route:
+            self.exact[route] = perms
+            return
+
+        node = self.root
+        for segment in route.split("/")[1:]:
+            if re.fullmatch(r"\{[^/{}]+\}", segment):
+                if node.param is None:
+                    node.param = _RouteNode()
+                node = node.param
+            elif "{" in segment:
+                pattern = re.sub(r"\\\{[^/]+?\\\}", r"[^/]+", re.escape(segment))
+                for compiled, child in node.patterns:
+                    if compiled.pattern == pattern:
+                        node = child
+                        break
+                else:
+                    child = _RouteNode()
+                    node.patterns.append((re.compile(pattern), child))
+                    node = child
+            else:
+                node = node.children.setdefault(segment, _RouteNode())
+        node.perms = perms
+
+    def lookup(self, route: str):
+        if route in self.exact:
+            return self.exact[route]
+        return self._walk(self.root, route.split("/")[1:], 0)
+
+    def _walk(self, node, segments, pos):
+        if pos == len(segments):
+            return node.perms
+
+        segment = segments[pos]
+        child = node.children.get(segment)
+        if child is not None:
+            found = self._walk(child, segments, pos + 1)
+            if found is not None:
+                return found
+
+        if not segment:
+            return None
+
+        for compiled, child in node.patterns:
+            if compiled.fullmatch(segment):
+                found = self._walk(child, segments, pos + 1)
+                if found is not None:
+                    return found
+
+        if node.param is not None:
+            return self._walk(node.param, segments, pos + 1)
+        return None
+
+
+def _load_route_index():
+    global _route_index
+    with _route_index_lock:
+        if _route_index is None:
+            with database.read() as conn:
+                cur = conn.cursor()
+                try:
+                    cur.execute("SELECT route, permissions FROM route_permissions")
+                    rows = cur.fetchall()
+                except sqlite3.OperationalError as err:
+                    logbook.error(f"Database error while loading route permissions: {err}", exception=err)
+                    # Not cached, so the next request tries the load again
+                    return _RouteIndex({})
+
+            # rows now contains tuples like: ('/ledger/debts', '["ledger", "debt_viewing"]')
+            _route_index = _RouteIndex({r: json.loads(p) for r, p in rows})
+        return _route_index
+
+
+def invalidate_route_index():
+    global _route_index
+    with _route_index_lock:
+        _route_index = None
+
+
 def set_permission(permission):
     perms = permission if isinstance(permission, list) else [permission]
 
@@ -120,7 +227,7 @@ def set_permission(permission):
             path = _normalize_path(request.scope.get("route").path)
 
             if path not in _registered_routes:
-                with sqlite3.connect(DB_PATH) as conn:
+                with database.write() as conn:
                     cur = conn.cursor()
                     cur.execute(
                         "CREATE TABLE IF NOT EXISTS route_permissions (route TEXT PRIMARY KEY, permissions TEXT)"
@@ -132,6 +239,7 @@ def set_permission(permission):
                     )
                     row = cur.fetchone()
                     perms_json = json.dumps(perms)
+                    changed = True
                     if not row:
                         cur.execute(
                             "INSERT INTO route_permissions (route, permissions) VALUES (?, ?)",
@@ -142,8 +250,13 @@ def set_permission(permission):
                             "UPDATE route_permissions SET permissions = ? WHERE route = ?",
                             (perms_json, path)
                         )
+                    else:
+                        changed = False
                     conn.commit()
 
+                if changed:
+                    invalidate_route_index()
+
                 _registered_routes.add(path)
 
             return await route_func(request, *args, **kwargs)
@@ -154,28 +267,8 @@ def set_permission(permission):
 
 def get_permission(route: str):
     route = _normalize_path(route)
-
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT route, permissions FROM route_permissions"
-        )
-        rows = cur.fetchall()
-
-    # rows now contains tuples like: ('/ledger/debts', '["ledger", "debt_viewing"]')
-    route_perms = {r: json.loads(p) for r, p in rows}
-
-    if route in route_perms:
-        return route_perms[route]
-
-    # Dynamic fallback (parameterized routes)
-    for pattern_route, perms in route_perms.items():
-        escaped = re.escape(pattern_route)
-        pattern = re.sub(r"\\\{[^/]+\\\}", r"[^/]+", escaped)
-        if re.fullmatch(pattern, route):
-            return perms
-
-    return None
+    index = _route_index if _route_index is not None else _load_route_index()
+    return index.lookup(route)
 
 
 excepted_routes = [
@@ -189,7 +282,7 @@ excepted_routes = [
 
 class AuthPerms:
     @staticmethod
-    def verify_user(username, requested_route: str):
+    def verify_user(username, requested_route: str, user_perms: dict = None):
         requested_route = _normalize_path(requested_route)
 
         # Allow static and excepted routes
@@ -207,7 +300,8 @@ class AuthPerms:
         if isinstance(needed_perms, str):
             needed_perms = [needed_perms]
 
-        user_perms = AuthPerms.perms_for_user(username)
+        if user_perms is None:
+            user_perms = AuthPerms.perms_for_user(username)
 
         # Check each required permission
         for perm in needed_perms:
@@ -229,7 +323,7 @@ class AuthPerms:
 
     @staticmethod
     def give_all_perms(username):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.write() as conn:
             cursor = conn.cursor()
             try:
                 for perm in valid_perms:
@@ -249,7 +343,7 @@ class AuthPerms:
 
     @staticmethod
     def perms_for_user(username, fill_not_set=True):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             cur = conn.cursor()
             try:
                 cur.execute(
@@ -281,7 +375,7 @@ class AuthPerms:
 
     @staticmethod
     def list_users_perms():
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             try:
                 cur = conn.cursor()
                 cur.execute("SELECT username, arrested, admin FROM authbook")
@@ -1,15 +1,257 @@
+from concurrent.futures import ThreadPoolExecutor
 from library.logbook import LogBookHandler
+from contextlib import contextmanager
+import functools
+import threading
+import asyncio
 import sqlite3
 
 DB_PATH = "data.sqlite"
 logbook = LogBookHandler('DB Manager')
 
+# One connection per thread, opened once and reused for every query on that thread.
+_local = threading.local()
+
+connection_pragmas = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA mmap_size = 268435456",  # 256 MiB
+    "PRAGMA cache_size = -16000",  # ~16 MiB
+    "PRAGMA temp_store = MEMORY",
+]
+
+# Async routes hand their queries to this pool instead of blocking the event loop.
+# Each worker thread keeps its own connection like any other thread.
+executor_workers = 8
+_executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="database")
+
+# Full text search over Central Files: one cf_search row per person, with rowid = cfid.
+# Triggers on every source table re-index the affected cfid, so no write path has to remember to.
+search_sources = ("cf_names", "cf_profile_notes", "cf_pc_contact_details", "cf_occupations")
+_search_row_select = """
+    SELECT n.cfid,
+           COALESCE(n.name, '') || ' ' || COALESCE(n.first_name, '') || ' ' || COALESCE(n.middle_name, '') || ' '
+               || COALESCE(n.last_name, '') || ' ' || COALESCE(n.alias, ''),
+           COALESCE((SELECT group_concat(note, ' ') FROM cf_profile_notes pn WHERE pn.cfid = n.cfid), ''),
+           COALESCE(c.email_addr, '') || ' ' || COALESCE(c.phone_no, '') || ' ' || COALESCE(c.home_addr, ''),
+           COALESCE(o.occupation, '')
+    FROM cf_names n
+    LEFT JOIN cf_pc_contact_details c ON c.cfid = n.cfid
+    LEFT JOIN cf_occupations o ON o.cfid = n.cfid
+"""
+
+class _Connection(sqlite3.Connection):
+    """
+    Inside a nested database.read()/write() block, commit() is left to the outermost block, so functions that commit
+    their own work can still be grouped into one transaction by a caller. Nested blocks run inside a SAVEPOINT, and
+    rollback() there only undoes the nested block's own work, so the caller still sees the failure and the rest of
+    its transaction is kept.
+    The exception is a write block nested in a read that has no transaction open: it opens its own and commits it
+    when it ends, so a mostly-read block only holds the write lock while it writes.
+    Callbacks registered with database.after_commit() run after a real commit and are dropped by a real rollback
+    of the outermost block.
+    """
+    def commit(self):
+        if getattr(_local, "depth", 0) > getattr(_local, "txn_depth", 1):
+            return
+        super().commit()
+        _run_after_commit()
+
+    def rollback(self):
+        if getattr(_local, "depth", 0) > getattr(_local, "txn_depth", 1):
+            savepoint = _local.savepoints[-1]
+            if savepoint is not None and self.in_transaction:
+                self.execute(f"ROLLBACK TO {savepoint}")
+                return
+        super().rollback()
+        if getattr(_local, "depth", 0) <= 1:
+            _local.after_commit = []
+
+def _run_after_commit():
+    callbacks = getattr(_local, "after_commit", [])
+    _local.after_commit = []
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as err:
+            logbook.error(f"Error running an after-commit callback: {err}", exception=err)
+
+def _open_connection():
+    conn = sqlite3.connect(DB_PATH, timeout=30, factory=_Connection)
+    for pragma in connection_pragmas:
+        conn.execute(pragma)
+    return conn
+
 class database:
+    @staticmethod
+    def connection() -> sqlite3.Connection:
+        """
+        Returns this thread's shared connection, opening it on first use.
+        """
+        conn = getattr(_local, "conn", None)
+        if conn is None:
+            conn = _open_connection()
+            _local.conn = conn
+            _local.depth = 0
+            _local.txn_depth = 1
+            _local.savepoints = []
+            _local.after_commit = []
+        return conn
+
+    @staticmethod
+    def after_commit(callback):
+        """
+        Runs callback once the current transaction has committed, or straight away outside of a read()/write() block.
+        It is dropped if the transaction rolls back instead.
+        """
+        if getattr(_local, "depth", 0) == 0:
+            callback()
+            return
+        _local.after_commit.append(callback)
+
+    @staticmethod
+    def _release(conn, savepoint: str, rollback: bool = False):
+        if not conn.in_transaction:
+            return
+        try:
+            if rollback:
+                conn.execute(f"ROLLBACK TO {savepoint}")
+            conn.execute(f"RELEASE {savepoint}")
+        except sqlite3.OperationalError:
+            # A full rollback deeper down already took the savepoint with it
+            pass
+
+    @staticmethod
+    @contextmanager
+    def _transaction(immediate: bool):
+        conn = database.connection()
+        outermost = _local.depth == 0
+        # The block that opens the transaction is the one that commits it
+        owns_transaction = outermost or (immediate and not conn.in_transaction)
+
+        # Take the write lock up front so readers never have to be upgraded mid-transaction
+        if immediate and not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+
+        savepoint = None
+        if not owns_transaction and conn.in_transaction:
+            savepoint = f"nested_{_local.depth}"
+            conn.execute(f"SAVEPOINT {savepoint}")
+
+        outer_txn_depth = _local.txn_depth
+        _local.depth += 1
+        if owns_transaction:
+            _local.txn_depth = _local.depth
+        _local.savepoints.append(savepoint)
+        try:
+            yield conn
+        except BaseException:
+            if owns_transaction and conn.in_transaction:
+                conn.rollback()
+            elif savepoint is not None:
+                database._release(conn, savepoint, rollback=True)
+            if outermost:
+                _local.after_commit = []
+            raise
+        else:
+            if owns_transaction and conn.in_transaction:
+                conn.commit()
+            elif outermost:
+                # Nothing left to commit, but callbacks may have been registered after an earlier commit
+                _run_after_commit()
+            elif savepoint is not None:
+                database._release(conn, savepoint)
+        finally:
+            _local.depth -= 1
+            _local.txn_depth = outer_txn_depth
+            _local.savepoints.pop()
+
+    @staticmethod
+    def read():
+        """
+        Context manager yielding the shared connection for reads.
+        """
+        return database._transaction(immediate=False)
+
+    @staticmethod
+    def write():
+        """
+        Context manager yielding the shared connection inside a write transaction.
+        Nested blocks join the outer transaction; only the block that opened it commits, or rolls back on error.
+        conn.commit() inside a nested block is deferred to that block. conn.rollback() inside a nested block,
+        or an exception leaving it, undoes only that block's work.
+        """
+        return database._transaction(immediate=True)
+
+    @staticmethod
+    async def run(func, *args, **kwargs):
+        """
+        Runs a blocking function that uses the database on the database thread pool and awaits its result.
+        Use this from async routes so a slow query doesn't stall every other request.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+    @staticmethod
+    def _fetchone(sql: str, params=()):
+        with database.read() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    @staticmethod
+    def _fetchall(sql: str, params=()):
+        with database.read() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _execute(sql: str, params=()):
+        with database.write() as conn:
+            return conn.execute(sql, params).rowcount
+
+    @staticmethod
+    async def fetchone(sql: str, params=()):
+        """
+        Awaitable single-row read, run on the database thread pool.
+        """
+        return await database.run(database._fetchone, sql, params)
+
+    @staticmethod
+    async def fetchall(sql: str, params=()):
+        """
+        Awaitable multi-row read, run on the database thread pool.
+        """
+        return await database.run(database._fetchall, sql, params)
+
+    @staticmethod
+    async def execute(sql: str, params=()):
+        """
+        Awaitable write in its own transaction, run on the database thread pool. Returns the affected row count.
+        """
+        return await database.run(database._execute, sql, params)
+
+    @staticmethod
+    def close():
+        """
+        Closes this thread's shared connection, if it has one.
+        """
+        conn = getattr(_local, "conn", None)
+        if conn is not None:
+            conn.close()
+            _local.conn = None
+            _local.depth = 0
+            _local.txn_depth = 1
+            _local.savepoints = []
+            _local.after_commit = []
+
     @staticmethod
     def modernize() -> None:
         """
         Modernises the database to the current version.
-        Ensures all tables exist and adds missing columns.
+        Ensures all tables exist, adds missing columns, runs the data migrations, creates missing indexes
+        and sets up the Central Files search index. Migrations run first so they can clear out rows that would
+        break a new unique index.
+
+        Indexes are declared per table under "__indexes__" as {index_name: "(col, ...)"}.
+        Prefix the columns with "UNIQUE " for a unique index.
         """
 
         table_dict = {
@@ -24,6 +266,9 @@ class database:
                 'username': 'TEXT NOT NULL',
                 'permission': 'TEXT NOT NULL',
                 'allowed': 'BOOLEAN NOT NULL DEFAULT TRUE',
+                '__indexes__': {
+                    'idx_auth_permissions_username': '(username, permission)',
+                },
             },
             'route_permissions': {
                 'route': 'TEXT NOT NULL PRIMARY KEY',
@@ -38,6 +283,9 @@ class database:
                 'token': 'TEXT NOT NULL PRIMARY KEY',
                 'created_at': 'DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP',
                 'expires_at': 'DATETIME NOT NULL',
+                '__indexes__': {
+                    'idx_user_sessions_username': '(username)',
+                },
             },
             "cf_names": {
                 "cfid": "INTEGER PRIMARY KEY AUTOINCREMENT",  # Must add a name before anything else can be done
@@ -45,11 +293,17 @@ class database:
                 "first_name": "TEXT DEFAULT NULL",
                 "middle_name": "TEXT DEFAULT NULL",
                 "last_name": "TEXT DEFAULT NULL",
-                "alias": "TEXT DEFAULT NULL"
+                "alias": "TEXT DEFAULT NULL",
+                "__indexes__": {
+                    "idx_cf_names_name_cfid": "(name, cfid)",  # Keyset paging in name order
+                },
             },
             "cf_staff_usernames": {
                 "cfid": "INTEGER PRIMARY KEY",
                 "username": "TEXT NOT NULL",
+                "__indexes__": {
+                    "idx_cf_staff_usernames_username": "(username)",
+                },
             },
             "cf_name_types": {
                 "cfid": "INTEGER PRIMARY KEY",
@@ -70,6 +324,9 @@ class database:
                 "note": "TEXT NOT NULL",
                 "add_date": "DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP",
                 "author": "TEXT NOT NULL",
+                "__indexes__": {
+                    "idx_cf_profile_notes_cfid": "(cfid)",
+                },
             },
             "cf_pc_contact_details": {
                 "cfid": "INTEGER NOT NULL PRIMARY KEY",
@@ -104,6 +361,9 @@ class database:
                 "date": "DATE NOT NULL DEFAULT CURRENT_DATE",
                 "cfid": "INTEGER NOT NULL",
                 "action": "TEXT NOT NULL",
+                "__indexes__": {
+                    "idx_cf_dn_action_records_cfid": "(cfid, date)",
+                },
             },
             "cf_tonescale_records": {
                 "cfid": "INTEGER NOT NULL PRIMARY KEY",
@@ -119,14 +379,20 @@ class database:
                 "title": "TEXT NOT NULL",
                 "content": "TEXT NOT NULL",
                 "owner": "TEXT NOT NULL",
-                "tags": "TEXT"
+                "tags": "TEXT",
+                "__indexes__": {
+                    "idx_bulletin_archives_owner": "(owner)",
+                },
             },
             "finance_accounts": {
                 "account_id": "INTEGER PRIMARY KEY AUTOINCREMENT",
                 "account_name": "TEXT NOT NULL",
                 "double_entries": "BOOLEAN NOT NULL DEFAULT FALSE",
                 "balance": "REAL NOT NULL DEFAULT 0.0",
-                "owner": "TEXT"
+                "owner": "TEXT",
+                "__indexes__": {
+                    "idx_finance_accounts_owner": "(owner)",
+                },
             },
             "finance_transactions": {
                 "transaction_id": "INTEGER PRIMARY KEY AUTOINCREMENT",
@@ -136,12 +402,18 @@ class database:
                 "description": "TEXT NOT NULL",
                 "date": "DATE NOT NULL DEFAULT CURRENT_DATE",
                 "time": "TIME NOT NULL DEFAULT CURRENT_TIME",
+                "__indexes__": {
+                    "idx_finance_transactions_account": "(account_id, date)",
+                },
             },
             "transaction_receipts": {
                 "transaction_id": "INTEGER NOT NULL",
                 # A photo of the receipt
                 "receipt": "BLOB NOT NULL",
                 "receipt_mimetype": "TEXT NOT NULL",
+                "__indexes__": {
+                    "idx_transaction_receipts_transaction": "(transaction_id)",
+                },
             },
             "fp_expenses": {
                 "name": "TEXT NOT NULL PRIMARY KEY",
@@ -157,6 +429,10 @@ class database:
                 "start_date": "DATE NOT NULL DEFAULT CURRENT_DATE",
                 "end_date": "DATE",
                 "cfid": "INT",  # The Central Files ID for whom this debt is for.
+                "__indexes__": {
+                    "idx_debts_parties": "(debtor, debtee)",
+                    "idx_debts_cfid": "(cfid)",
+                },
             },
             "debt_records": {
                 "record_id": "INTEGER PRIMARY KEY AUTOINCREMENT",
@@ -165,11 +441,17 @@ class database:
                 "amount": "INTEGER NOT NULL",
                 "description": "TEXT NOT NULL",
                 "paid_off": "BOOLEAN NOT NULL DEFAULT FALSE",
+                "__indexes__": {
+                    "idx_debt_records_debt": "(debt_id)",
+                },
             },
             "battleplans": {
                 "bp_id": "INTEGER PRIMARY KEY AUTOINCREMENT",
                 "date": "DATE NOT NULL DEFAULT CURRENT_DATE",
                 "owner": "TEXT NOT NULL",
+                "__indexes__": {
+                    "uq_battleplans_owner_date": "UNIQUE (owner, date)",
+                },
             },
             "bp_tasks": {
                 "task_id": "INTEGER PRIMARY KEY AUTOINCREMENT",
@@ -178,6 +460,9 @@ class database:
                 "is_done": "BOOLEAN NOT NULL DEFAULT FALSE",
                 "owner": "TEXT NOT NULL",
                 "category": "TEXT NOT NULL DEFAULT 'Other'",
+                "__indexes__": {
+                    "idx_bp_tasks_owner_date": "(owner, date)",
+                },
             },
             "bp_quotas": {
                 "quota_id": "INTEGER PRIMARY KEY AUTOINCREMENT",
@@ -188,6 +473,10 @@ class database:
                 "owner": "TEXT NOT NULL",
                 "name": "TEXT NOT NULL",
                 "weekly_target": "REAL NOT NULL DEFAULT 0.0",
+                "__indexes__": {
+                    "uq_bp_quotas_owner_date_name": "UNIQUE (owner, bp_date, name)",
+                    "idx_bp_quotas_bp": "(bp_id)",
+                },
             },
             "invoices": {
                 "invoice_id": "INTEGER PRIMARY KEY AUTOINCREMENT",
@@ -200,6 +489,9 @@ class database:
                 "billing_email_address": "TEXT NOT NULL DEFAULT ''",
                 "billing_phone": "TEXT NOT NULL DEFAULT ''",
                 "billing_notes": "TEXT NOT NULL DEFAULT ''",
+                "__indexes__": {
+                    "idx_invoices_cfid": "(cfid)",
+                },
             },
             "items_on_invoices": {
                 # Items that ARE on an invoice, and which invoice.
@@ -207,6 +499,9 @@ class database:
                 "invoice_id": "INTEGER NOT NULL",
                 "item": "TEXT NOT NULL",
                 "value": "REAL NOT NULL",
+                "__indexes__": {
+                    "idx_items_on_invoices_invoice": "(invoice_id)",
+                },
             },
             "invoice_items": {
                 # Items that COULD appear on an invoice.
@@ -223,7 +518,10 @@ class database:
                 "payment_time": "TEXT",
                 "reference_number": "TEXT",
                 "notes": "TEXT",
-                "recorded_by": "TEXT"  # who recorded payment
+                "recorded_by": "TEXT",  # who recorded payment
+                "__indexes__": {
+                    "idx_invoice_payments_invoice": "(invoice_id)",
+                },
             },
             "CF_hubbard_chard_of_eval": {  # Credit to L. Ron Hubbard for his work on this.
                 "cfid": "INT NOT NULL PRIMARY KEY",
@@ -289,6 +587,41 @@ class database:
             "cf_profile_images": {
                 "cfid": "INTEGER PRIMARY KEY NOT NULL",
                 "image": "BLOB NOT NULL",
+                "mimetype": "TEXT",  # Sniffed from the uploaded bytes
+                "content_hash": "TEXT",  # sha256 of the original image
+            },
+            "cf_profile_thumbnails": {
+                # Pre-scaled copies of cf_profile_images. The BLOB is last so the metadata can be read without it.
+                "cfid": "INTEGER NOT NULL",
+                "size": "INTEGER NOT NULL",  # Longest edge in pixels
+                "content_hash": "TEXT NOT NULL",  # Same hash as the original it was made from
+                "mimetype": "TEXT NOT NULL",
+                "image": "BLOB NOT NULL",
+                "__table_constraints__": [
+                    "PRIMARY KEY (cfid, size)",
+                ],
+            },
+            # Duplicate detection postings, kept up to date by centralfiles whenever a name or contact detail changes.
+            "cf_dupe_keys": {
+                "cfid": "INTEGER NOT NULL",
+                "kind": "TEXT NOT NULL",  # sig (sorted soundex codes of the name's words), email or phone
+                "key": "TEXT NOT NULL",
+                "__table_constraints__": [
+                    "PRIMARY KEY (kind, key, cfid)",
+                ],
+                "__indexes__": {
+                    "idx_cf_dupe_keys_cfid": "(cfid)",
+                },
+            },
+            "cf_name_trigrams": {
+                "trigram": "TEXT NOT NULL",
+                "cfid": "INTEGER NOT NULL",
+                "__table_constraints__": [
+                    "PRIMARY KEY (trigram, cfid)",
+                ],
+                "__indexes__": {
+                    "idx_cf_name_trigrams_cfid": "(cfid)",
+                },
             },
             "cf_occupations": {
                 "cfid": "INTEGER PRIMARY KEY NOT NULL",
@@ -314,7 +647,10 @@ class database:
                 "cfid": "INTEGER NOT NULL",
                 "agreement": "TEXT NOT NULL",
                 "date_of_agreement": "DATE NOT NULL",
-                "fulfilled": "BOOLEAN NOT NULL DEFAULT FALSE"
+                "fulfilled": "BOOLEAN NOT NULL DEFAULT FALSE",
+                "__indexes__": {
+                    "idx_cf_agreements_cfid": "(cfid)",
+                },
             },
             "sessions_list": {
                 "session_id": "INTEGER PRIMARY KEY AUTOINCREMENT",
@@ -324,13 +660,19 @@ class database:
                 "duration": "INTEGER NOT NULL",  # In minutes
                 "auditor": "TEXT NOT NULL",
                 "remarks": "TEXT NOT NULL DEFAULT 'No recorded remarks'",
-                "status_code": "INTEGER NOT NULL DEFAULT 2"  # Status 1 = Completed, 2 = Pending/Scheduled, 3 = Cancelled.
+                "status_code": "INTEGER NOT NULL DEFAULT 2",  # Status 1 = Completed, 2 = Pending/Scheduled, 3 = Cancelled.
+                "__indexes__": {
+                    "idx_sessions_list_preclear": "(preclear_cfid, date)",
+                },
             },
             "session_actions": {
                 "action_id": "INTEGER PRIMARY KEY AUTOINCREMENT",
                 "session_id": "INTEGER NOT NULL",
                 "action": "TEXT NOT NULL",
-                "completed": "BOOLEAN NOT NULL"
+                "completed": "BOOLEAN NOT NULL",
+                "__indexes__": {
+                    "idx_session_actions_session": "(session_id)",
+                },
             },
             "session_engrams": {
                 "engram_id": "INTEGER PRIMARY KEY AUTOINCREMENT",
@@ -338,7 +680,10 @@ class database:
                 "actions": "TEXT NOT NULL",
                 "incident": "TEXT NOT NULL",
                 "somatic": "TEXT NOT NULL",
-                "incident_age": "INTEGER NOT NULL"
+                "incident_age": "INTEGER NOT NULL",
+                "__indexes__": {
+                    "idx_session_engrams_session": "(session_id)",
+                },
             },
             "cf_chem_assist": {
                 "cfid": "INTEGER PRIMARY KEY NOT NULL",
@@ -348,11 +693,17 @@ class database:
             "dn_schedule_data": {
                 "schedule_id": "INTEGER PRIMARY KEY AUTOINCREMENT",
                 "cfid": "INTEGER NOT NULL",
-                "date": "DATE NOT NULL",
+                "date": "DATE NOT NULL",  # YYYY-MM-DD
                 "time_str": "TEXT NOT NULL",
                 "activity": "TEXT NOT NULL",
                 "auditor": "TEXT NOT NULL",
                 "room": "TEXT NOT NULL",
+                "__indexes__": {
+                    "idx_dn_schedule_data_cfid": "(cfid, date)",
+                    "idx_dn_schedule_data_auditor": "(auditor, date)",
+                    "idx_dn_schedule_data_room": "(room, date)",
+                    "idx_dn_schedule_data_date": "(date)",
+                },
             },
             "dn_scheduling_data_repeating": {
                 "schedule_id": "INTEGER PRIMARY KEY AUTOINCREMENT",
@@ -364,6 +715,11 @@ class database:
                 "activity": "TEXT NOT NULL",
                 "auditor": "TEXT NOT NULL",
                 "room": "TEXT NOT NULL",
+                "__indexes__": {
+                    "idx_dn_scheduling_data_repeating_cfid": "(cfid)",
+                    "idx_dn_scheduling_data_repeating_auditor": "(auditor, end_date)",
+                    "idx_dn_scheduling_data_repeating_room": "(room, end_date)",
+                },
             },
             "odometer_entries": {
                 "entry_id": "INTEGER PRIMARY KEY AUTOINCREMENT",
@@ -373,6 +729,9 @@ class database:
                 "purpose": "TEXT NOT NULL",
                 "fuel_used_ml": "INT NOT NULL",
                 "user": "TEXT NOT NULL",  # The account that made the entry.
+                "__indexes__": {
+                    "idx_odometer_entries_user": "(user)",
+                },
             },
             "odometer_fuel_usages": {
                 "for_user": "TEXT NOT NULL PRIMARY KEY",
@@ -380,14 +739,14 @@ class database:
             },
         }
 
-        conn = sqlite3.connect(DB_PATH)
+        conn = database.connection()
         cur = conn.cursor()
 
         for table_name, columns in table_dict.items():
 
             # Separate normal columns and constraints
             constraints = columns.get("__table_constraints__", [])
-            real_columns = {k: v for k, v in columns.items() if k != "__table_constraints__"}
+            real_columns = {k: v for k, v in columns.items() if k not in ("__table_constraints__", "__indexes__")}
 
             # Check if table exists
             cur.execute("""
@@ -423,7 +782,142 @@ class database:
                         logbook.error(f"Failed altering table {table_name}: {e}")
                         raise
 
+        # Data fixes that are safe to run on every start, as (description, SQL)
+        data_migrations = [
+            (
+                "Normalised dn_schedule_data dates to YYYY-MM-DD",
+                "UPDATE dn_schedule_data SET date = substr(date, 1, 10) WHERE length(date) > 10",
+            ),
+            (
+                "Normalised dn_scheduling_data_repeating dates to YYYY-MM-DD",
+                """
+                UPDATE dn_scheduling_data_repeating
+                SET start_date = substr(start_date, 1, 10), end_date = substr(end_date, 1, 10)
+                WHERE length(start_date) > 10 OR length(end_date) > 10
+                """,
+            ),
+        ]
+        # Battleplan dates used to be stored as DD-MM-YYYY, which can't be sorted or range-scanned
+        for table_name, column in (("battleplans", "date"), ("bp_tasks", "date"), ("bp_quotas", "bp_date")):
+            data_migrations.append((
+                f"Converted {table_name}.{column} from DD-MM-YYYY to YYYY-MM-DD",
+                f"""
+                UPDATE {table_name}
+                SET {column} = substr({column}, 7, 4) || '-' || substr({column}, 4, 2) || '-' || substr({column}, 1, 2)
+                WHERE {column} GLOB '[0-9][0-9]-[0-9][0-9]-[0-9][0-9][0-9][0-9]'
+                """,
+            ))
+        # One battleplan per owner and day, and one quota of each name per battleplan.
+        # Duplicates are merged into the oldest row before the unique indexes are created.
+        data_migrations += [
+            (
+                "Moved quotas from duplicate battleplans to the original",
+                """
+                UPDATE bp_quotas
+                SET bp_id = (
+                    SELECT MIN(keep.bp_id) FROM battleplans dupe
+                    JOIN battleplans keep ON keep.owner = dupe.owner AND keep.date = dupe.date
+                    WHERE dupe.bp_id = bp_quotas.bp_id
+                )
+                WHERE bp_id IN (
+                    SELECT bp_id FROM battleplans
+                    WHERE bp_id NOT IN (SELECT MIN(bp_id) FROM battleplans GROUP BY owner, date)
+                )
+                """,
+            ),
+            (
+                "Removed duplicate battleplans",
+                "DELETE FROM battleplans WHERE bp_id NOT IN (SELECT MIN(bp_id) FROM battleplans GROUP BY owner, date)",
+            ),
+            (
+                "Merged the done amounts of duplicate quotas",
+                """
+                UPDATE bp_quotas
+                SET done_amount = (
+                    SELECT SUM(dupe.done_amount) FROM bp_quotas dupe
+                    WHERE dupe.owner = bp_quotas.owner AND dupe.bp_date = bp_quotas.bp_date AND dupe.name = bp_quotas.name
+                )
+                WHERE quota_id IN (
+                    SELECT MIN(quota_id) FROM bp_quotas GROUP BY owner, bp_date, name HAVING COUNT(*) > 1
+                )
+                """,
+            ),
+            (
+                "Removed duplicate quotas",
+                "DELETE FROM bp_quotas WHERE quota_id NOT IN (SELECT MIN(quota_id) FROM bp_quotas GROUP BY owner, bp_date, name)",
+            ),
+        ]
+        for description, sql in data_migrations:
+            try:
+                changed = cur.execute(sql).rowcount
+            except Exception as e:
+                logbook.error(f"Failed data migration '{description}': {e}")
+                raise
+            if changed > 0:
+                logbook.info(f"{description} ({changed} rows)")
+                print(f"{description} ({changed} rows)")
+
+        # Create any declared indexes that don't exist yet
+        cur.execute("SELECT name FROM sqlite_master WHERE type='index';")
+        existing_indexes = {row[0] for row in cur.fetchall()}
+        added_indexes = []
+
+        for table_name, columns in table_dict.items():
+            for index_name, index_def in columns.get("__indexes__", {}).items():
+                if index_name in existing_indexes:
+                    continue
+
+                unique = index_def.upper().startswith("UNIQUE ")
+                if unique:
+                    index_def = index_def[len("UNIQUE "):].strip()
+
+                try:
+                    cur.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {index_name} ON {table_name} {index_def};")
+                except Exception as e:
+                    logbook.error(f"Failed creating index {index_name} on {table_name}: {e}")
+                    raise
+
+                added_indexes.append(index_name)
+
+        # Create the search index (filling it from the existing files) and the triggers keeping it in sync
+        cur.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger');")
+        existing_objects = {row[0] for row in cur.fetchall()}
+        try:
+            if "cf_search" not in existing_objects:
+                cur.execute(
+                    """
+                    CREATE VIRTUAL TABLE cf_search USING fts5(
+                        names, notes, contact, occupation,
+                        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+                    );
+                    """
+                )
+                cur.execute(f"INSERT INTO cf_search (rowid, names, notes, contact, occupation) {_search_row_select};")
+                print("Built the Central Files search index.")
+
+            for table_name in search_sources:
+                for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+                    trigger_name = f"trg_{table_name}_search_{event.lower()}"
+                    if trigger_name in existing_objects:
+                        continue
+                    cur.execute(
+                        f"""
+                        CREATE TRIGGER IF NOT EXISTS {trigger_name} AFTER {event} ON {table_name}
+                        BEGIN
+                            DELETE FROM cf_search WHERE rowid = {row}.cfid;
+                            INSERT INTO cf_search (rowid, names, notes, contact, occupation)
+                            {_search_row_select} WHERE n.cfid = {row}.cfid;
+                        END;
+                        """
+                    )
+        except Exception as e:
+            logbook.error(f"Failed creating the Central Files search index: {e}")
+            raise
+
         conn.commit()
-        conn.close()
+
+        if added_indexes:
+            logbook.info(f"Added {len(added_indexes)} database indexes: {', '.join(added_indexes)}")
+            print(f"Added {len(added_indexes)} database indexes: {', '.join(added_indexes)}")
 
         print("Database modernized successfully.")
@@ -0,0 +1,15 @@
+from fastapi import Request
+
+# Shared conditional GET handling for routes that send an ETag.
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    True if the request's If-None-Match already names etag, so a 304 can be sent instead of the body.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
@@ -1,9 +1,115 @@
 from filelock import FileLock
 import traceback
+import threading
 import datetime
 import inspect
+import atexit
+import queue
+import time
 import os
 
+# Log lines are handed to a single background writer instead of being written inline.
+flush_interval = 0.5  # Seconds between flushes when the queue is quiet
+flush_batch_size = 256  # Flush early once this many lines are waiting
+
+_log_queue = queue.Queue()
+_writer_thread = None
+_writer_lock = threading.Lock()
+
+class _LogWriter(threading.Thread):
+    """
+    Drains the log queue in batches, keeping each day's log file open between batches.
+    """
+    def __init__(self):
+        super().__init__(name="logbook-writer", daemon=True)
+        self.files = {}
+        self.opened_on = {}
+
+    def run(self):
+        while True:
+            item = _log_queue.get()
+            batch = [item]
+
+            # Gather whatever else arrives within the flush interval, up to the batch size
+            deadline = time.monotonic() + flush_interval
+            while item is not None and len(batch) < flush_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = _log_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            self.write_batch([entry for entry in batch if entry is not None])
+            for _ in batch:
+                _log_queue.task_done()
+
+            if batch[-1] is None:
+                self.close_all()
+                return
+
+    def write_batch(self, batch):
+        today = datetime.date.today()
+
+        # Files opened on a previous day have been rotated away by {{TIME}}
+        for logfile, opened_on in list(self.opened_on.items()):
+            if opened_on != today:
+                self.close(logfile)
+
+        by_file = {}
+        for logfile, logline in batch:
+            by_file.setdefault(logfile, []).append(logline)
+
+        for logfile, lines in by_file.items():
+            try:
+                handle = self.files.get(logfile)
+                if handle is None:
+                    os.makedirs(os.path.dirname(logfile) or ".", exist_ok=True)
+                    handle = open(logfile, "a", encoding="utf-8")
+                    self.files[logfile] = handle
+                    self.opened_on[logfile] = today
+
+                with FileLock(logfile + ".lock", timeout=10):
+                    handle.write("".join(lines))
+                    handle.flush()
+            except Exception as err:
+                # Nowhere left to log to; don't let one bad file kill the writer
+                print(f"Failed writing to log file {logfile}: {err}")
+
+    def close(self, logfile):
+        handle = self.files.pop(logfile, None)
+        self.opened_on.pop(logfile, None)
+        if handle is None:
+            return
+        try:
+            handle.close()
+        except OSError:
+            pass
+
+    def close_all(self):
+        for logfile in list(self.files):
+            self.close(logfile)
+            try:
+                os.remove(logfile + ".lock")
+            except OSError:
+                pass
+
+def _start_writer():
+    global _writer_thread
+    with _writer_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = _LogWriter()
+            _writer_thread.start()
+
+def _shutdown_writer():
+    if _writer_thread is not None and _writer_thread.is_alive():
+        _log_queue.put(None)
+        _writer_thread.join(timeout=5)
+
+atexit.register(_shutdown_writer)
+
 class LogBookHandler:
     def __init__(self, system_name, logfile="logs/{{TIME}}.log"):
         os.makedirs(os.path.dirname(logfile), exist_ok=True)
@@ -16,16 +122,14 @@ class LogBookHandler:
                 self.system_name = os.path.basename(frame.filename)
             except (IndexError, AttributeError, RuntimeError):
                 self.system_name = "unknown"
-        self.logfile = LogBookHandler._parse_log_file(logfile)
-        self.lockfile = self.logfile + ".lock"
+        # {{TIMENOW}} is fixed for the life of the handler, {{TIME}} rolls over with the date
+        self.logfile_template = logfile.replace(
+            "{{TIMENOW}}", str(datetime.datetime.now().strftime("%Y-%m-%d %H.%M.%S"))
+        )
 
-    # On class deletion, destroy the lock file
-    def __del__(self):
-        if os.path.exists(self.lockfile):
-            try:
-                os.remove(self.lockfile)
-            except OSError:
-                pass
+    @property
+    def logfile(self):
+        return LogBookHandler._parse_log_file(self.logfile_template)
 
     @staticmethod
     def _parse_log_file(log_file):
@@ -36,21 +140,23 @@ class LogBookHandler:
         )
         return logfile
 
-    def _write_locked(self, logline):
-        os.makedirs(os.path.dirname(self.logfile), exist_ok=True)
-        lock = FileLock(self.lockfile, timeout=10)
-        with lock:
-            try:
-                with open(self.logfile, "a") as logfile:
-                    logfile.write(logline)
-            except UnicodeEncodeError:
-                with open(self.logfile, "ab") as logfile:
-                    logfile.write(logline.encode("utf-8"))
+    @staticmethod
+    def flush():
+        """
+        Blocks until every queued log line has been written.
+        """
+        if _writer_thread is not None and _writer_thread.is_alive():
+            _log_queue.join()
+
+    def _write(self, logline):
+        _log_queue.put((self.logfile, logline))
+        # Also restarts the writer if it has died, so queued lines don't pile up unwritten
+        _start_writer()
 
     def info(self, message):
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         logline = f"{now} [INFO] [{self.system_name}] {message}\n"
-        self._write_locked(logline)
+        self._write(logline)
 
     def warning(self, message):
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -62,7 +168,7 @@ class LogBookHandler:
             f"{now} [WARNING] [{self.system_name}] {message} | "
             f"Location {filename}:{line_number} in {function_name}\n"
         )
-        self._write_locked(logline)
+        self._write(logline)
 
     def error(self, message=None, exception:Exception|bool=True, do_print=True):
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -80,7 +186,7 @@ class LogBookHandler:
 
         full_message = f"{message}\n{trace}" if message else trace
         logline = f"{now} [ERROR] [{self.system_name}] {full_message}\n"
-        self._write_locked(logline)
+        self._write(logline)
 
         if do_print:
             print(full_message)
@@ -88,7 +194,7 @@ class LogBookHandler:
     def debug(self, message):
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         logline = f"{now} [DEBUG] [{self.system_name}] {message}\n"
-        self._write_locked(logline)
+        self._write(logline)
 
     def critical(self, message):
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -100,4 +206,4 @@ class LogBookHandler:
             f"{now} [CRITICAL] [{self.system_name}] {message}\n"
             f"Location {filename}:{line_number} in {function_name}\n"
         )
-        self._write_locked(logline)
+        self._write(logline)
@@ -19,15 +19,18 @@ def list_all():
         data = json.load(f)
     return data
 
-def list_all_privelliged(username):
+def list_all_privelliged(username, user_perms: dict = None):
     with open(JSON_MODULES_PATH, "r") as f:
         data = json.load(f)
-    
+
+    if user_perms is None:
+        user_perms = AuthPerms.perms_for_user(username)
+
     # Only return that which they're allowed to see
     final_data = {}
     for item_name in data:
         item = data[item_name]
-        if item['display_perm'] in AuthPerms.perms_for_user(username):
+        if item['display_perm'] in user_perms:
             final_data[item_name] = item
     
     return final_data
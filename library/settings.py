@@ -1,7 +1,9 @@
 from library.logbook import LogBookHandler
 from library.encryption import encryption
 from datetime import datetime
+import threading
 import json
+import time
 import os
 
 # Super simple settings system.
@@ -12,6 +14,7 @@ keys = encryption("certs/encryption.key")
 
 valid_settings = {
     "new_week_stats_plan": True,
+    "auto_carry_over_bps": False,  # Carry unfinished battleplan tasks and quotas into the new day at midnight.
     "weekday_end": 1,
     "registration_allowed": True,
     "lookback_length": 365,
@@ -30,6 +33,65 @@ valid_settings = {
     "sys_email_password": None
 }
 
+# settings.json is parsed once and kept in memory. It is re-read only when the file itself changes
+# (checked at most once per reload_check_interval seconds) or when set.set writes it.
+reload_check_interval = 1.0
+_settings = None
+_settings_signature = None
+_settings_checked_at = 0.0
+_settings_lock = threading.Lock()
+_decrypted = {}
+
+def _file_signature():
+    try:
+        stat = os.stat(SETTINGS_PATH)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+def _store(data: dict, signature):
+    global _settings, _settings_signature, _settings_checked_at
+    _settings = data
+    _settings_signature = signature
+    _settings_checked_at = time.monotonic()
+    _decrypted.clear()
+
+def _current() -> dict:
+    """
+    Returns the in-memory settings, reloading them first if settings.json has changed on disk.
+    """
+    global _settings_checked_at
+    if _settings is not None and time.monotonic() - _settings_checked_at < reload_check_interval:
+        return _settings
+
+    with _settings_lock:
+        signature = _file_signature()
+        if _settings is not None and signature == _settings_signature:
+            _settings_checked_at = time.monotonic()
+            return _settings
+
+        if signature is None:
+            _store({}, None)
+            return _settings
+
+        try:
+            with open(SETTINGS_PATH, "r") as f:
+                data = json.load(f)
+        except json.JSONDecodeError as err:
+            # Most likely caught mid-write; keep what we had and look again next time
+            if _settings is None:
+                raise
+            logbook.warning(f"Could not reload {SETTINGS_PATH}, keeping previous settings: {err}")
+            return _settings
+
+        _store(data, signature)
+        return _settings
+
+def _decrypt(data):
+    if data not in _decrypted:
+        _decrypted[data] = keys.decrypt(data)
+    return _decrypted[data]
+
 def make_settings_file():
     with open(SETTINGS_PATH, "w") as f:
         json.dump(valid_settings, f, indent=4, separators=(",", ": "))
@@ -40,6 +102,7 @@ class groupget:
         return {
             "use_ssl": get.use_ssl(),
             "reset_bp_plan_on_new_week": get.reset_bp_plan_on_new_week(),
+            "auto_carry_over_bps": get.auto_carry_over_bps(),
             "weekday_end": get.weekday_end(),
             "allow_registration": get.allow_registration(),
             "lookback_length": get.lookback_length(),
@@ -59,11 +122,7 @@ class groupget:
 class get:
     @staticmethod
     def get(key, default=None):
-        if not os.path.exists(SETTINGS_PATH):
-            return default
-        with open(SETTINGS_PATH, "r") as f:
-            settings = json.load(f)
-            return settings.get(key, default)
+        return _current().get(key, default)
 
     @staticmethod
     def use_ssl():
@@ -73,6 +132,10 @@ class get:
     def reset_bp_plan_on_new_week():
         return bool(get.get("new_week_stats_plan", False))
 
+    @staticmethod
+    def auto_carry_over_bps():
+        return bool(get.get("auto_carry_over_bps", False))
+
     @staticmethod
     def weekday_end():
         """
@@ -127,7 +190,7 @@ class get:
     def dns_token():
         data = get.get("dns_token", None)
         if data:
-            return keys.decrypt(data)
+            return _decrypt(data)
         else:
             return data
 
@@ -140,7 +203,7 @@ class get:
     def domain_email():
         data = get.get("domain_email", None)
         if data:
-            return keys.decrypt(data)
+            return _decrypt(data)
         else:
             return data    
 
@@ -149,7 +212,7 @@ class get:
     def system_email():
         data = get.get("system_email", None)
         if data:
-            return keys.decrypt(data)
+            return _decrypt(data)
         else:
             return data
 
@@ -157,7 +220,7 @@ class get:
     def sys_email_password():
         data = get.get("sys_email_password", None)
         if data:
-            return keys.decrypt(data)
+            return _decrypt(data)
         else:
             return data
 
@@ -180,15 +243,19 @@ class set:
             else:
                 data[key] = value
 
-        with open(SETTINGS_PATH, "w") as f:
-            json.dump(data, f, indent=4)
-        
+        with _settings_lock:
+            with open(SETTINGS_PATH, "w") as f:
+                json.dump(data, f, indent=4)
+            _store(data, _file_signature())
+
         return True
     
     def use_ssl(value:bool):
         return set.set("use_ssl", bool(value))
     def reset_bp_plan_on_new_week(value:bool):
         return set.set("reset_bp_plan_on_new_week", bool(value))
+    def auto_carry_over_bps(value:bool):
+        return set.set("auto_carry_over_bps", bool(value))
     def weekday_end(value:str):
         ref_dict = {
             "monday": 1,
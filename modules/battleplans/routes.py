@@ -1,27 +1,37 @@
-from fastapi.responses import HTMLResponse, JSONResponse
-from library.auth import authbook, route_prechecks
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+from library.auth import route_prechecks
+from library.httpcache import etag_matches
 from fastapi.templating import Jinja2Templates
 from library.authperms import set_permission
 from library.logbook import LogBookHandler
 from fastapi import APIRouter, Request
-from library.database import DB_PATH
+from library.database import database
+from filelock import FileLock, Timeout
 from pydantic import BaseModel
 from library import settings
+import threading
 import datetime
+import hashlib
 import sqlite3
+import json
+import time
 import os
 
 logbook = LogBookHandler("BattlePlans")
 router = APIRouter()
 templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), "templates"))
 
+# Dates are stored as ISO YYYY-MM-DD so they sort and range-scan. The API still speaks DD-MM-YYYY.
+date_format = "%Y-%m-%d"
+display_date_format = "%d-%m-%Y"
+
 def get_bp_exists(date: datetime.datetime, owner: str):
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.read() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
                 "SELECT * FROM battleplans WHERE date = ? AND owner = ?",
-                (date.strftime("%d-%m-%Y"), owner)
+                (date.strftime(date_format), owner)
             )
             data = cursor.fetchone()
             return bool(data[0]) if data else False
@@ -31,12 +41,12 @@ def get_bp_exists(date: datetime.datetime, owner: str):
 
 def get_bp_id(date: datetime.datetime, owner: str):
     """Fetch the bp_id for a given date and owner."""
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.read() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
                 "SELECT bp_id FROM battleplans WHERE date = ? AND owner = ?",
-                (date.strftime("%d-%m-%Y"), owner)
+                (date.strftime(date_format), owner)
             )
             row = cursor.fetchone()
             return row[0] if row else None
@@ -57,33 +67,91 @@ def dateformatenforcer(date: str):
                 date = date.replace(month, str(month_list[month]))
     return date
 
-def get_quota_done_helper(date: str, owner: str):
-    date = dateformatenforcer(date)
-    with sqlite3.connect(DB_PATH) as conn:
+def parse_bp_date(date: str) -> datetime.datetime:
+    """
+    Parses a battleplan date in any format the API accepts: YYYY-MM-DD, DD-MM-YYYY or DD-Month-YYYY.
+    Raises ValueError for anything else.
+    """
+    date = dateformatenforcer(str(date).strip())
+    for fmt in (date_format, display_date_format):
+        try:
+            return datetime.datetime.strptime(date, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid battleplan date: {date}")
+
+def display_bp_date(stored_date: str) -> str:
+    """Converts a stored YYYY-MM-DD date back to the DD-MM-YYYY the API has always returned."""
+    return datetime.datetime.strptime(stored_date, date_format).strftime(display_date_format)
+
+def week_bounds(date_obj: datetime.date, weekday_end: int) -> tuple[datetime.date, datetime.date]:
+    """
+    Returns the first and last day of the week containing date_obj. Weeks end on weekday_end (1=Mon … 7=Sun)
+    and start the day after.
+    """
+    week_start_day = weekday_end % 7 + 1
+    start = date_obj - datetime.timedelta(days=(date_obj.isoweekday() - week_start_day) % 7)
+    return start, start + datetime.timedelta(days=6)
+
+def month_bounds(date_obj: datetime.date) -> tuple[datetime.date, datetime.date]:
+    start = date_obj.replace(day=1)
+    next_month = (start + datetime.timedelta(days=32)).replace(day=1)
+    return start, next_month - datetime.timedelta(days=1)
+
+def production_bucket_sql(bucket: str, weekday_end: int) -> str:
+    """The SQL expression grouping bp_quotas.bp_date into day, week or month buckets, each named by its first day."""
+    if bucket == "day":
+        return "bp_date"
+    if bucket == "month":
+        return "substr(bp_date, 1, 7) || '-01'"
+    if bucket == "week":
+        week_start_day = weekday_end % 7 + 1
+        # strftime('%w') counts from Sunday = 0, this turns it into ISO (Monday = 1) before stepping back to the week start
+        return (
+            f"date(bp_date, '-' || (((CAST(strftime('%w', bp_date) AS INTEGER) + 6) % 7 + 1 - {week_start_day} + 7) % 7)"
+            " || ' days')"
+        )
+    raise ValueError(f"Unknown bucket: {bucket}")
+
+def get_quota_production(owner: str, start: datetime.date, end: datetime.date, bucket: str = None, weekday_end: int = None):
+    """
+    Sums the done amount of each quota between start and end (inclusive) in one query.
+    Returns {name: total}, or with a bucket ("day", "week" or "month") {bucket_start: {name: total}} in date order.
+    Returns None on a database error.
+    """
+    if bucket is None:
+        sql = """
+            SELECT name, SUM(done_amount) FROM bp_quotas
+            WHERE owner = ? AND bp_date BETWEEN ? AND ?
+            GROUP BY name
+        """
+    else:
+        if weekday_end is None:
+            weekday_end = settings.get.weekday_end()
+        bucket_sql = production_bucket_sql(bucket, int(weekday_end))
+        sql = f"""
+            SELECT {bucket_sql} AS bucket, name, SUM(done_amount) FROM bp_quotas
+            WHERE owner = ? AND bp_date BETWEEN ? AND ?
+            GROUP BY bucket, name
+            ORDER BY bucket
+        """
+
+    with database.read() as conn:
         try:
             cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT done_amount, name, bp_id
-                FROM bp_quotas
-                WHERE bp_date = ? AND owner = ?
-                """,
-                (date, owner),
-            )
+            cursor.execute(sql, (owner, start.strftime(date_format), end.strftime(date_format)))
             data = cursor.fetchall()
+        except sqlite3.OperationalError as err:
+            logbook.error(f"Database error occurred while totalling quota production: {err}", exception=err)
+            return None
 
-            parsed_data = {}
-            for row in data:
-                parsed_data[row[1]] = row[0] + parsed_data.get(row[1], 0)
+    if bucket is None:
+        return {name: total for name, total in data}
 
-            return parsed_data
-        except sqlite3.OperationalError as err:
-            logbook.error(
-                f"Database error occurred while fetching the quota amount: {err}",
-                exception=err,
-            )
-            conn.rollback()
-            return {}
+    buckets = {}
+    for bucket_start, name, total in data:
+        buckets.setdefault(bucket_start, {})[name] = total
+    return buckets
 
 # -------------------- Routes --------------------
 
@@ -91,51 +159,66 @@ def get_quota_done_helper(date: str, owner: str):
 @set_permission(permission="battleplans")
 async def show_login(request: Request):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)}) has accessed the battleplans page.")
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username}) has accessed the battleplans page.")
     return templates.TemplateResponse(request, "battleplans.html")
 
+def list_bp_dates(owner: str):
+    with database.read() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT date FROM battleplans WHERE owner = ? ORDER BY date", (owner,))
+        return [row[0] for row in cursor.fetchall()]
+
 @router.get("/api/bps/list", response_class=JSONResponse)
 async def list_bps(request: Request):
     token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
+    owner = request.state.auth.username
     logbook.info(f"IP {request.client.host} ({owner}) is listing all battleplans.")
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT date FROM battleplans WHERE owner = ?", (owner,))
-        data = cursor.fetchall()
+    dates = await database.run(list_bp_dates, owner)
 
     parsed_data = {}
-    for item in data:
-        date = item[0]
-        date_obj = datetime.datetime.strptime(date, "%d-%m-%Y")
-        parsed_data[date] = {
+    for date in dates:
+        date_obj = datetime.datetime.strptime(date, date_format)
+        parsed_data[date_obj.strftime(display_date_format)] = {
             "day": date_obj.strftime("%d"),
             "month": date_obj.strftime("%B"),
+            "year": date_obj.strftime("%Y"),
         }
 
     return JSONResponse(parsed_data, status_code=200)
 
-@router.get("/api/bps/get/{date}", response_class=JSONResponse)
-async def get_bp(request: Request, date: str):
-    token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
-    logbook.info(f"IP {request.client.host} ({owner}) is fetching all tasks for {date}.")
-    date_obj = datetime.datetime.strptime(date, "%d-%B-%Y")
-
+def get_bp_tasks(date_obj: datetime.datetime, owner: str):
+    """
+    Returns (bp_id, task rows) for a battleplan, or None if it doesn't exist.
+    """
     if not get_bp_exists(date_obj, owner):
-        return JSONResponse({"success": False, "error": "Battleplan does not exist."}, status_code=404)
+        return None
 
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.read() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "SELECT date, task, is_done, task_id, category FROM bp_tasks WHERE date = ? and owner = ?",
-            (date_obj.strftime("%d-%m-%Y"), owner,)
+            (date_obj.strftime(date_format), owner,)
         )
         data = cursor.fetchall()
 
-    bp_id = get_bp_id(date_obj, owner)
+    return get_bp_id(date_obj, owner), data
 
-    parsed_data = {"bp_id": bp_id, "date": date_obj.strftime("%d-%m-%Y"), "tasks": []}
+@router.get("/api/bps/get/{date}", response_class=JSONResponse)
+async def get_bp(request: Request, date: str):
+    token:str = route_prechecks(request)
+    owner = request.state.auth.username
+    logbook.info(f"IP {request.client.host} ({owner}) is fetching all tasks for {date}.")
+    try:
+        date_obj = parse_bp_date(date)
+    except ValueError as err:
+        return JSONResponse({"success": False, "error": str(err)}, status_code=400)
+
+    result = await database.run(get_bp_tasks, date_obj, owner)
+    if result is None:
+        return JSONResponse({"success": False, "error": "Battleplan does not exist."}, status_code=404)
+    bp_id, data = result
+
+    parsed_data = {"bp_id": bp_id, "date": date_obj.strftime(display_date_format), "tasks": []}
     for item in data:
         parsed_data["tasks"].append({"text": item[1], "done": bool(item[2]), "id": item[3], "category": item[4]})
 
@@ -145,41 +228,51 @@ class task_state_data(BaseModel):
     task_id: str
     state: bool
 
-@router.get("/api/bps/task/delete/{task_id}")
-async def delete_task(request: Request, task_id: str):
-    token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
-    logbook.info(f"IP {request.client.host} ({owner}) is deleting task {task_id}.")
-    with sqlite3.connect(DB_PATH) as conn:
+def delete_bp_task(task_id: int):
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
-            cursor.execute("DELETE FROM bp_tasks WHERE task_id = ?", (int(task_id),))
+            cursor.execute("DELETE FROM bp_tasks WHERE task_id = ?", (task_id,))
             conn.commit()
-            return JSONResponse({"success": True}, status_code=200)
+            return True
         except sqlite3.OperationalError as err:
             logbook.error(f"Database error while deleting task: {err}", exception=err)
             conn.rollback()
-            return JSONResponse({"success": False, "error": "Database error occurred while deleting task."}, status_code=500)
+            return False
 
-@router.post("/api/bps/task/set_status", response_class=JSONResponse)
-async def set_task_status(request: Request, data: task_state_data):
+@router.get("/api/bps/task/delete/{task_id}")
+async def delete_task(request: Request, task_id: str):
     token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
-    logbook.info(f"IP {request.client.host} ({owner}) is setting status of task {data.task_id} to {data.state}.")
-    with sqlite3.connect(DB_PATH) as conn:
+    owner = request.state.auth.username
+    logbook.info(f"IP {request.client.host} ({owner}) is deleting task {task_id}.")
+    if await database.run(delete_bp_task, int(task_id)):
+        return JSONResponse({"success": True}, status_code=200)
+    return JSONResponse({"success": False, "error": "Database error occurred while deleting task."}, status_code=500)
+
+def set_bp_task_status(task_id: int, state: bool):
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
-            cursor.execute("UPDATE bp_tasks SET is_done = ? WHERE task_id = ?", (bool(data.state), int(data.task_id)))
+            cursor.execute("UPDATE bp_tasks SET is_done = ? WHERE task_id = ?", (state, task_id))
             conn.commit()
-            return JSONResponse({"success": True}, status_code=200)
+            return True
         except sqlite3.OperationalError as err:
             logbook.error(f"Database error while setting task status: {err}", exception=err)
             conn.rollback()
-            return JSONResponse({"success": False, "error": "Database error occurred while setting task status."}, status_code=500)
+            return False
+
+@router.post("/api/bps/task/set_status", response_class=JSONResponse)
+async def set_task_status(request: Request, data: task_state_data):
+    token:str = route_prechecks(request)
+    owner = request.state.auth.username
+    logbook.info(f"IP {request.client.host} ({owner}) is setting status of task {data.task_id} to {data.state}.")
+    if await database.run(set_bp_task_status, int(data.task_id), bool(data.state)):
+        return JSONResponse({"success": True}, status_code=200)
+    return JSONResponse({"success": False, "error": "Database error occurred while setting task status."}, status_code=500)
 
 def make_battplan(bp_date_obj, owner, return_bpid=False):
-    date = bp_date_obj.strftime("%d-%m-%Y")
-    with sqlite3.connect(DB_PATH) as conn:
+    date = bp_date_obj.strftime(date_format)
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute("INSERT INTO battleplans (date, owner) VALUES (?, ?)", (date, owner))
@@ -188,7 +281,7 @@ def make_battplan(bp_date_obj, owner, return_bpid=False):
                 return cursor.lastrowid
             else:
                 return True
-        except sqlite3.OperationalError as err:
+        except (sqlite3.OperationalError, sqlite3.IntegrityError) as err:
             logbook.error(f"Database error while creating battleplan for {owner} on {date}: {err}", exception=err)
             conn.rollback()
             return False
@@ -196,14 +289,17 @@ def make_battplan(bp_date_obj, owner, return_bpid=False):
 @router.get("/api/bps/create/{date}")
 async def route_create_bp(request: Request, date: str):
     token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
+    owner = request.state.auth.username
     logbook.info(f"IP {request.client.host} ({owner}) is creating battleplan for {date}.")
-    date_obj = datetime.datetime.strptime(date, "%d-%B-%Y")
+    try:
+        date_obj = parse_bp_date(date)
+    except ValueError as err:
+        return JSONResponse({"success": False, "error": str(err)}, status_code=400)
 
-    if get_bp_exists(date_obj, owner):
+    if await database.run(get_bp_exists, date_obj, owner):
         return JSONResponse({"success": False, "error": "Battleplan already exists."}, status_code=409)
 
-    success = make_battplan(date_obj, owner)
+    success = await database.run(make_battplan, date_obj, owner)
     if success:
         return JSONResponse({"success": True}, status_code=201)
     else:
@@ -214,30 +310,43 @@ class add_task_data(BaseModel):
     date: str
     category: str
 
-@router.post("/api/bps/task/add")
-async def add_task(request: Request, data: add_task_data):
-    token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
-    logbook.info(f"IP {request.client.host} ({owner}) is adding task to battleplan for {data.date}.")
-    data.date = dateformatenforcer(data.date)
-    date_obj = datetime.datetime.strptime(data.date, "%d-%m-%Y")
-
+def add_bp_task(date_obj: datetime.datetime, owner: str, text: str, category: str):
+    """
+    Returns the new task's id, None if there's no battleplan that day, or False on a database error.
+    """
     if not get_bp_exists(date_obj, owner):
-        return JSONResponse({"success": False, "error": "Battleplan does not exist."}, status_code=404)
+        return None
 
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
                 "INSERT INTO bp_tasks (date, task, is_done, owner, category) VALUES (?, ?, ?, ?, ?)",
-                (date_obj.strftime("%d-%m-%Y"), str(data.text), False, owner, str(data.category))
+                (date_obj.strftime(date_format), text, False, owner, category)
             )
             conn.commit()
-            return JSONResponse({"id": cursor.lastrowid, "text": data.text, "done": False}, status_code=201)
+            return cursor.lastrowid
         except sqlite3.OperationalError as err:
             logbook.error(f"Database error while adding task: {err}", exception=err)
             conn.rollback()
-            return JSONResponse({"success": False, "error": "Database error occurred while adding task."}, status_code=500)
+            return False
+
+@router.post("/api/bps/task/add")
+async def add_task(request: Request, data: add_task_data):
+    token:str = route_prechecks(request)
+    owner = request.state.auth.username
+    logbook.info(f"IP {request.client.host} ({owner}) is adding task to battleplan for {data.date}.")
+    try:
+        date_obj = parse_bp_date(data.date)
+    except ValueError as err:
+        return JSONResponse({"success": False, "error": str(err)}, status_code=400)
+
+    task_id = await database.run(add_bp_task, date_obj, owner, str(data.text), str(data.category))
+    if task_id is None:
+        return JSONResponse({"success": False, "error": "Battleplan does not exist."}, status_code=404)
+    if task_id is False:
+        return JSONResponse({"success": False, "error": "Database error occurred while adding task."}, status_code=500)
+    return JSONResponse({"id": task_id, "text": data.text, "done": False}, status_code=201)
 
 # -------------------- Quota Endpoints --------------------
 
@@ -256,29 +365,34 @@ class quota_make(BaseModel):
 class quota_delete(BaseModel):
     quota_id: int
 
-@router.post("/api/bps/quota/delete")
-async def delete_quota(request: Request, data: quota_delete):
-    token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
-    logbook.info(f"IP {request.client.host} ({owner}) is deleting the quota {data.quota_id}.")
-    with sqlite3.connect(DB_PATH) as conn:
+def delete_bp_quota(quota_id: int, owner: str):
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
                 """
                 DELETE FROM bp_quotas WHERE quota_id = ? AND owner = ?
                 """,
-                (data.quota_id, owner,)
+                (quota_id, owner,)
             )
             conn.commit()
-            return JSONResponse({"success": True}, status_code=200)
+            return True
         except sqlite3.OperationalError as err:
             logbook.error(f"Database error while deleting quota: {err}", exception=err)
             conn.rollback()
-            return JSONResponse({"success": False, "error": "Database error occurred while deleting quota."}, status_code=500)
+            return False
+
+@router.post("/api/bps/quota/delete")
+async def delete_quota(request: Request, data: quota_delete):
+    token:str = route_prechecks(request)
+    owner = request.state.auth.username
+    logbook.info(f"IP {request.client.host} ({owner}) is deleting the quota {data.quota_id}.")
+    if await database.run(delete_bp_quota, data.quota_id, owner):
+        return JSONResponse({"success": True}, status_code=200)
+    return JSONResponse({"success": False, "error": "Database error occurred while deleting quota."}, status_code=500)
 
 def check_quota_exists(bp_id: int, quota_name: str) -> bool:
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.read() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
@@ -293,25 +407,20 @@ def check_quota_exists(bp_id: int, quota_name: str) -> bool:
             logbook.error(f"Database error while checking quota: {err}", exception=err)
             return False
 
-@router.post("/api/bps/quota/create")
-async def create_quota(request: Request, data: quota_make):
-    token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
-    logbook.info(f"IP {request.client.host} ({owner}) is creating the quota {data.quota_name} for BP with ID {data.bp_id}.")
-
-    with sqlite3.connect(DB_PATH) as conn:
+def create_bp_quota(bp_id: int, quota_name: str, owner: str):
+    """
+    Returns True once created, None if the quota already exists, or False on a database error.
+    """
+    with database.write() as conn:
         try:
             # Check if the quota already exists
-            if check_quota_exists(data.bp_id, data.quota_name):
-                return JSONResponse(
-                    content={"success": False, "error": "Quota already exists."},
-                    status_code=409
-                )
+            if check_quota_exists(bp_id, quota_name):
+                return None
 
             cursor = conn.cursor()
             cursor.execute(
                 "SELECT date FROM battleplans WHERE bp_id = ? AND owner = ?",
-                (data.bp_id, owner,)
+                (bp_id, owner,)
             )
             bp_date = cursor.fetchone()[0]
 
@@ -321,52 +430,82 @@ async def create_quota(request: Request, data: quota_make):
                 (bp_id, bp_date, planned_amount, done_amount, owner, name, weekly_target)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
                 """,
-                (data.bp_id, bp_date, 0, 0, owner, data.quota_name, 0)
+                (bp_id, bp_date, 0, 0, owner, quota_name, 0)
             )
             conn.commit()
-            return JSONResponse({"success": True}, status_code=201)
+            return True
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return None
         except sqlite3.OperationalError as err:
             logbook.error(f"Database error while creating quota: {err}", exception=err)
             conn.rollback()
-            return JSONResponse({"success": False, "error": "Database error occurred while creating quota."}, status_code=500)
+            return False
 
-@router.get("/api/bps/quota/list/{bp_date}")
-async def list_quotas(request: Request, bp_date:str):
+@router.post("/api/bps/quota/create")
+async def create_quota(request: Request, data: quota_make):
     token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
-    bp_date = dateformatenforcer(bp_date)
-    logbook.info(f"IP {request.client.host} ({owner}) is listing all quotas for {bp_date}.")
+    owner = request.state.auth.username
+    logbook.info(f"IP {request.client.host} ({owner}) is creating the quota {data.quota_name} for BP with ID {data.bp_id}.")
 
-    with sqlite3.connect(DB_PATH) as conn:
+    created = await database.run(create_bp_quota, data.bp_id, data.quota_name, owner)
+    if created is None:
+        return JSONResponse({"success": False, "error": "Quota already exists."}, status_code=409)
+    if created is False:
+        return JSONResponse({"success": False, "error": "Database error occurred while creating quota."}, status_code=500)
+    return JSONResponse({"success": True}, status_code=201)
+
+quota_columns = "quota_id, bp_id, bp_date, planned_amount, done_amount, owner, name, weekly_target"
+
+def parse_quota_row(item) -> dict:
+    """Turns a row of quota_columns into the quota the API returns."""
+    return {
+        "quota_id": item[0],
+        "bp_id": item[1],
+        "date": display_bp_date(item[2]),
+        "planned_amount": item[3],
+        "done_amount": item[4],
+        "owner": item[5],
+        "name": item[6],
+        "weekly_target": item[7],
+    }
+
+def list_bp_quotas(owner: str, bp_date: str):
+    """
+    Returns the quota rows for a day, or None on a database error.
+    """
+    with database.read() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
-                """
-                    SELECT quota_id, bp_id, bp_date, planned_amount, done_amount, owner, name, weekly_target
+                f"""
+                    SELECT {quota_columns}
                     FROM bp_quotas
                     WHERE owner = ? AND bp_date = ?  -- Its quota's by BP Date and Owner. Not every BP has the same quota's
                 """,
                 (owner, bp_date)
             )
-            data = cursor.fetchall()
+            return cursor.fetchall()
         except sqlite3.OperationalError as err:
             logbook.error(f"Database error while listing quotas: {err}", exception=err)
             conn.rollback()
-            return JSONResponse({"success": False, "error": "Database error occurred while fetching quotas."}, status_code=500)
+            return None
 
-    parsed_data = []
-    for item in data:
-        parsed_data.append({
-            "quota_id": item[0],
-            "bp_id": item[1],
-            "date": item[2],
-            "planned_amount": item[3],
-            "done_amount": item[4],
-            "owner": item[5],
-            "name": item[6],
-            "weekly_target": item[7],
-        })
-    return JSONResponse(parsed_data, status_code=200)
+@router.get("/api/bps/quota/list/{bp_date}")
+async def list_quotas(request: Request, bp_date:str):
+    token:str = route_prechecks(request)
+    owner = request.state.auth.username
+    logbook.info(f"IP {request.client.host} ({owner}) is listing all quotas for {bp_date}.")
+    try:
+        bp_date = parse_bp_date(bp_date).strftime(date_format)
+    except ValueError as err:
+        return JSONResponse({"success": False, "error": str(err)}, status_code=400)
+
+    data = await database.run(list_bp_quotas, owner, bp_date)
+    if data is None:
+        return JSONResponse({"success": False, "error": "Database error occurred while fetching quotas."}, status_code=500)
+
+    return JSONResponse([parse_quota_row(item) for item in data], status_code=200)
 
 class quota_data_set_done(BaseModel):
     quota_id: int
@@ -380,45 +519,41 @@ class notfounderror(Exception):
     def __str__(self):
         return self.message
 
-@router.post("/api/bps/quota/done/set")
-async def set_quota_done(request: Request, data: quota_data_set_done):
-    token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
-    logbook.info(f"IP {request.client.host} ({owner}) is setting quota done amount for quota {data.quota_id} to {data.amount}.")
-
-    with sqlite3.connect(DB_PATH) as conn:
+def set_quota_done_amount(quota_id: int, amount: int, bp_date: str, owner: str):
+    """
+    Sets a quota's done amount and moves any shortfall onto tomorrow's quota. Returns False on a database error.
+    """
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
                 "UPDATE bp_quotas SET done_amount = ? WHERE quota_id = ? AND owner = ?",
-                (data.amount, data.quota_id, owner)
+                (amount, quota_id, owner)
             )
             conn.commit()
         except sqlite3.OperationalError as err:
             logbook.error(f"Database error while setting quota done amount: {err}", exception=err)
             conn.rollback()
-            return JSONResponse({"success": False, "error": "Database error occurred while setting done quota amount."}, status_code=500)
+            return False
 
         try:
-            quota_data = get_quota_data(data.quota_id)
+            quota_data = get_quota_data(quota_id)
             if quota_data['weekly_target'] != 0: # If it's not 0, then BPs for later would've been created.
-                if quota_data['planned_amount'] > data.amount:  # If made less than planned
+                if quota_data['planned_amount'] > amount:  # If made less than planned
                     # update tomorrow's planned amount to be its planned amount + today's remainder
-                    remainder = quota_data['planned_amount'] - data.amount
+                    remainder = quota_data['planned_amount'] - amount
                     needed_tmr = quota_data['planned_amount'] + remainder
 
-                    data.bp_date = dateformatenforcer(data.bp_date)
-
-                    date_tmr = datetime.datetime.strptime(data.bp_date, "%d-%m-%Y") + datetime.timedelta(days=1)
+                    date_tmr = parse_bp_date(bp_date) + datetime.timedelta(days=1)
                     cursor.execute(
                         """
                         SELECT bp_id FROM battleplans WHERE date = ? AND owner = ?
                         """,
-                        (date_tmr.strftime("%d-%m-%Y"), owner,)
+                        (date_tmr.strftime(date_format), owner,)
                     )
-                    data = cursor.fetchone()
-                    if data:
-                        bp_id = data[0]
+                    row = cursor.fetchone()
+                    if row:
+                        bp_id = row[0]
                     else:
                         raise notfounderror("Battleplan ID for tomorrow not found.")
 
@@ -430,13 +565,23 @@ async def set_quota_done(request: Request, data: quota_data_set_done):
                     )
         except sqlite3.OperationalError as err:
             logbook.error(f"Database error while updating tomorrow's quota data: {err}", exception=err)
-        except notfounderror as err:
+        except (notfounderror, ValueError) as err:
             logbook.error(f"Value error while updating quota data: {err}", exception=err)
 
+    return True
+
+@router.post("/api/bps/quota/done/set")
+async def set_quota_done(request: Request, data: quota_data_set_done):
+    token:str = route_prechecks(request)
+    owner = request.state.auth.username
+    logbook.info(f"IP {request.client.host} ({owner}) is setting quota done amount for quota {data.quota_id} to {data.amount}.")
+
+    if not await database.run(set_quota_done_amount, data.quota_id, data.amount, data.bp_date, owner):
+        return JSONResponse({"success": False, "error": "Database error occurred while setting done quota amount."}, status_code=500)
     return JSONResponse({"success": True})
 
 def set_planned_quota(amount, quota_id, owner):
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
@@ -453,35 +598,18 @@ def set_planned_quota(amount, quota_id, owner):
 @router.post("/api/bps/quota/wanted/set")
 async def route_set_quota_wanted(request: Request, data: quota_data_set):
     token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
+    owner = request.state.auth.username
     logbook.info(f"IP {request.client.host} ({owner}) is setting the wanted quota amount for quota {data.quota_id} to {data.amount}.")
 
-    success = set_planned_quota(data.amount, data.quota_id, owner)
+    success = await database.run(set_planned_quota, data.amount, data.quota_id, owner)
 
     if success:
         return JSONResponse({"success": True}, status_code=200)
     else:
         return JSONResponse({"success": False, "error": "Database error occurred while setting wanted quota amount."}, status_code=500)
 
-def get_bp_date_by_quota_id(quota_id):
-    with sqlite3.connect(DB_PATH) as conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT bp_date FROM bp_quotas WHERE quota_id = ?
-                """,
-                (quota_id,)
-            )
-            row = cursor.fetchone()
-        except sqlite3.OperationalError as err:
-            logbook.error(f"Database error while getting bp date from Quota ID: {err}", exception=err)
-            return False
-
-    return datetime.datetime.now().strptime(row[0], "%d-%m-%Y") if row else False
-
 def get_quota_data(quota_id):
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.read() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
@@ -505,110 +633,68 @@ def get_quota_data(quota_id):
     else:
         return False
 
-def get_quota_name(quota_id):
-    with sqlite3.connect(DB_PATH) as conn:
+def distribute_weekly_target(quota_id: int, owner: str, amount):
+    """
+    Sets a quota's weekly target and spreads it evenly over the week the quota's battleplan falls in,
+    creating any missing battleplans and quotas for that week. All in one transaction.
+    Returns the number of days updated, None if the quota doesn't exist, or False on a database error.
+    """
+    weekday_end = settings.get.weekday_end()
+    daily_amount = amount // 7
+
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
-            cursor.execute("SELECT name FROM bp_quotas WHERE quota_id = ?", (quota_id,))
+            cursor.execute("SELECT bp_date, name FROM bp_quotas WHERE quota_id = ? AND owner = ?", (quota_id, owner))
             row = cursor.fetchone()
-            return row[0] if row else None
-        except sqlite3.OperationalError as err:
-            logbook.error(f"Database error getting quota name: {err}", exception=err)
-            return None
-
-@router.post("/api/bps/quota/weekly_target/set")
-async def set_weekly_target(request: Request, data: quota_data_set):
-    token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
-    logbook.info(f"{request.client.host} ({owner}) Has set weekly target for quota {data.quota_id} to {data.amount}.")
-
-    # First, get the quota's current data and verify it exists
-    quota_info = get_quota_data(data.quota_id)
-    if not quota_info:
-        return JSONResponse({"success": False, "error": "Quota not found."}, status_code=404)
-
-    # Get the BP date from the quota ID
-    bp_date = get_bp_date_by_quota_id(data.quota_id)
-    if not bp_date:
-        return JSONResponse({"success": False, "error": "Battleplan not found for this quota."}, status_code=404)
+            if row is None:
+                return None
+            bp_date, quota_name = row
 
-    # Get quota name
-    quota_name = get_quota_name(data.quota_id)
-    if not quota_name:
-        return JSONResponse({"success": False, "error": "Could not retrieve quota name."}, status_code=500)
+            week_start, week_end = week_bounds(datetime.datetime.strptime(bp_date, date_format).date(), weekday_end)
+            week_dates = [(week_start + datetime.timedelta(days=i)).strftime(date_format) for i in range(7)]
 
-    # Update the weekly target for the specific quota
-    with sqlite3.connect(DB_PATH) as conn:
-        try:
-            cursor = conn.cursor()
+            # Make sure the whole week has battleplans
+            cursor.execute(
+                f"""
+                INSERT INTO battleplans (date, owner) VALUES {", ".join(["(?, ?)"] * len(week_dates))}
+                ON CONFLICT(owner, date) DO NOTHING
+                """,
+                [value for date in week_dates for value in (date, owner)]
+            )
             cursor.execute(
-                "UPDATE bp_quotas SET weekly_target = ? WHERE quota_id = ? AND owner = ?",
-                (data.amount, data.quota_id, owner)
+                "SELECT date, bp_id FROM battleplans WHERE owner = ? AND date BETWEEN ? AND ?",
+                (owner, week_dates[0], week_dates[-1])
+            )
+            bp_ids = dict(cursor.fetchall())
+
+            cursor.executemany(
+                """
+                INSERT INTO bp_quotas (bp_id, bp_date, planned_amount, done_amount, owner, name, weekly_target)
+                VALUES (?, ?, ?, 0, ?, ?, ?)
+                ON CONFLICT(owner, bp_date, name) DO UPDATE
+                SET weekly_target = excluded.weekly_target, planned_amount = excluded.planned_amount
+                """,
+                [(bp_ids[date], date, daily_amount, owner, quota_name, amount) for date in week_dates]
             )
             conn.commit()
+            return len(week_dates)
         except sqlite3.OperationalError as err:
+            logbook.error(f"Database error while distributing the weekly target of quota {quota_id}: {err}", exception=err)
             conn.rollback()
-            logbook.error(f"Database error while setting weekly target: {err}", exception=err)
-            return JSONResponse({"success": False, "error": "Database error occurred."}, status_code=500)
-
-    # Calculate the current week range based on the quota's date
-    weekday_end = settings.get.weekday_end()
-
-    # Find the start of the week containing our BP date
-    bp_date_num = bp_date.isoweekday()  # 1=Mon … 7=Sun
-
-    # Calculate days to week start (weekday_end is the end day, so start is end_day + 1 mod 7)
-    days_to_week_start = (bp_date_num - (weekday_end + 1)) % 7
-    week_start = bp_date - datetime.timedelta(days=days_to_week_start)
-
-    # Week runs from week_start to week_start + 6 days
-    date_range = [week_start + datetime.timedelta(days=i) for i in range(7)]
-
-    # Calculate daily amount
-    daily_amount = data.amount // 7
-
-    # Update or create quotas for each day in the week
-    with sqlite3.connect(DB_PATH) as conn:
-        for date in date_range:
-            try:
-                cursor = conn.cursor()
-
-                # Ensure BP exists for this date
-                if not get_bp_exists(date, owner):
-                    bp_id = make_battplan(date, owner, return_bpid=True)
-                    if not bp_id:
-                        logbook.error(f"Failed to create battleplan for {date}")
-                        continue
-                else:
-                    bp_id = get_bp_id(date, owner)
-
-                # Check if quota already exists for this date
-                cursor.execute(
-                    "SELECT quota_id FROM bp_quotas WHERE owner = ? AND bp_date = ? AND name = ?",
-                    (owner, date.strftime("%d-%m-%Y"), quota_name)
-                )
-                existing_quota = cursor.fetchone()
-
-                if existing_quota:
-                    # Update existing quota
-                    quota_id = existing_quota[0]
-                    cursor.execute(
-                        "UPDATE bp_quotas SET weekly_target = ?, planned_amount = ? WHERE quota_id = ?",
-                        (data.amount, daily_amount, quota_id)
-                    )
-                else:
-                    # Create new quota
-                    cursor.execute(
-                        "INSERT INTO bp_quotas (bp_id, bp_date, planned_amount, done_amount, owner, name, weekly_target) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                        (bp_id, date.strftime("%d-%m-%Y"), daily_amount, 0, owner, quota_name, data.amount)
-                    )
+            return False
 
-                conn.commit()
+@router.post("/api/bps/quota/weekly_target/set")
+async def set_weekly_target(request: Request, data: quota_data_set):
+    token:str = route_prechecks(request)
+    owner = request.state.auth.username
+    logbook.info(f"{request.client.host} ({owner}) Has set weekly target for quota {data.quota_id} to {data.amount}.")
 
-            except sqlite3.OperationalError as err:
-                logbook.error(f"Error processing date {date}: {err}", exception=err)
-                conn.rollback()
-                continue
+    days = await database.run(distribute_weekly_target, data.quota_id, owner, data.amount)
+    if days is None:
+        return JSONResponse({"success": False, "error": "Quota not found."}, status_code=404)
+    if days is False:
+        return JSONResponse({"success": False, "error": "Database error occurred."}, status_code=500)
 
     return JSONResponse({"success": True, "message": "Weekly target set and distributed across the week."},
                         status_code=200)
@@ -619,13 +705,11 @@ class weekly_prod_get(BaseModel):
 @router.post("/api/bps/quota/weekly")
 async def get_weekly_production(request: Request, data: weekly_prod_get):
     token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
+    owner = request.state.auth.username
     logbook.info(f"IP {request.client.host} ({owner}) is fetching weekly production for {data.date}.")
 
-    # Ensure date format
-    date_str = dateformatenforcer(data.date)
     try:
-        date_obj = datetime.datetime.strptime(date_str, "%d-%m-%Y").date()
+        date_obj = parse_bp_date(data.date).date()
     except ValueError:
         return HTMLResponse("Invalid date format. Use DD-MM-YYYY.", status_code=400)
 
@@ -633,170 +717,392 @@ async def get_weekly_production(request: Request, data: weekly_prod_get):
     if weekday_end < 1 or weekday_end > 7:
         return HTMLResponse("weekday_end must be 1 (Monday) to 7 (Sunday).", status_code=400)
 
-    # Calculate the current weekday (1=Monday, 7=Sunday)
-    current_weekday = date_obj.isoweekday()
-    
-    # Calculate days to the most recent week start
-    # Week starts the day AFTER weekday_end
-    week_start_day = weekday_end + 1
-    if week_start_day > 7:
-        week_start_day = 1  # Wrap around to Monday if Sunday+1
-    
-    # Calculate how many days to go back to reach the start of this week
-    if current_weekday >= week_start_day:
-        days_to_week_start = current_weekday - week_start_day
-    else:
-        # If current day is before week_start_day in ISO week, 
-        # we need to go into previous ISO week
-        days_to_week_start = current_weekday + (7 - week_start_day)
-    
-    start_of_week = date_obj - datetime.timedelta(days=days_to_week_start)
-    
-    # Generate all dates in the week (7 days from start_of_week)
-    week_dates = [
-        (start_of_week + datetime.timedelta(days=i)).strftime("%d-%m-%Y")
-        for i in range(7)
-    ]
-
-    # Aggregate totals across the week
-    weekly_totals: dict[str, int] = {}
-    for date in week_dates:
-        day_data = get_quota_done_helper(date, owner)
-        for quota_name, done in day_data.items():
-            weekly_totals[quota_name] = weekly_totals.get(quota_name, 0) + done
+    start_of_week, end_of_week = week_bounds(date_obj, weekday_end)
+    weekly_totals = await database.run(get_quota_production, owner, start_of_week, end_of_week)
+    if weekly_totals is None:
+        return JSONResponse({"success": False, "error": "Database error occurred while fetching weekly production."}, status_code=500)
 
     return JSONResponse(content=weekly_totals, status_code=200)
 
+# period: (default bucket, how to find the window around a date)
+production_periods = {
+    "week": ("day", lambda date_obj, weekday_end: week_bounds(date_obj, weekday_end)),
+    "month": ("week", lambda date_obj, weekday_end: month_bounds(date_obj)),
+    "lookback": ("week", lambda date_obj, weekday_end: (
+        date_obj - datetime.timedelta(days=max(settings.get.lookback_length(), 1) - 1), date_obj
+    )),
+}
+
+@router.get("/api/bps/quota/production/{period}")
+async def get_production_trend(request: Request, period: str, date: str = None, bucket: str = None):
+    token:str = route_prechecks(request)
+    owner = request.state.auth.username
+    logbook.info(f"IP {request.client.host} ({owner}) is fetching {period} production for {date or 'today'}.")
+
+    if period not in production_periods:
+        return JSONResponse({"success": False, "error": f"Unknown period. Use one of {', '.join(production_periods)}."}, status_code=400)
+    default_bucket, get_window = production_periods[period]
+    bucket = bucket or default_bucket
+
+    try:
+        date_obj = parse_bp_date(date).date() if date else datetime.date.today()
+        weekday_end = settings.get.weekday_end()
+        start, end = get_window(date_obj, weekday_end)
+        buckets = await database.run(get_quota_production, owner, start, end, bucket, weekday_end)
+    except ValueError as err:
+        return JSONResponse({"success": False, "error": str(err)}, status_code=400)
+
+    if buckets is None:
+        return JSONResponse({"success": False, "error": "Database error occurred while fetching production."}, status_code=500)
+
+    totals = {}
+    series = []
+    for bucket_start, bucket_totals in buckets.items():
+        series.append({"start": display_bp_date(bucket_start), "totals": bucket_totals})
+        for name, done in bucket_totals.items():
+            totals[name] = totals.get(name, 0) + done
+
+    return JSONResponse({
+        "period": period,
+        "bucket": bucket,
+        "start": start.strftime(display_date_format),
+        "end": end.strftime(display_date_format),
+        "totals": totals,
+        "series": series,
+    }, status_code=200)
+
 class clearbp_data(BaseModel):
     date: str
 
-@router.post("/api/bps/clear")
-async def clear_bp(request: Request, data: clearbp_data):
-    token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
-    logbook.info(f"IP {request.client.host} ({owner}) is clearing battleplan for {data.date}.")
-    date_obj = datetime.datetime.strptime(data.date, "%d-%B-%Y")
-
+def clear_battleplan(date_obj: datetime.datetime, owner: str):
+    """
+    Removes a battleplan's tasks and quotas. Returns None if it doesn't exist, or False on a database error.
+    """
     if not get_bp_exists(date_obj, owner):
-        return JSONResponse({"success": False, "error": "Battleplan does not exist."}, status_code=404)
+        return None
 
     bp_id = get_bp_id(date_obj, owner)
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
-            cursor.execute("DELETE FROM bp_tasks WHERE date = ? AND owner = ?", (date_obj.strftime("%d-%m-%Y"), owner))
+            cursor.execute("DELETE FROM bp_tasks WHERE date = ? AND owner = ?", (date_obj.strftime(date_format), owner))
             cursor.execute("DELETE FROM bp_quotas WHERE bp_id = ? AND owner = ?", (bp_id, owner))
             conn.commit()
-            return JSONResponse({"success": True}, status_code=200)
+            return True
         except sqlite3.OperationalError as err:
             logbook.error(f"Database error while clearing battleplan: {err}", exception=err)
             conn.rollback()
-            return JSONResponse({"success": False, "error": "Database error occurred while clearing battleplan."}, status_code=500)
+            return False
+
+@router.post("/api/bps/clear")
+async def clear_bp(request: Request, data: clearbp_data):
+    token:str = route_prechecks(request)
+    owner = request.state.auth.username
+    logbook.info(f"IP {request.client.host} ({owner}) is clearing battleplan for {data.date}.")
+    try:
+        date_obj = parse_bp_date(data.date)
+    except ValueError as err:
+        return JSONResponse({"success": False, "error": str(err)}, status_code=400)
+
+    cleared = await database.run(clear_battleplan, date_obj, owner)
+    if cleared is None:
+        return JSONResponse({"success": False, "error": "Battleplan does not exist."}, status_code=404)
+    if cleared is False:
+        return JSONResponse({"success": False, "error": "Database error occurred while clearing battleplan."}, status_code=500)
+    return JSONResponse({"success": True}, status_code=200)
 
 class yesterday_import_bp_data(BaseModel):
     date_today: str
+    date_from: str|None = None  # First day to carry over from. Defaults to yesterday.
+
+# How far back the automatic carry-over looks for a user's last battleplan
+auto_carry_over_max_days = 14
+
+def carry_over(owner: str, source_start: datetime.date, source_end: datetime.date, target: datetime.date):
+    """
+    Carries unfinished tasks and quota remainders from every battleplan between source_start and source_end
+    (inclusive) into target's battleplan, creating it if needed. All in one transaction.
+
+    A task is only carried if its last occurrence in the source range is unfinished.
+    Tasks already on the target day, and quotas it already has, are left alone, so running it twice is harmless.
+    A quota's remainder on its last source day is added to its daily share of the weekly target, unless
+    reset_bp_plan_on_new_week is on and that day was in an earlier week than target. Only the last day counts
+    because a day that was itself carried into already includes the remainders before it.
+
+    Returns {"tasks": count, "quotas": count}, None if there are no battleplans in the source range,
+    or False on a database error.
+    """
+    if source_start > source_end or source_end >= target:
+        raise ValueError("The days to carry over from must come before the day carried into.")
+
+    source_start_str, source_end_str = source_start.strftime(date_format), source_end.strftime(date_format)
+    target_str = target.strftime(date_format)
+    week_start = week_bounds(target, settings.get.weekday_end())[0].strftime(date_format)
+    reset_on_new_week = settings.get.reset_bp_plan_on_new_week()
+
+    with database.write() as conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT COUNT(*) FROM battleplans WHERE owner = ? AND date BETWEEN ? AND ?",
+                (owner, source_start_str, source_end_str)
+            )
+            if cursor.fetchone()[0] == 0:
+                return None
 
-def import_tasks(conn, owner, date_yesterday, date_today, save=True):
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT task_id, task, is_done, category FROM bp_tasks WHERE date = ? AND owner = ? AND is_done = ?",
-        (date_yesterday.strftime("%d-%m-%Y"), owner, False)
-    )
-    task_data = cursor.fetchall()
+            cursor.execute(
+                "INSERT INTO battleplans (date, owner) VALUES (?, ?) ON CONFLICT(owner, date) DO NOTHING",
+                (target_str, owner)
+            )
+            cursor.execute("SELECT bp_id FROM battleplans WHERE owner = ? AND date = ?", (owner, target_str))
+            target_bp_id = cursor.fetchone()[0]
 
-    tasks = [{"task_id": t[0], "task": t[1], "is_done": t[2], "category": t[3]} for t in task_data]
+            # Each unfinished task once, in the order it was first written down.
+            # A task finished on the same or a later day in the range, e.g. after an earlier carry-over, is left behind.
+            cursor.execute(
+                """
+                INSERT INTO bp_tasks (date, task, is_done, owner, category)
+                SELECT ?, task, False, owner, category FROM bp_tasks source
+                WHERE owner = ? AND date BETWEEN ? AND ? AND is_done = False
+                AND NOT EXISTS (
+                    SELECT 1 FROM bp_tasks done
+                    WHERE done.owner = source.owner AND done.task = source.task AND done.category = source.category
+                    AND done.is_done = True AND done.date BETWEEN source.date AND ?
+                )
+                AND NOT EXISTS (
+                    SELECT 1 FROM bp_tasks existing
+                    WHERE existing.owner = source.owner AND existing.date = ?
+                    AND existing.task = source.task AND existing.category = source.category
+                )
+                GROUP BY task, category
+                ORDER BY MIN(task_id)
+                """,
+                (target_str, owner, source_start_str, source_end_str, source_end_str, target_str)
+            )
+            tasks_imported = cursor.rowcount
 
-    if save:
-        for task in tasks:
             cursor.execute(
-                "INSERT INTO bp_tasks (date, task, is_done, owner, category) VALUES (?, ?, ?, ?, ?)",
-                (date_today.strftime("%d-%m-%Y"), task['task'], task['is_done'], owner, task['category'])
+                """
+                SELECT name, bp_date, planned_amount, done_amount, weekly_target FROM bp_quotas source
+                WHERE owner = ? AND bp_date BETWEEN ? AND ?
+                AND NOT EXISTS (
+                    SELECT 1 FROM bp_quotas existing
+                    WHERE existing.owner = source.owner AND existing.bp_date = ? AND existing.name = source.name
+                )
+                ORDER BY bp_date
+                """,
+                (owner, source_start_str, source_end_str, target_str)
             )
-    return tasks
-
-def import_quotas(conn, owner, today_bp_id, yesterday_bp_id, date_today, save=True):
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT bp_id, bp_date, planned_amount, done_amount, owner, name, weekly_target "
-        "FROM bp_quotas WHERE bp_id = ? AND owner = ?",
-        (yesterday_bp_id, owner)
-    )
-    quota_rows = cursor.fetchall()
-
-    quotas_list = []
-    for item in quota_rows:
-        if not check_quota_exists(today_bp_id, item[5]):
-            planned_amount = item[2]
-            done_amount = item[3]
-            weekly_target = item[6]
-
-            # Reset planned amount if new week
-            if date_today.isoweekday() - 1 == settings.get.weekday_end():
-                if settings.get.reset_bp_plan_on_new_week():
+            quota_days = {}
+            for name, bp_date, planned_amount, done_amount, weekly_target in cursor.fetchall():
+                quota_days.setdefault(name, []).append((bp_date, planned_amount, done_amount, weekly_target))
+
+            quotas = []
+            for name, days in quota_days.items():
+                last_date, last_planned, last_done, weekly_target = days[-1]
+                if reset_on_new_week and last_date < week_start:
                     planned_amount = 0
+                else:
+                    remainder = max(last_planned - last_done, 0)
+                    planned_amount = remainder + weekly_target // 7 if remainder > 0 else last_planned
+                quotas.append((target_bp_id, target_str, planned_amount, 0, owner, name, weekly_target))
 
-            needed_per_day = weekly_target // 7
-            if done_amount < planned_amount:
-                remainder = planned_amount - done_amount
-                planned_amount = remainder + needed_per_day
-
-            quota = {
-                "bp_id": today_bp_id,
-                "bp_date": date_today.strftime("%d-%m-%Y"),
-                "planned_amount": planned_amount,
-                "done_amount": 0,
-                "owner": item[4],
-                "name": item[5],
-                "weekly_target": weekly_target
-            }
-            quotas_list.append(quota)
-        else:
-            logbook.info(f"The quota name {item[5]} for BP ID {today_bp_id} exists. Skipping.")
-
-    if save:
-        for quota in quotas_list:
-            try:
-                cursor.execute(
-                    "INSERT INTO bp_quotas (bp_id, bp_date, planned_amount, done_amount, owner, name, weekly_target) "
-                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
-                    (quota['bp_id'], quota['bp_date'], quota['planned_amount'], quota['done_amount'],
-                     quota['owner'], quota['name'], quota['weekly_target'])
-                )
-            except sqlite3.IntegrityError:
-                cursor.execute(
-                    "UPDATE bp_quotas SET bp_id=?, bp_date=?, planned_amount=?, done_amount=?, owner=?, name=?, weekly_target=? "
-                    "WHERE bp_id=? AND owner=?",
-                    (quota['bp_id'], quota['bp_date'], quota['planned_amount'], quota['done_amount'],
-                     quota['owner'], quota['name'], quota['weekly_target'], today_bp_id, owner)
-                )
+            cursor.executemany(
+                """
+                INSERT INTO bp_quotas (bp_id, bp_date, planned_amount, done_amount, owner, name, weekly_target)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(owner, bp_date, name) DO NOTHING
+                """,
+                quotas
+            )
+            conn.commit()
+        except sqlite3.OperationalError as err:
+            logbook.error(f"Database error while carrying over battleplans for {owner} into {target_str}: {err}", exception=err)
+            conn.rollback()
+            return False
 
-    return quotas_list
+    return {"tasks": tasks_imported, "quotas": len(quotas)}
+
+def carry_over_all(target: datetime.date):
+    """
+    Carries every user's battleplans since their last tasks and quotas into target, for users who have had some
+    in the last auto_carry_over_max_days days and haven't started on target yet.
+    Started means having tasks on target or progress on one of its quotas. Empty battleplans and quotas that
+    distribute_weekly_target created ahead of time don't count.
+    """
+    target_str = target.strftime(date_format)
+    earliest = (target - datetime.timedelta(days=auto_carry_over_max_days)).strftime(date_format)
+    yesterday = (target - datetime.timedelta(days=1)).strftime(date_format)
+    with database.read() as conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT owner, MIN(last_date) FROM (
+                    SELECT owner, MAX(date) AS last_date FROM bp_tasks WHERE date BETWEEN ? AND ? GROUP BY owner
+                    UNION ALL
+                    SELECT owner, MAX(bp_date) FROM bp_quotas WHERE bp_date BETWEEN ? AND ? GROUP BY owner
+                ) last
+                WHERE NOT EXISTS (SELECT 1 FROM bp_tasks t WHERE t.owner = last.owner AND t.date = ?)
+                AND NOT EXISTS (SELECT 1 FROM bp_quotas q WHERE q.owner = last.owner AND q.bp_date = ? AND q.done_amount > 0)
+                GROUP BY owner
+                """,
+                (earliest, yesterday, earliest, yesterday, target_str, target_str)
+            )
+            last_dates = cursor.fetchall()
+        except sqlite3.OperationalError as err:
+            logbook.error(f"Database error while finding battleplans to carry over: {err}", exception=err)
+            return
+
+    source_end = target - datetime.timedelta(days=1)
+    for owner, last_date in last_dates:
+        result = carry_over(owner, datetime.datetime.strptime(last_date, date_format).date(), source_end, target)
+        if result:
+            logbook.info(f"Carried {result['tasks']} tasks and {result['quotas']} quotas over into {target_str} for {owner}.")
+
+def _carry_over_scheduler():
+    while True:
+        now = datetime.datetime.now()
+        tomorrow = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+        time.sleep((tomorrow - now).total_seconds() + 1)
+        if not settings.get.auto_carry_over_bps():
+            continue
+        try:
+            carry_over_all(datetime.date.today())
+        except Exception as err:
+            logbook.error(f"Error during the automatic battleplan carry-over: {err}", exception=err)
+
+# Only one process runs the scheduler. It holds this lock file for as long as it lives.
+carry_over_lock_path = "bp-carry-over.lock"
+_carry_over_lock = threading.Lock()
+_carry_over_file_lock = None
+
+def startup():
+    """
+    Called from the app lifespan. Starts the daily carry-over scheduler unless this or another process already has.
+    """
+    global _carry_over_file_lock
+    with _carry_over_lock:
+        if _carry_over_file_lock is not None:
+            return
+        file_lock = FileLock(carry_over_lock_path)
+        try:
+            file_lock.acquire(timeout=0)
+        except Timeout:
+            logbook.info("The battleplan carry-over is already scheduled by another process.")
+            return
+        _carry_over_file_lock = file_lock
+    threading.Thread(target=_carry_over_scheduler, name="bp-carry-over", daemon=True).start()
 
 @router.post("/api/bps/yesterday_import")
 async def yesterday_import(request: Request, data: yesterday_import_bp_data):
     token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
-    logbook.info(f"IP {request.client.host} ({owner}) is importing yesterday's battleplan to {data.date_today}.")
+    owner = request.state.auth.username
+    logbook.info(f"IP {request.client.host} ({owner}) is importing {data.date_from or 'yesterday'}'s battleplan to {data.date_today}.")
+
+    try:
+        date_today = parse_bp_date(data.date_today)
+        date_from = parse_bp_date(data.date_from) if data.date_from else date_today - datetime.timedelta(days=1)
+    except ValueError as err:
+        return JSONResponse({"success": False, "error": str(err)}, status_code=400)
 
-    date_today = datetime.datetime.strptime(data.date_today, "%d-%B-%Y")
-    if not get_bp_exists(date_today, owner):
+    if not await database.run(get_bp_exists, date_today, owner):
         return JSONResponse({"success": False, "error": "Battleplan for today does not exist."}, status_code=409)
 
-    date_yesterday = date_today - datetime.timedelta(days=1)
-    if not get_bp_exists(date_yesterday, owner):
-        return JSONResponse({"success": False, "error": "A Battleplan for Yesterday does not exist."}, status_code=404)
+    try:
+        result = await database.run(
+            carry_over, owner, date_from.date(), (date_today - datetime.timedelta(days=1)).date(), date_today.date()
+        )
+    except ValueError as err:
+        return JSONResponse({"success": False, "error": str(err)}, status_code=400)
+
+    if result is None:
+        error = "No battleplans exist to import from." if data.date_from else "A Battleplan for Yesterday does not exist."
+        return JSONResponse({"success": False, "error": error}, status_code=404)
+    if result is False:
+        return JSONResponse({"success": False, "error": "Database error during yesterday's import."}, status_code=500)
+
+    return JSONResponse({"success": True, "tasks_imported": result["tasks"], "quotas_imported": result["quotas"]}, status_code=200)
+
+def get_snapshot(owner: str, date_obj: datetime.date):
+    """
+    Everything the battleplans page shows for a day: its tasks and quotas, the week's production totals and how many
+    tasks were left unfinished the day before. Returns None if there's no battleplan that day, or False on a database error.
+    """
+    date_str = date_obj.strftime(date_format)
+    previous_day = (date_obj - datetime.timedelta(days=1)).strftime(date_format)
+    week_start, week_end = week_bounds(date_obj, settings.get.weekday_end())
+
+    with database.read() as conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT bp_id FROM battleplans WHERE owner = ? AND date = ?", (owner, date_str))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            bp_id = row[0]
 
-    today_bp_id = get_bp_id(date_today, owner)
-    yesterday_bp_id = get_bp_id(date_yesterday, owner)
+            cursor.execute(
+                "SELECT task, is_done, task_id, category FROM bp_tasks WHERE owner = ? AND date = ? ORDER BY task_id",
+                (owner, date_str)
+            )
+            tasks = [{"text": task, "done": bool(is_done), "id": task_id, "category": category}
+                     for task, is_done, task_id, category in cursor.fetchall()]
 
-    with sqlite3.connect(DB_PATH) as conn:
-        try:
-            tasks = import_tasks(conn, owner, date_yesterday, date_today, save=True)
-            quotas = import_quotas(conn, owner, today_bp_id, yesterday_bp_id, date_today, save=True)
-            conn.commit()
+            cursor.execute(
+                f"SELECT {quota_columns} FROM bp_quotas WHERE owner = ? AND bp_date = ? ORDER BY quota_id",
+                (owner, date_str)
+            )
+            quotas = [parse_quota_row(item) for item in cursor.fetchall()]
+
+            cursor.execute(
+                "SELECT COUNT(*) FROM bp_tasks WHERE owner = ? AND date = ? AND is_done = False",
+                (owner, previous_day)
+            )
+            previous_day_unfinished = cursor.fetchone()[0]
         except sqlite3.OperationalError as err:
-            logbook.error(f"Database error during yesterday's import: {err}", exception=err)
-            conn.rollback()
-            return JSONResponse({"success": False, "error": "Database error during yesterday's import."}, status_code=500)
+            logbook.error(f"Database error while building the battleplan snapshot for {date_str}: {err}", exception=err)
+            return False
+
+        week_totals = get_quota_production(owner, week_start, week_end)
+        if week_totals is None:
+            return False
+
+    return {
+        "bp_id": bp_id,
+        "date": date_obj.strftime(display_date_format),
+        "tasks": tasks,
+        "quotas": quotas,
+        "week": {
+            "start": week_start.strftime(display_date_format),
+            "end": week_end.strftime(display_date_format),
+            "totals": week_totals,
+        },
+        "previous_day_unfinished": previous_day_unfinished,
+    }
+
+@router.get("/api/bps/snapshot/{date}")
+async def get_bp_snapshot(request: Request, date: str):
+    token:str = route_prechecks(request)
+    owner = request.state.auth.username
+    logbook.info(f"IP {request.client.host} ({owner}) is fetching the battleplan snapshot for {date}.")
+
+    try:
+        date_obj = parse_bp_date(date).date()
+    except ValueError as err:
+        return JSONResponse({"success": False, "error": str(err)}, status_code=400)
+
+    snapshot = await database.run(get_snapshot, owner, date_obj)
+    if snapshot is None:
+        return JSONResponse({"success": False, "error": "Battleplan does not exist."}, status_code=404)
+    if snapshot is False:
+        return JSONResponse({"success": False, "error": "Database error occurred while fetching the battleplan."}, status_code=500)
+
+    # The snapshot is always rebuilt, but an unchanged day isn't sent again
+    content = json.dumps(snapshot, separators=(",", ":"), sort_keys=True)
+    etag = f'"{hashlib.sha256(content.encode()).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type="application/json", headers=headers)
 
-    return JSONResponse({"success": True, "tasks_imported": len(tasks), "quotas_imported": len(quotas)}, status_code=200)
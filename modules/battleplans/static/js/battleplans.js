@@ -22,15 +22,16 @@ async function loadFullBP({ day, month }, do_alert = true) {
     currentBPDate = fullDateStr;
     selectedBPDate = fullDateStr; // Set as selected
 
-    const res = await fetch(`/api/bps/get/${fullDateStr}`);
+    // Tasks, quotas and the week's totals in one request. Unchanged days come back as a 304 from the browser cache.
+    const res = await fetch(`/api/bps/snapshot/${fullDateStr}`);
     if (!res.ok) throw new Error("Failed to fetch full battle plan");
     const bpData = await res.json();
 
     currentBPId = bpData.bp_id || null;
     if (bpIndicator) bpIndicator.textContent = `BattlePlan: ${bpData.date || fullDateStr}`;
 
-    await loadQuotas(currentBPId, currentBPDate);
-    await updateQuotaStatus(currentBPId);
+    renderQuotas(currentBPId, bpData.quotas);
+    renderWeeklyTotals(currentBPId, bpData.week.totals);
 
     taskList.innerHTML = "";
     bpData.tasks.forEach(task => {
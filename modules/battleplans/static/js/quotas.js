@@ -8,49 +8,51 @@ async function loadQuotas(bpId, bpDate = currentBPDate) {
   try {
     const res = await fetch(`/api/bps/quota/list/${encodeURIComponent(bpDate)}`);
     if (!res.ok) throw new Error("Failed to load quotas");
-    const quotas = await res.json();
-
-    quotaList.innerHTML = "";
-    quotas.forEach(quota => {
-      const row = document.createElement("div");
-      row.className = "quota-row";
-      row.dataset.quotaId = quota.quota_id;
-      row.dataset.bpId = bpId;
-
-      row.innerHTML = `
-        <span class="quota-name">${quota.name}</span>
-        <input type="number" class="quota-done" value="${quota.done_amount || 0}" min="0"> /
-        <input type="number" class="quota-needed" value="${quota.planned_amount || 0}" min="0"> Goal: 
-        <input type="number" class="quota-weekly-target" value="${quota.weekly_target || 0}" min="0">
-      `;
-
-      const neededInput = row.querySelector(".quota-needed");
-      const doneInput = row.querySelector(".quota-done");
-      const weeklyTargetInput = row.querySelector(".quota-weekly-target");
-
-      neededInput.addEventListener("input", e => {
-        const val = parseFloat(e.target.value);
-        if (!isNaN(val)) debouncedSaveNeeded(quota.quota_id, val);
-      });
-
-      doneInput.addEventListener("input", e => {
-        const val = parseFloat(e.target.value);
-        if (!isNaN(val)) debouncedSaveDone(quota.quota_id, val);
-      });
-
-      weeklyTargetInput.addEventListener("input", e => {
-        const val = parseFloat(e.target.value);
-        if (!isNaN(val)) debouncedSaveWeeklyTarget(quota.quota_id, val);
-      });
-
-      quotaList.appendChild(row);
-    });
+    renderQuotas(bpId, await res.json());
   } catch (err) {
     console.error(err);
     toast("Failed to load quota info", "error");
   }
 }
 
+function renderQuotas(bpId, quotas) {
+  quotaList.innerHTML = "";
+  quotas.forEach(quota => {
+    const row = document.createElement("div");
+    row.className = "quota-row";
+    row.dataset.quotaId = quota.quota_id;
+    row.dataset.bpId = bpId;
+
+    row.innerHTML = `
+      <span class="quota-name">${quota.name}</span>
+      <input type="number" class="quota-done" value="${quota.done_amount || 0}" min="0"> /
+      <input type="number" class="quota-needed" value="${quota.planned_amount || 0}" min="0"> Goal: 
+      <input type="number" class="quota-weekly-target" value="${quota.weekly_target || 0}" min="0">
+    `;
+
+    const neededInput = row.querySelector(".quota-needed");
+    const doneInput = row.querySelector(".quota-done");
+    const weeklyTargetInput = row.querySelector(".quota-weekly-target");
+
+    neededInput.addEventListener("input", e => {
+      const val = parseFloat(e.target.value);
+      if (!isNaN(val)) debouncedSaveNeeded(quota.quota_id, val);
+    });
+
+    doneInput.addEventListener("input", e => {
+      const val = parseFloat(e.target.value);
+      if (!isNaN(val)) debouncedSaveDone(quota.quota_id, val);
+    });
+
+    weeklyTargetInput.addEventListener("input", e => {
+      const val = parseFloat(e.target.value);
+      if (!isNaN(val)) debouncedSaveWeeklyTarget(quota.quota_id, val);
+    });
+
+    quotaList.appendChild(row);
+  });
+}
+
 async function saveQuota(type, quotaId, value) {
   if (!currentBPId) return;
   let url, payload;
@@ -93,36 +95,38 @@ async function updateQuotaStatus(bpId, bpDate = currentBPDate) {
     if (!res.ok) return;
 
     // Backend now returns { "QuotaA": 42, "QuotaB": 19, ... }
-    const weeklyTotals = await res.json();
-
-    // Find ALL quota rows for this bpId
-    const quotaRows = document.querySelectorAll(`.quota-row[data-bp-id="${String(bpId)}"]`);
-    if (!quotaRows.length) return;
-
-    quotaRows.forEach(quotaRow => {
-      // Remove old breakdown if it exists
-      const oldBreakdown = quotaRow.querySelector(".weekly-breakdown");
-      if (oldBreakdown) oldBreakdown.remove();
-
-      // Get the quota name from this specific row
-      const quotaNameElement = quotaRow.querySelector(".quota-name");
-      const quotaName = quotaNameElement ? quotaNameElement.textContent.trim() : null;
-
-      if (quotaName && weeklyTotals[quotaName] !== undefined) {
-        // Create a new breakdown element
-        const breakdownDiv = document.createElement("div");
-        breakdownDiv.className = "weekly-breakdown";
-
-        // Display only the relevant quota's weekly total
-        const statEl = document.createElement("span");
-        statEl.className = "weekly-stat";
-        statEl.textContent = `Weekly: ${weeklyTotals[quotaName]}`;
-        breakdownDiv.appendChild(statEl);
-
-        quotaRow.appendChild(breakdownDiv);
-      }
-    });
+    renderWeeklyTotals(bpId, await res.json());
   } catch (err) {
     console.error("Error fetching weekly production:", err);
   }
 }
+
+function renderWeeklyTotals(bpId, weeklyTotals) {
+  // Find ALL quota rows for this bpId
+  const quotaRows = document.querySelectorAll(`.quota-row[data-bp-id="${String(bpId)}"]`);
+  if (!quotaRows.length) return;
+
+  quotaRows.forEach(quotaRow => {
+    // Remove old breakdown if it exists
+    const oldBreakdown = quotaRow.querySelector(".weekly-breakdown");
+    if (oldBreakdown) oldBreakdown.remove();
+
+    // Get the quota name from this specific row
+    const quotaNameElement = quotaRow.querySelector(".quota-name");
+    const quotaName = quotaNameElement ? quotaNameElement.textContent.trim() : null;
+
+    if (quotaName && weeklyTotals[quotaName] !== undefined) {
+      // Create a new breakdown element
+      const breakdownDiv = document.createElement("div");
+      breakdownDiv.className = "weekly-breakdown";
+
+      // Display only the relevant quota's weekly total
+      const statEl = document.createElement("span");
+      statEl.className = "weekly-stat";
+      statEl.textContent = `Weekly: ${weeklyTotals[quotaName]}`;
+      breakdownDiv.appendChild(statEl);
+
+      quotaRow.appendChild(breakdownDiv);
+    }
+  });
+}
@@ -1,9 +1,10 @@
-from library.auth import route_prechecks, authbook, authtype
+from library.auth import route_prechecks
 from modules.centralfiles.routes import centralfiles
 from library.modules import list_all_privelliged
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
 from library.logbook import LogBookHandler
+from library.database import database
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Request
 from library.settings import get
@@ -16,19 +17,18 @@ logbook = LogBookHandler("browser routes")
 @router.get("/apps", response_class=HTMLResponse)
 async def show_apps(request: Request):
     token = route_prechecks(request)
-    owner = authbook.token_owner(token)
+    owner = request.state.auth.username
     logbook.info(f"IP {request.client.host} (user: {owner}) has accessed the app browser.")
 
-    MODULES = list_all_privelliged(owner)
+    MODULES = list_all_privelliged(owner, user_perms=request.state.auth.permissions)
 
     enabled_modules = sorted(
         [m for m in MODULES.values() if m.get("enabled")],
         key=lambda m: m.get("order", 0)
     )
 
-    user = authbook.user_account(owner, authtype.token(token))
     expiration_date = get.time_to_ssl_expiration()
-    do_warn_user = (expiration_date - timedelta(days=7) <= datetime.now()) and user.get_is_admin()
+    do_warn_user = (expiration_date - timedelta(days=7) <= datetime.now()) and request.state.auth.is_admin
 
     # Save some computational power
     if do_warn_user:
@@ -45,6 +45,6 @@ async def show_apps(request: Request):
             "modules": enabled_modules,
             "ssl_expiration_msg": warn_msg,
             "do_warn_expiration": do_warn_user,
-            "profile": centralfiles.get_profile(cfid=user.assosciated_cfid)
+            "profile": await database.run(centralfiles.get_profile, cfid=request.state.auth.cfid)
         }
     )
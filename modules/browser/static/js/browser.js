@@ -23,7 +23,13 @@
 })();
 
 let logout_btn = document.getElementById("logout-btn")
-logout_btn.addEventListener('click', () => {
+logout_btn.addEventListener('click', async () => {
+    // Revoke the session server-side first, then clear all cookies
+    try {
+        await fetch("/api/user/logout", { method: "POST" });
+    } catch (err) {
+        console.error("Failed to revoke the session:", err);
+    }
     // Clears all cookies
     document.cookie.split(";").forEach(cookie => {
         const eqPos = cookie.indexOf("=");
@@ -1,13 +1,271 @@
 from library.logbook import LogBookHandler
+from library.database import database
 from library.auth import authbook
+from collections import OrderedDict
+from PIL import Image, ImageOps
+import functools
+import threading
 import datetime
+import hashlib
+import base64
+import inspect
 import sqlite3
+import json
+import magic
+import copy
+import unicodedata
+import warnings
+import time
+import io
+import re
 
 logbook = LogBookHandler("Central Files")
-DB_PATH = "data.sqlite"
+
+# Longest edge, in pixels, of the pre-scaled copies made of every profile image.
+profile_thumbnail_sizes = (64, 256)
+
+def make_profile_thumbnails(image_bytes: bytes):
+    """
+    Sniffs, hashes and scales a profile image.
+
+    :return: (mimetype, content_hash, {size: (thumbnail_bytes, thumbnail_mimetype)})
+    :raises centralfiles.errors.ImageTooLarge: If the image decompresses to more pixels than Pillow allows.
+    """
+    mimetype = magic.Magic(mime=True).from_buffer(image_bytes) or "application/octet-stream"
+    content_hash = hashlib.sha256(image_bytes).hexdigest()
+
+    thumbnails = {}
+    try:
+        # Pillow only warns for images between its pixel limit and twice that; treat those as too large as well
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            original = Image.open(io.BytesIO(image_bytes))
+            original.load()
+        with original:
+            original = ImageOps.exif_transpose(original)
+            has_alpha = original.mode in ("RGBA", "LA") or (original.mode == "P" and "transparency" in original.info)
+
+            for size in profile_thumbnail_sizes:
+                thumbnail = original.copy()
+                thumbnail.thumbnail((size, size))
+                output = io.BytesIO()
+                if has_alpha:
+                    thumbnail.convert("RGBA").save(output, format="PNG", optimize=True)
+                    thumbnails[size] = (output.getvalue(), "image/png")
+                else:
+                    thumbnail.convert("RGB").save(output, format="JPEG", quality=85, optimize=True)
+                    thumbnails[size] = (output.getvalue(), "image/jpeg")
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning) as err:
+        raise centralfiles.errors.ImageTooLarge() from err
+    except (OSError, ValueError) as err:
+        # Not something Pillow can read; every size just gets the original
+        logbook.warning(f"Could not make thumbnails for a {mimetype} profile image: {err}")
+        thumbnails = {size: (image_bytes, mimetype) for size in profile_thumbnail_sizes}
+
+    return mimetype, content_hash, thumbnails
+
+def store_profile_image(cursor, cfid, image_bytes: bytes):
+    """
+    Writes a profile image and its thumbnails using an open cursor.
+    """
+    mimetype, content_hash, thumbnails = make_profile_thumbnails(image_bytes)
+    cursor.execute(
+        """
+        INSERT INTO cf_profile_images (cfid, image, mimetype, content_hash) VALUES (?, ?, ?, ?)
+        ON CONFLICT(cfid) DO UPDATE SET image=excluded.image, mimetype=excluded.mimetype, content_hash=excluded.content_hash
+        """,
+        (cfid, image_bytes, mimetype, content_hash)
+    )
+    cursor.execute("DELETE FROM cf_profile_thumbnails WHERE cfid = ?", (cfid,))
+    cursor.executemany(
+        "INSERT INTO cf_profile_thumbnails (cfid, size, content_hash, mimetype, image) VALUES (?, ?, ?, ?, ?)",
+        [
+            (cfid, size, content_hash, thumb_mimetype, thumb_bytes)
+            for size, (thumb_bytes, thumb_mimetype) in thumbnails.items()
+        ]
+    )
+
+class ProfileCache:
+    """
+    Bounded LRU of built profiles keyed by cfid.
+    Every write to a cfid's profile data drops its entry, so the TTL only has to keep computed ages fresh.
+    Each invalidation also bumps a generation, so a profile read before the invalidation is not cached after it.
+    """
+    def __init__(self, max_size: int = 1024, ttl_seconds: int = 3600):
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.clear_generation = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, cfid: int):
+        with self.lock:
+            entry = self.entries.get(cfid)
+            if entry is None or time.monotonic() - entry[1] >= self.ttl:
+                if entry is not None:
+                    del self.entries[cfid]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(cfid)
+            self.hits += 1
+            return copy.deepcopy(entry[0])
+
+    def generation(self, cfid: int):
+        """
+        Take this before reading a profile from the database and pass it to set().
+        """
+        with self.lock:
+            return self.clear_generation, self.generations.get(cfid, 0)
+
+    def set(self, cfid: int, profile: dict, generation=None):
+        with self.lock:
+            if generation is not None and generation != (self.clear_generation, self.generations.get(cfid, 0)):
+                # Invalidated while it was being read, so it may already be stale
+                return
+            self.entries[cfid] = (copy.deepcopy(profile), time.monotonic())
+            self.entries.move_to_end(cfid)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, cfid: int = None):
+        """
+        Drops one cfid's profile, or every profile if cfid is None.
+        """
+        with self.lock:
+            if cfid is None:
+                self.entries.clear()
+                self.clear_generation += 1
+            else:
+                cfid = int(cfid)
+                self.entries.pop(cfid, None)
+                self.generations[cfid] = self.generations.get(cfid, 0) + 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+profile_cache = ProfileCache()
+
+def _invalidates_profile(func):
+    """
+    Drops the cached profile of the cfid a write touches, taken from self.cfid or a cfid argument.
+    The cfid is resolved before the write runs so deletes can still look it up. The write runs in a transaction and
+    the profile is dropped once that transaction commits, so no reader can cache the old data after the drop.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        arguments = signature.bind_partial(*args, **kwargs).arguments
+        if "self" in arguments:
+            cfid = arguments["self"].cfid
+        else:
+            cfid = arguments.get("cfid")
+
+        with database.write():
+            result = func(*args, **kwargs)
+            database.after_commit(lambda: profile_cache.invalidate(cfid))
+            return result
+    return wrapper
+
+# Duplicate detection works word by word, so "Smith John" still matches "John Smith".
+_soundex_codes = {
+    letter: str(code)
+    for code, letters in enumerate(("bfpv", "cgjkqsxz", "dt", "l", "mn", "r"), start=1)
+    for letter in letters
+}
+
+def _name_words(name) -> list:
+    """
+    Lowercase words of a name with accents stripped.
+    """
+    decomposed = unicodedata.normalize("NFKD", name or "")
+    plain = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return re.findall(r"[^\W\d_]+", plain.lower())
+
+def _soundex(word:str) -> str:
+    previous = _soundex_codes.get(word[0])
+    codes = []
+    for letter in word[1:]:
+        code = _soundex_codes.get(letter)
+        if code is not None and code != previous:
+            codes.append(code)
+        # h and w don't separate two letters with the same code, vowels do
+        if letter not in "hw":
+            previous = code
+    return (word[0].upper() + "".join(codes) + "000")[:4]
+
+def _name_trigrams(words) -> set:
+    trigrams = set()
+    for word in words:
+        padded = f"  {word} "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+def _phone_key(phone):
+    # The last 9 digits, so "+44 7700 900123" and "07700900123" match
+    digits = re.sub(r"\D", "", phone or "")
+    return digits[-9:] if len(digits) >= 6 else None
+
+def _duplicate_keys(name, alias=None, email=None, phone=None):
+    """
+    Returns ({(kind, key)}, {trigram}) for a person. See cf_dupe_keys for the kinds.
+    """
+    name_words = _name_words(name)
+    keys = set()
+    if name_words:
+        keys.add(("sig", " ".join(sorted(_soundex(word) for word in name_words))))
+    if email and email.strip():
+        keys.add(("email", email.strip().lower()))
+    if _phone_key(phone):
+        keys.add(("phone", _phone_key(phone)))
+    return keys, _name_trigrams(name_words + _name_words(alias))
+
+def _index_duplicate_keys(cursor, cfid):
+    """
+    Re-indexes one cfid for duplicate detection inside the caller's write transaction.
+    Removes it from the index if the cfid no longer exists.
+    """
+    cursor.execute("DELETE FROM cf_dupe_keys WHERE cfid = ?", (cfid,))
+    cursor.execute("DELETE FROM cf_name_trigrams WHERE cfid = ?", (cfid,))
+    cursor.execute(
+        """
+        SELECT n.name, n.alias, c.email_addr, c.phone_no
+        FROM cf_names n
+        LEFT JOIN cf_pc_contact_details c ON c.cfid = n.cfid
+        WHERE n.cfid = ?
+        """,
+        (cfid,)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return
+
+    keys, trigrams = _duplicate_keys(*row)
+    cursor.executemany(
+        "INSERT OR IGNORE INTO cf_dupe_keys (cfid, kind, key) VALUES (?, ?, ?)",
+        [(cfid, kind, key) for kind, key in keys]
+    )
+    cursor.executemany(
+        "INSERT OR IGNORE INTO cf_name_trigrams (trigram, cfid) VALUES (?, ?)",
+        [(trigram, cfid) for trigram in trigrams]
+    )
 
 def get_can_handle_life(cfid):
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.read() as conn:
         cur = conn.cursor()
         try:
             cur.execute(
@@ -26,75 +284,13 @@ def get_can_handle_life(cfid):
 
     return bool(can_handle_life)
 
-def calculate_mind_class_estimation(cfid):
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
-                "SELECT sonic_shutoff, visio_shutoff FROM cf_dn_shutoffs WHERE cfid = ?",
-                (cfid,)
-            )
-            data = cursor.fetchone()
-        except sqlite3.OperationalError as err:
-            logbook.error(f"Database error while fetching shutoffs: {err}", exception=err)
-            conn.rollback()
-            return None, None
-
-        sonic_shutoff = bool(data[0]) if data[0] is not None else False
-        visio_shutoff = bool(data[1]) if data[1] is not None else False
-
-        try:
-            cursor.execute(
-                """
-                SELECT dyn_1, dyn_2, dyn_3, dyn_4 FROM cf_dynamic_strengths WHERE cfid = ?
-                """,
-                (cfid,)
-            )
-            data = cursor.fetchone()
-        except sqlite3.OperationalError as err:
-            logbook.error(f"Database error while fetching dyn strengths: {err}", exception=err)
-            conn.rollback()
-            return None, None
-        
-        try:
-            cursor.execute(
-                """
-                SELECT endowment FROM cf_pc_theta_endowments WHERE cfid = ?
-                """,
-                (cfid,)
-            )
-            endowment_data = cursor.fetchone()
-        except sqlite3.OperationalError as err:
-            logbook.error(f"Database error while fetching theta endowment for PC CFID {cfid}: {err}", exception=err)
-            conn.rollback()
-            return None, None
-        
-    theta_endowment = endowment_data[0] if endowment_data else 0
-
+def estimate_mind_class(sonic_shutoff:bool, visio_shutoff:bool, dyn_1:int, dyn_2:int, dyn_3:int, dyn_4:int,
+                        theta_endowment:int, can_handle_life:bool) -> dict:
+    """
+    Estimates a PC's mind class from its inputs. Returns {"apparent": class, "actual": class} with 1 = A, 2 = B, 3 = C.
+    """
     # Defining traits of each class found in ./docs/mind_classes.md
 
-    try:
-        dyn_1 = data[0]
-    except TypeError:
-        dyn_1 = 0
-
-    try:
-        dyn_2 = data[1]
-    except TypeError:
-        dyn_2 = 0
-
-    try:
-        dyn_3 = data[2]
-    except TypeError:
-        dyn_3 = 0
-
-    try:
-        dyn_4 = data[3]
-    except TypeError:
-        dyn_4 = 0
-
-    can_handle_life = get_can_handle_life(cfid)
-
     dynamics_score = (dyn_1 + dyn_2 + dyn_3 + dyn_4)
     if dynamics_score <= 5:
         apparent_class = 3  # Class C
@@ -103,7 +299,7 @@ def calculate_mind_class_estimation(cfid):
     elif dynamics_score > 9:
         apparent_class = 1  # Class A
     else:
-        logbook.warning(f"CFID {cfid} has a dynamics score of {dynamics_score} which is unexpected. Setting apparent class to 2.")
+        logbook.warning(f"A dynamics score of {dynamics_score} is unexpected. Setting apparent class to 2.")
         apparent_class = 2  # Class B
 
     actual_class = apparent_class
@@ -154,12 +350,53 @@ def calculate_mind_class_estimation(cfid):
 
     return results
 
-def update_mind_class_estimation(cfid):
-    mind_class = calculate_mind_class_estimation(cfid)
-    apparent_class = mind_class["apparent"]
-    actual_class = mind_class["actual"]
 
-    with sqlite3.connect(DB_PATH) as conn:
+# Everything estimate_mind_class needs for a set of cfids, one row each. {cfids} is a query selecting a cfid column.
+_mind_class_inputs_query = """
+    SELECT c.cfid,
+           COALESCE(s.sonic_shutoff, False), COALESCE(s.visio_shutoff, False),
+           COALESCE(d.dyn_1, 0), COALESCE(d.dyn_2, 0), COALESCE(d.dyn_3, 0), COALESCE(d.dyn_4, 0),
+           COALESCE(t.endowment, 0), h.is_handleable
+    FROM ({cfids}) c
+    LEFT JOIN cf_dn_shutoffs s ON s.cfid = c.cfid
+    LEFT JOIN cf_dynamic_strengths d ON d.cfid = c.cfid
+    LEFT JOIN cf_pc_theta_endowments t ON t.cfid = c.cfid
+    LEFT JOIN cf_pc_can_handle_life h ON h.cfid = c.cfid
+"""
+
+def _estimate_from_inputs(row) -> dict:
+    _, sonic_shutoff, visio_shutoff, dyn_1, dyn_2, dyn_3, dyn_4, theta_endowment, can_handle_life = row
+    return estimate_mind_class(
+        bool(sonic_shutoff), bool(visio_shutoff), dyn_1, dyn_2, dyn_3, dyn_4, theta_endowment,
+        # A PC is assumed to handle life until told otherwise
+        True if can_handle_life is None else bool(can_handle_life),
+    )
+
+def calculate_mind_class_estimation(cfid):
+    """
+    Computes a cfid's mind class without storing it. Returns None if there is no such profile or on a database error.
+    """
+    with database.read() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(_mind_class_inputs_query.format(cfids="SELECT cfid FROM cf_names WHERE cfid = ?"), (int(cfid),))
+            row = cursor.fetchone()
+        except sqlite3.OperationalError as err:
+            logbook.error(f"Database error while fetching mind class inputs for cfid {cfid}: {err}", exception=err)
+            return None
+
+    if row is None:
+        return None
+    return _estimate_from_inputs(row)
+
+def update_mind_class_estimation(cfid):
+    """
+    Recomputes and stores one cfid's mind class. Runs inside the caller's transaction if there is one.
+    """
+    with database.write() as conn:
+        mind_class = calculate_mind_class_estimation(cfid)
+        if mind_class is None:
+            return False
         try:
             cur = conn.cursor()
             cur.execute(
@@ -168,7 +405,7 @@ def update_mind_class_estimation(cfid):
                 VALUES (?, ?, ?)
                 ON CONFLICT(cfid) DO UPDATE SET actual_class=excluded.actual_class, apparent_class=excluded.apparent_class
                 """,
-                (cfid, actual_class, apparent_class)
+                (int(cfid), mind_class["actual"], mind_class["apparent"])
             )
             conn.commit()
             return True
@@ -177,6 +414,62 @@ def update_mind_class_estimation(cfid):
             conn.rollback()
             return False
 
+def recompute_all_mind_classes():
+    """
+    Recomputes the stored mind class of every PC, and of anyone who already has one, in one read and one write.
+    Stored classes of profiles that no longer exist are removed. Returns how many were stored, or False on a database error.
+    """
+    with database.write() as conn:
+        try:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM cf_pc_mind_class WHERE cfid NOT IN (SELECT cfid FROM cf_names)")
+            cur.execute(
+                _mind_class_inputs_query.format(
+                    cfids="""
+                    SELECT cfid FROM cf_names WHERE cfid IN (
+                        SELECT cfid FROM cf_is_dianetics_pc WHERE is_dn_pc = True UNION SELECT cfid FROM cf_pc_mind_class
+                    )
+                    """
+                )
+            )
+            rows = cur.fetchall()
+            updates = []
+            for row in rows:
+                mind_class = _estimate_from_inputs(row)
+                updates.append((row[0], mind_class["actual"], mind_class["apparent"]))
+            cur.executemany(
+                """
+                INSERT INTO cf_pc_mind_class (cfid, actual_class, apparent_class)
+                VALUES (?, ?, ?)
+                ON CONFLICT(cfid) DO UPDATE SET actual_class=excluded.actual_class, apparent_class=excluded.apparent_class
+                """,
+                updates
+            )
+            conn.commit()
+        except sqlite3.OperationalError as err:
+            logbook.error(f"Database error while recomputing all mind classes: {err}", exception=err)
+            conn.rollback()
+            return False
+
+    logbook.info(f"Recomputed the mind class of {len(updates)} files")
+    return len(updates)
+
+def _recomputes_mind_class(func):
+    """
+    For writes to one of the mind class inputs: recomputes the cfid's stored mind class in the same transaction
+    once the write succeeds. The cfid is taken from self.cfid. If the recompute fails, the write is rolled back too
+    and False is returned.
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with database.write() as conn:
+            result = func(self, *args, **kwargs)
+            if result is not False and update_mind_class_estimation(self.cfid) is False:
+                conn.rollback()
+                return False
+            return result
+    return wrapper
+
 class centralfiles:
     class errors:
         class TooManyProfiles(Exception):
@@ -193,6 +486,20 @@ class centralfiles:
             def __str__(self):
                 return self.message
 
+        class ImageTooLarge(ValueError):
+            def __init__(self):
+                self.message = "Image is too large"
+
+            def __str__(self):
+                return self.message
+
+        class ModifyFailed(Exception):
+            def __init__(self, cfid, field):
+                self.message = f"Could not set {field} for cfid {cfid}"
+
+            def __str__(self):
+                return self.message
+
     class dianetics:
         class tonescale:
             def __init__(self, cfid):
@@ -202,7 +509,7 @@ class centralfiles:
                 if new_level > 4.0 or new_level < 0.0:
                     raise ValueError("Invalid level")
 
-                with sqlite3.connect(DB_PATH) as conn:
+                with database.write() as conn:
                     try:
                         cur = conn.cursor()
                         cur.execute(
@@ -223,8 +530,9 @@ class centralfiles:
             def __init__(self, cfid):
                 self.cfid = int(cfid)
 
+            @_recomputes_mind_class
             def set_theta_count(self, count:int):
-                with sqlite3.connect(DB_PATH) as conn:
+                with database.write() as conn:
                     try:
                         cursor = conn.cursor()
                         cursor.execute(
@@ -243,7 +551,7 @@ class centralfiles:
 
             def add_action(self, action:str):
                 datenow = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                with sqlite3.connect(DB_PATH) as conn:
+                with database.write() as conn:
                     try:
                         cursor = conn.cursor()
                         cursor.execute(
@@ -259,8 +567,9 @@ class centralfiles:
                         conn.rollback()
                         return False
 
+            @_recomputes_mind_class
             def is_sonic_off(self, new_value:bool):
-                with sqlite3.connect(DB_PATH) as conn:
+                with database.write() as conn:
                     try:
                         cursor = conn.cursor()
                         cursor.execute(
@@ -277,8 +586,9 @@ class centralfiles:
                         conn.rollback()
                         return False
 
+            @_recomputes_mind_class
             def is_visio_off(self, new_value:bool):
-                with sqlite3.connect(DB_PATH) as conn:
+                with database.write() as conn:
                     try:
                         cursor = conn.cursor()
                         cursor.execute(
@@ -296,7 +606,7 @@ class centralfiles:
                         return False
 
             def is_fabricator_case(self, new_value:bool):
-                with sqlite3.connect(DB_PATH) as conn:
+                with database.write() as conn:
                     try:
                         cursor = conn.cursor()
                         cursor.execute(
@@ -314,7 +624,7 @@ class centralfiles:
                         return False
 
             def is_stuck_case(self, new_value:bool):
-                with sqlite3.connect(DB_PATH) as conn:
+                with database.write() as conn:
                     try:
                         cur = conn.cursor()
                         cur.execute(
@@ -332,7 +642,7 @@ class centralfiles:
                         return False
 
             def stuck_age(self, new_value:int):
-                with sqlite3.connect(DB_PATH) as conn:
+                with database.write() as conn:
                     cur = conn.cursor()
                     try:
                         cur.execute(
@@ -350,7 +660,7 @@ class centralfiles:
                         return False
 
             def is_control_case(self, new_value:bool):
-                with sqlite3.connect(DB_PATH) as conn:
+                with database.write() as conn:
                     try:
                         cur = conn.cursor()
                         cur.execute(
@@ -369,7 +679,7 @@ class centralfiles:
 
         @staticmethod
         def list_actions(cfid):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.read() as conn:
                 cursor = conn.cursor()
                 try:
                     cursor.execute(
@@ -394,7 +704,8 @@ class centralfiles:
 
         @staticmethod
         def get_profile(cfid):
-            with sqlite3.connect(DB_PATH) as conn:
+            # Only the defaults filled in for missing rows are written, each in its own short write
+            with database.read() as conn:
                 cursor = conn.cursor()
                 try:
                     cursor.execute(
@@ -407,13 +718,13 @@ class centralfiles:
                     conn.rollback()
                     is_dn_pc = False
                 except TypeError:
-                    cursor.execute(
-                        """
-                        INSERT INTO cf_is_dianetics_pc (cfid, is_dn_pc) VALUES (?, ?)
-                        """,
-                        (cfid, False)
-                    )
-                    conn.commit()
+                    with database.write():
+                        cursor.execute(
+                            """
+                            INSERT INTO cf_is_dianetics_pc (cfid, is_dn_pc) VALUES (?, ?)
+                            """,
+                            (cfid, False)
+                        )
                     is_dn_pc = False
 
                 try:
@@ -432,13 +743,13 @@ class centralfiles:
                     is_stuck_case = False
                     stuck_age = -1
                 except TypeError:
-                    cursor.execute(
-                        """
-                        INSERT INTO cf_dn_stuck_case (cfid, is_stuck_case, stuck_age) VALUES (?, ?, ?)
-                        """,
-                        (cfid, False, -1)
-                    )
-                    conn.commit()
+                    with database.write():
+                        cursor.execute(
+                            """
+                            INSERT INTO cf_dn_stuck_case (cfid, is_stuck_case, stuck_age) VALUES (?, ?, ?)
+                            """,
+                            (cfid, False, -1)
+                        )
                     is_stuck_case = False
                     stuck_age = -1
 
@@ -455,13 +766,13 @@ class centralfiles:
                     conn.rollback()
                     is_control_case = False
                 except TypeError:
-                    cursor.execute(
-                        """
-                        INSERT INTO cf_dn_control_case (cfid, is_control_case) VALUES (?, ?)
-                        """,
-                        (cfid, False)
-                    )
-                    conn.commit()
+                    with database.write():
+                        cursor.execute(
+                            """
+                            INSERT INTO cf_dn_control_case (cfid, is_control_case) VALUES (?, ?)
+                            """,
+                            (cfid, False)
+                        )
                     is_control_case = False
 
                 try:
@@ -478,13 +789,13 @@ class centralfiles:
                     conn.rollback()
                     is_sonic_shutoff, is_visio_shutoff = False, False
                 except TypeError:
-                    cursor.execute(
-                        """
-                        INSERT INTO cf_dn_shutoffs (cfid, sonic_shutoff, visio_shutoff) VALUES (?, ?, ?)
-                        """,
-                        (cfid, False, False)
-                    )
-                    conn.commit()
+                    with database.write():
+                        cursor.execute(
+                            """
+                            INSERT INTO cf_dn_shutoffs (cfid, sonic_shutoff, visio_shutoff) VALUES (?, ?, ?)
+                            """,
+                            (cfid, False, False)
+                        )
                     is_sonic_shutoff, is_visio_shutoff = False, False
 
                 try:
@@ -501,13 +812,13 @@ class centralfiles:
                     conn.rollback()
                     is_fabricator_case = False
                 except TypeError:
-                    cursor.execute(
-                        """
-                        INSERT INTO cf_dn_fabricator_case (cfid, is_fabricator_case) VALUES (?, ?)
-                        """,
-                        (cfid, False)
-                    )
-                    conn.commit()
+                    with database.write():
+                        cursor.execute(
+                            """
+                            INSERT INTO cf_dn_fabricator_case (cfid, is_fabricator_case) VALUES (?, ?)
+                            """,
+                            (cfid, False)
+                        )
                     is_fabricator_case = False
 
                 try:
@@ -635,8 +946,61 @@ class centralfiles:
         def __init__(self, cfid):
             self.cfid = int(cfid)
 
+        @staticmethod
+        def batch(changes, allow_dianetics:bool=False):
+            """
+            Applies many field changes, to one or many cfids, in a single transaction with one commit.
+            Every change is validated before anything is written, and if any write fails they are all rolled back.
+
+            :param changes: An iterable of (cfid, field, value) using the field names in modify_fields, with values as submitted.
+            :param allow_dianetics: Whether fields in dianetics_modify_fields may be changed.
+            :raises ValueError: If any field, value or cfid is invalid. Nothing is written.
+            :raises PermissionError: If a Dianetics field is changed without allow_dianetics. Nothing is written.
+            :raises centralfiles.errors.ModifyFailed: If a write fails. Everything is rolled back.
+            :return: How many changes were applied.
+            """
+            changes = [(int(cfid), field, value) for cfid, field, value in changes]
+            if not changes:
+                return 0
+
+            parsed = []
+            for cfid, field, value in changes:
+                if field not in modify_fields:
+                    raise ValueError(f"Invalid field specified, {field}")
+                if field in dianetics_modify_fields and not allow_dianetics:
+                    raise PermissionError(f"Insufficient permissions to modify Dianetics field '{field}'")
+                parser, _ = modify_fields[field]
+                try:
+                    parsed.append((cfid, field, parser(value)))
+                except (ValueError, TypeError, AttributeError) as err:
+                    raise ValueError(f"Invalid value for {field} on cfid {cfid}: {err}") from err
+
+            cfids = list(dict.fromkeys(cfid for cfid, _, _ in changes))
+            with database.write() as conn:
+                cursor = conn.cursor()
+                placeholders = ", ".join("?" for _ in cfids)
+                cursor.execute(f"SELECT cfid FROM cf_names WHERE cfid IN ({placeholders})", cfids)
+                existing = {row[0] for row in cursor.fetchall()}
+                cursor.execute(f"SELECT cfid FROM cf_staff_usernames WHERE cfid IN ({placeholders})", cfids)
+                staff = {row[0] for row in cursor.fetchall()}
+
+                for cfid, field, _ in parsed:
+                    if cfid not in existing:
+                        raise ValueError(f"No profile with cfid {cfid}")
+                    if field == "occupation" and cfid in staff:
+                        raise ValueError("You cannot modify a staff members occupation using CF.")
+
+                for cfid, field, value in parsed:
+                    _, apply = modify_fields[field]
+                    if apply(cfid, value) is False:
+                        raise centralfiles.errors.ModifyFailed(cfid, field)
+
+
+            return len(parsed)
+
+        @_invalidates_profile
         def phone_no(self, value):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 try:
                     cursor = conn.cursor()
                     cursor.execute(
@@ -646,6 +1010,7 @@ class centralfiles:
                         """,
                         (self.cfid, value)
                     )
+                    _index_duplicate_keys(cursor, self.cfid)
                     conn.commit()
                     return True
                 except sqlite3.OperationalError as err:
@@ -653,8 +1018,9 @@ class centralfiles:
                     conn.rollback()
                     return False
 
+        @_invalidates_profile
         def profile_type(self, value):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 try:
                     cursor = conn.cursor()
                     cursor.execute(
@@ -671,8 +1037,9 @@ class centralfiles:
                     conn.rollback()
                     return False
 
+        @_invalidates_profile
         def email_address(self, value):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 try:
                     cursor = conn.cursor()
                     cursor.execute(
@@ -682,6 +1049,7 @@ class centralfiles:
                         """,
                         (self.cfid, value)
                     )
+                    _index_duplicate_keys(cursor, self.cfid)
                     conn.commit()
                     return True
                 except sqlite3.OperationalError as err:
@@ -689,8 +1057,9 @@ class centralfiles:
                     conn.rollback()
                     return False
 
+        @_invalidates_profile
         def home_address(self, value):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 try:
                     cursor = conn.cursor()
                     cursor.execute(
@@ -707,8 +1076,9 @@ class centralfiles:
                     conn.rollback()
                     return False
 
+        @_invalidates_profile
         def chem_assist(self, value):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 try:
                     cursor = conn.cursor()
                     cursor.execute(
@@ -725,8 +1095,10 @@ class centralfiles:
                     conn.rollback()
                     return False
 
+        @_invalidates_profile
+        @_recomputes_mind_class
         def can_handle_life(self, value:bool):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 try:
                     cursor = conn.cursor()
                     cursor.execute(
@@ -743,8 +1115,9 @@ class centralfiles:
                     conn.rollback()
                     return False
 
+        @_invalidates_profile
         def date_of_birth(self, date_of_birth):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 try:
                     cursor = conn.cursor()
                     cursor.execute(
@@ -761,8 +1134,9 @@ class centralfiles:
                     conn.rollback()
                     return False
 
+        @_invalidates_profile
         def is_dn_pc(self, new_value:bool):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 try:
                     cursor = conn.cursor()
                     cursor.execute(
@@ -779,172 +1153,162 @@ class centralfiles:
                     conn.rollback()
                     return False
 
+        @_invalidates_profile
         def name(self, new_name):
-            conn = sqlite3.connect(DB_PATH)
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    INSERT INTO cf_names (cfid, name) VALUES (?, ?)
-                    ON CONFLICT(cfid) DO UPDATE SET name=excluded.name
-                    """,
-                    (self.cfid, new_name)
-                )
-                conn.commit()
-                return True
-            except sqlite3.OperationalError as err:
-                logbook.error("Error updating name!", exception=err)
-                conn.rollback()
-                return False
-            finally:
-                conn.close()
+            with database.write() as conn:
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        """
+                        INSERT INTO cf_names (cfid, name) VALUES (?, ?)
+                        ON CONFLICT(cfid) DO UPDATE SET name=excluded.name
+                        """,
+                        (self.cfid, new_name)
+                    )
+                    _index_duplicate_keys(cursor, self.cfid)
+                    conn.commit()
+                    return True
+                except sqlite3.OperationalError as err:
+                    logbook.error("Error updating name!", exception=err)
+                    conn.rollback()
+                    return False
 
+        @_invalidates_profile
         def first_name(self, name):
-            conn = sqlite3.connect(DB_PATH)
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    UPDATE cf_names
-                    SET first_name = ?
-                    WHERE cfid = ?
-                    """,
-                    (name, self.cfid)
-                )
-                conn.commit()
-                return cursor.rowcount > 0
-            except sqlite3.OperationalError as err:
-                logbook.error("Error updating first name!", exception=err)
-                conn.rollback()
-                return False
-            finally:
-                conn.close()
+            with database.write() as conn:
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        """
+                        UPDATE cf_names
+                        SET first_name = ?
+                        WHERE cfid = ?
+                        """,
+                        (name, self.cfid)
+                    )
+                    conn.commit()
+                    return cursor.rowcount > 0
+                except sqlite3.OperationalError as err:
+                    logbook.error("Error updating first name!", exception=err)
+                    conn.rollback()
+                    return False
 
 
+        @_invalidates_profile
         def middle_name(self, name):
-            conn = sqlite3.connect(DB_PATH)
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    UPDATE cf_names
-                    SET middle_name = ?
-                    WHERE cfid = ?
-                    """,
-                    (name, self.cfid)
-                )
-                conn.commit()
-                return cursor.rowcount > 0
-            except sqlite3.OperationalError as err:
-                logbook.error("Error updating middle name!", exception=err)
-                conn.rollback()
-                return False
-            finally:
-                conn.close()
+            with database.write() as conn:
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        """
+                        UPDATE cf_names
+                        SET middle_name = ?
+                        WHERE cfid = ?
+                        """,
+                        (name, self.cfid)
+                    )
+                    conn.commit()
+                    return cursor.rowcount > 0
+                except sqlite3.OperationalError as err:
+                    logbook.error("Error updating middle name!", exception=err)
+                    conn.rollback()
+                    return False
 
 
+        @_invalidates_profile
         def last_name(self, name):
-            conn = sqlite3.connect(DB_PATH)
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    UPDATE cf_names
-                    SET last_name = ?
-                    WHERE cfid = ?
-                    """,
-                    (name, self.cfid)
-                )
-                conn.commit()
-                return cursor.rowcount > 0
-            except sqlite3.OperationalError as err:
-                logbook.error("Error updating last name!", exception=err)
-                conn.rollback()
-                return False
-            finally:
-                conn.close()
+            with database.write() as conn:
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        """
+                        UPDATE cf_names
+                        SET last_name = ?
+                        WHERE cfid = ?
+                        """,
+                        (name, self.cfid)
+                    )
+                    conn.commit()
+                    return cursor.rowcount > 0
+                except sqlite3.OperationalError as err:
+                    logbook.error("Error updating last name!", exception=err)
+                    conn.rollback()
+                    return False
 
+        @_invalidates_profile
         def alias(self, alias):
-            conn = sqlite3.connect(DB_PATH)
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    UPDATE cf_names
-                    SET alias = ?
-                    WHERE cfid = ?
-                    """,
-                    (alias, self.cfid)
-                )
-                conn.commit()
-                return cursor.rowcount > 0
-            except sqlite3.OperationalError as err:
-                logbook.error("Error updating alias!", exception=err)
-                conn.rollback()
-                return False
-            finally:
-                conn.close()
-
-        def age(self, new_age):
-            conn = sqlite3.connect(DB_PATH)
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    INSERT INTO cf_ages (cfid, age) VALUES (?, ?)
-                    ON CONFLICT(cfid) DO UPDATE SET age=excluded.age
-                    """,
-                    (self.cfid, int(new_age))
-                )
-                conn.commit()
-                return True
-            except sqlite3.OperationalError:
-                conn.rollback()
-                return False
-            finally:
-                conn.close()
+            with database.write() as conn:
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        """
+                        UPDATE cf_names
+                        SET alias = ?
+                        WHERE cfid = ?
+                        """,
+                        (alias, self.cfid)
+                    )
+                    updated = cursor.rowcount
+                    _index_duplicate_keys(cursor, self.cfid)
+                    conn.commit()
+                    return updated > 0
+                except sqlite3.OperationalError as err:
+                    logbook.error("Error updating alias!", exception=err)
+                    conn.rollback()
+                    return False
 
+        @_invalidates_profile
+        def age(self, new_age):
+            with database.write() as conn:
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        """
+                        INSERT INTO cf_ages (cfid, age) VALUES (?, ?)
+                        ON CONFLICT(cfid) DO UPDATE SET age=excluded.age
+                        """,
+                        (self.cfid, int(new_age))
+                    )
+                    conn.commit()
+                    return True
+                except sqlite3.OperationalError:
+                    conn.rollback()
+                    return False
+
+        @_invalidates_profile
         def pronouns(self, subjective, objective):
-            conn = sqlite3.connect(DB_PATH)
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    INSERT INTO cf_pronouns (cfid, subjective, objective) VALUES (?, ?, ?)
-                    ON CONFLICT(cfid) DO UPDATE SET subjective=excluded.subjective, objective=excluded.objective
-                    """,
-                    (self.cfid, subjective, objective)
-                )
-                conn.commit()
-                return True
-            except sqlite3.OperationalError:
-                conn.rollback()
-                return False
-            finally:
-                conn.close()
+            with database.write() as conn:
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        """
+                        INSERT INTO cf_pronouns (cfid, subjective, objective) VALUES (?, ?, ?)
+                        ON CONFLICT(cfid) DO UPDATE SET subjective=excluded.subjective, objective=excluded.objective
+                        """,
+                        (self.cfid, subjective, objective)
+                    )
+                    conn.commit()
+                    return True
+                except sqlite3.OperationalError:
+                    conn.rollback()
+                    return False
 
+        @_invalidates_profile
         def profile_image(self, image_bytes:bytes):
-            conn = sqlite3.connect(DB_PATH)
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    """
-                    INSERT INTO cf_profile_images (cfid, image) VALUES (?, ?)
-                    ON CONFLICT(cfid) DO UPDATE SET image=excluded.image
-                    """,
-                    (self.cfid, image_bytes)
-                )
-                conn.commit()
-                return True
-            except sqlite3.OperationalError as err:
-                logbook.error(f"Error setting profile image for cfid {self.cfid}: {err}", exception=err)
-                conn.rollback()
-                return False
-            finally:
-                conn.close()
+            with database.write() as conn:
+                try:
+                    cursor = conn.cursor()
+                    store_profile_image(cursor, self.cfid, image_bytes)
+                    conn.commit()
+                    return True
+                except sqlite3.OperationalError as err:
+                    logbook.error(f"Error setting profile image for cfid {self.cfid}: {err}", exception=err)
+                    conn.rollback()
+                    return False
 
+        @_invalidates_profile
         def occupation(self, occupation):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 try:
                     cursor = conn.cursor()
                     cursor.execute(
@@ -961,65 +1325,269 @@ class centralfiles:
                     conn.rollback()
                     return False
 
-    class notes:
-        def __init__(self, note_id):
-            self.note_id = int(note_id)
+    class schedule:
+        """
+        Session scheduling across PCs, auditors and rooms.
+        One-off entries live in dn_schedule_data, recurring ones in dn_scheduling_data_repeating (every repeat_integer
+        days from start_date to end_date). All dates are stored as ISO YYYY-MM-DD text so ranges can use the indexes.
+        """
+        day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+        # Which column each kind of view filters on
+        view_columns = {"cfid": "cfid", "auditor": "auditor", "room": "room"}
+        # Longest range conflicts() will check, in days
+        max_conflict_span = 366
 
         @staticmethod
-        def create(cfid, note, author):
-            conn = sqlite3.connect(DB_PATH)
-            try:
+        def to_date(value) -> datetime.date:
+            """
+            Accepts a date, a datetime or a string starting with YYYY-MM-DD.
+            """
+            if isinstance(value, datetime.datetime):
+                return value.date()
+            if isinstance(value, datetime.date):
+                return value
+            return datetime.date.fromisoformat(str(value)[:10])
+
+        @staticmethod
+        def week_range(reference_date=None):
+            """
+            (Monday, Sunday) of the week containing reference_date, today by default.
+            """
+            reference = centralfiles.schedule.to_date(reference_date or datetime.date.today())
+            monday = reference - datetime.timedelta(days=reference.weekday())
+            return monday, monday + datetime.timedelta(days=6)
+
+        @staticmethod
+        def month_range(reference_date=None):
+            """
+            (first day, last day) of the month containing reference_date, today by default.
+            """
+            reference = centralfiles.schedule.to_date(reference_date or datetime.date.today())
+            first = reference.replace(day=1)
+            next_month = (first + datetime.timedelta(days=32)).replace(day=1)
+            return first, next_month - datetime.timedelta(days=1)
+
+        @staticmethod
+        def occurrences(start, every:int, end, range_start, range_end):
+            """
+            The dates a recurrence falls on within [range_start, range_end]. Jumps straight to the first one in range.
+            """
+            every = max(int(every), 1)
+            first = max(start, range_start)
+            last = min(end, range_end)
+            if first > last:
+                return []
+            # Round up to the next whole number of periods after start
+            skipped = -(-(first - start).days // every)
+            current = start + datetime.timedelta(days=skipped * every)
+            step = datetime.timedelta(days=every)
+            dates = []
+            while current <= last:
+                dates.append(current)
+                current += step
+            return dates
+
+        @staticmethod
+        def entries(range_start, range_end, cfid:int=None, auditor:str=None, room:str=None) -> list:
+            """
+            Every scheduled session between two dates (inclusive), with recurrences expanded, in one query.
+            Filter by at most one of cfid, auditor or room so the query can use that column's (column, date) index.
+            With no filter, every entry in the range is returned.
+
+            :return: A list of {"date", "time", "cfid", "activity", "auditor", "room", "schedule_id", "repeating"}
+            sorted by date then time.
+            """
+            filters = {"cfid": cfid, "auditor": auditor, "room": room}
+            filters = {column: value for column, value in filters.items() if value is not None}
+            if len(filters) > 1:
+                raise ValueError("Filter by only one of cfid, auditor or room")
+
+            range_start = centralfiles.schedule.to_date(range_start)
+            range_end = centralfiles.schedule.to_date(range_end)
+            first, last = range_start.isoformat(), range_end.isoformat()
+
+            if filters:
+                (column, value), = filters.items()
+                column = centralfiles.schedule.view_columns[column]
+                one_off_filter, repeating_filter = f"{column} = ? AND", f"{column} = ? AND"
+                one_off_params, repeating_params = [value, first, last], [value, first, last]
+            else:
+                one_off_filter = repeating_filter = ""
+                one_off_params, repeating_params = [first, last], [first, last]
+
+            with database.read() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
-                    """
-                    INSERT INTO cf_profile_notes (cfid, note, author) VALUES (?, ?, ?)
+                    f"""
+                    SELECT schedule_id, cfid, date, NULL, NULL, time_str, activity, auditor, room
+                    FROM dn_schedule_data
+                    WHERE {one_off_filter} date BETWEEN ? AND ?
+                    UNION ALL
+                    SELECT schedule_id, cfid, start_date, repeat_integer, end_date, time_str, activity, auditor, room
+                    FROM dn_scheduling_data_repeating
+                    WHERE {repeating_filter} end_date >= ? AND start_date <= ?
                     """,
-                    (cfid, note, author)
+                    [*one_off_params, *repeating_params],
                 )
-                conn.commit()
-                return cursor.lastrowid
-            except sqlite3.OperationalError:
-                conn.rollback()
-                return None
-            finally:
-                conn.close()
+                rows = cursor.fetchall()
 
-        def modify(self, new_note):
-            conn = sqlite3.connect(DB_PATH)
-            try:
+            results = []
+            for schedule_id, entry_cfid, date, every, end_date, time_str, activity, entry_auditor, entry_room in rows:
+                if every is None:
+                    dates = [centralfiles.schedule.to_date(date)]
+                else:
+                    dates = centralfiles.schedule.occurrences(
+                        centralfiles.schedule.to_date(date), every, centralfiles.schedule.to_date(end_date),
+                        range_start, range_end,
+                    )
+                for occurrence in dates:
+                    results.append({
+                        "date": occurrence.isoformat(),
+                        "time": time_str,
+                        "cfid": entry_cfid,
+                        "activity": activity,
+                        "auditor": entry_auditor,
+                        "room": entry_room,
+                        "schedule_id": schedule_id,
+                        "repeating": every is not None,
+                    })
+
+            results.sort(key=lambda entry: (entry["date"], entry["time"], entry["repeating"]))
+            return results
+
+        @staticmethod
+        def view(period:str, reference_date=None, cfid:int=None, auditor:str=None, room:str=None) -> dict:
+            """
+            A week or month of entries grouped by day, for a PC, an auditor, a room or everyone.
+
+            :return: {"start", "end", "days": {iso date: [entries]}} with every day of the period present.
+            """
+            if period == "week":
+                start, end = centralfiles.schedule.week_range(reference_date)
+            elif period == "month":
+                start, end = centralfiles.schedule.month_range(reference_date)
+            else:
+                raise ValueError("period must be week or month")
+
+            days = {
+                (start + datetime.timedelta(days=offset)).isoformat(): []
+                for offset in range((end - start).days + 1)
+            }
+            for entry in centralfiles.schedule.entries(start, end, cfid=cfid, auditor=auditor, room=room):
+                days[entry["date"]].append(entry)
+            return {"start": start.isoformat(), "end": end.isoformat(), "days": days}
+
+        @staticmethod
+        def pc_week(cfid:int, reference_date=None) -> dict:
+            """
+            One PC's week as the scheduling page uses it: {day name: {time: {"time", "activity", "auditor", "room"}}}.
+            A recurring entry wins over a one-off in the same slot.
+            """
+            start, end = centralfiles.schedule.week_range(reference_date)
+            output = {day: {} for day in centralfiles.schedule.day_names}
+            for entry in centralfiles.schedule.entries(start, end, cfid=cfid):
+                day_name = centralfiles.schedule.day_names[centralfiles.schedule.to_date(entry["date"]).weekday()]
+                output[day_name][entry["time"]] = {
+                    "time": entry["time"],
+                    "activity": entry["activity"],
+                    "auditor": entry["auditor"],
+                    "room": entry["room"],
+                }
+            return output
+
+        @staticmethod
+        def conflicts(range_start, range_end, cfid:int=None, auditor:str=None, room:str=None) -> list:
+            """
+            Double bookings between two dates: an auditor, a room or a PC booked more than once in the same slot.
+
+            :return: A list of {"date", "time", "kind", "value", "entries"} where kind is auditor, room or cfid.
+            :raises ValueError: If range_end is before range_start or the range is longer than max_conflict_span days.
+            """
+            range_start = centralfiles.schedule.to_date(range_start)
+            range_end = centralfiles.schedule.to_date(range_end)
+            if range_end < range_start:
+                raise ValueError("The end date cannot be before the start date")
+            if (range_end - range_start).days >= centralfiles.schedule.max_conflict_span:
+                raise ValueError(f"Conflicts can be checked over at most {centralfiles.schedule.max_conflict_span} days at a time")
+
+            slots = {}
+            for entry in centralfiles.schedule.entries(range_start, range_end, cfid=cfid, auditor=auditor, room=room):
+                for kind in ("auditor", "room", "cfid"):
+                    if entry[kind] in (None, ""):
+                        continue
+                    slots.setdefault((entry["date"], entry["time"], kind, entry[kind]), []).append(entry)
+
+            return [
+                {"date": date, "time": time_str, "kind": kind, "value": value, "entries": booked}
+                for (date, time_str, kind, value), booked in sorted(slots.items(), key=lambda slot: slot[0][:3])
+                if len(booked) > 1
+            ]
+
+    class notes:
+        def __init__(self, note_id):
+            self.note_id = int(note_id)
+
+        @property
+        def cfid(self):
+            with database.read() as conn:
                 cursor = conn.cursor()
-                cursor.execute(
-                    "UPDATE cf_profile_notes SET note = ? WHERE note_id = ?",
-                    (str(new_note), self.note_id)
-                )
-                conn.commit()
-                return True
-            except sqlite3.OperationalError:
-                conn.rollback()
-                return False
-            finally:
-                conn.close()
+                cursor.execute("SELECT cfid FROM cf_profile_notes WHERE note_id = ?", (self.note_id,))
+                data = cursor.fetchone()
+            return data[0] if data else None
 
+        @staticmethod
+        @_invalidates_profile
+        def create(cfid, note, author):
+            with database.write() as conn:
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        """
+                        INSERT INTO cf_profile_notes (cfid, note, author) VALUES (?, ?, ?)
+                        """,
+                        (cfid, note, author)
+                    )
+                    conn.commit()
+                    return cursor.lastrowid
+                except sqlite3.OperationalError:
+                    conn.rollback()
+                    return None
+
+        @_invalidates_profile
+        def modify(self, new_note):
+            with database.write() as conn:
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        "UPDATE cf_profile_notes SET note = ? WHERE note_id = ?",
+                        (str(new_note), self.note_id)
+                    )
+                    conn.commit()
+                    return True
+                except sqlite3.OperationalError:
+                    conn.rollback()
+                    return False
+
+        @_invalidates_profile
         def delete(self):
-            conn = sqlite3.connect(DB_PATH)
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "DELETE FROM cf_profile_notes WHERE note_id = ?",
-                    (self.note_id,)
-                )
-                conn.commit()
-                return True
-            except sqlite3.OperationalError:
-                conn.rollback()
-                return False
-            finally:
-                conn.close()
+            with database.write() as conn:
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        "DELETE FROM cf_profile_notes WHERE note_id = ?",
+                        (self.note_id,)
+                    )
+                    conn.commit()
+                    return True
+                except sqlite3.OperationalError:
+                    conn.rollback()
+                    return False
 
     class agreements:
         @staticmethod
+        @_invalidates_profile
         def delete(cfid:int, agreement_id:int):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 cur = conn.cursor()
                 try:
                     cur.execute(
@@ -1035,7 +1603,7 @@ class centralfiles:
 
         @staticmethod
         def get_agreements(cfid):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.read() as conn:
                 cur = conn.cursor()
                 try:
                     cur.execute(
@@ -1061,8 +1629,9 @@ class centralfiles:
             return parsed_data
 
         @staticmethod
+        @_invalidates_profile
         def set_fulfilled_status(value:bool, agreement_id, cfid):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 cur = conn.cursor()
                 try:
                     cur.execute(
@@ -1079,8 +1648,10 @@ class centralfiles:
                     logbook.error(f"Error while trying to fetch agreements from the Database for CFID {cfid}: {err}", exception=err)
                     return False
 
+        @staticmethod
+        @_invalidates_profile
         def add_agreement(cfid:int, agreement:str, date_agreed:datetime.datetime):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 cur = conn.cursor()
                 try:
                     cur.execute(
@@ -1099,7 +1670,7 @@ class centralfiles:
 
     @staticmethod
     def get_cfid_by_email(email_address:str):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute(
@@ -1117,7 +1688,7 @@ class centralfiles:
 
     @staticmethod
     def get_occupation(cfid:int):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute(
@@ -1135,7 +1706,7 @@ class centralfiles:
 
     @staticmethod
     def get_profile_image(cfid):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute(
@@ -1152,458 +1723,818 @@ class centralfiles:
                 return None
 
     @staticmethod
-    def dupe_check(name:str):
+    def get_profile_image_hash(cfid):
         """
-        Returns if there is someone with the same data in the database.
+        Returns the content hash of a profile image without reading any image data, or None if there are no thumbnails yet.
         """
-        conn = sqlite3.connect(DB_PATH)
-        try:
+        with database.read() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                "SELECT cfid FROM cf_names WHERE name = ?",
-                (name,)
-            )
-            data = cursor.fetchall()
-
-            cfid_list = [item[0] for item in data]
-            return {
-                "exists": len(cfid_list) != 0,
-                "cfids": cfid_list
-            }
-        except sqlite3.OperationalError as err:
-            logbook.error(f"Error checking for duplicates: {err}")
-            return {
-                "exists": False,
-                "error": "Database error occurred while checking for duplicates."
-            }
-        finally:
-            conn.close()
-
-    @staticmethod
-    def get_profile_is_staff(cfid):
-        conn = sqlite3.connect(DB_PATH)
-        try:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT username from cf_staff_usernames WHERE cfid = ?
-                """,
-                (cfid,),
+                "SELECT content_hash FROM cf_profile_thumbnails WHERE cfid = ? LIMIT 1",
+                (cfid,)
             )
             data = cursor.fetchone()
-            if data:
-                is_staff = bool(data[0])
-            else:
-                is_staff = False
-            return is_staff
-        except sqlite3.OperationalError:
-            conn.rollback()
-            return False
-        finally:
-            conn.close()
+            return data[0] if data else None
 
     @staticmethod
-    def add_name(first_name:str=None, last_name:str=None, middle_name:str=None, alias:str=None, profile_type:str = None, staff_username=None):
+    def get_profile_image_variant(cfid, size:int=None):
         """
-        Docstring for add_name
-        
-        :param name: The full name for the person being added
-        :param staff_username: If the user is staff, enter their username and we'll assosciate the username with the person.
+        Returns (image_bytes, mimetype, content_hash) for a profile image, or None if there isn't one.
+
+        :param size: One of profile_thumbnail_sizes, or None for the original upload.
         """
-        conn = sqlite3.connect(DB_PATH)
-
-        if not profile_type.lower() in ['individual', 'company', 'group leader']:
-            raise ValueError(f"fInvalid profile type for name {first_name}, alias {alias}: {profile_type}")
-
-        if not alias:
-            if not first_name:
-                raise ValueError("No first name entered!")
-            name = first_name
-            if middle_name:
-                name += f" {middle_name}"
-            if last_name:
-                name += f" {last_name}"
-        else:
-            name = alias
+        if size is not None and size not in profile_thumbnail_sizes:
+            raise ValueError(f"Thumbnail size must be one of {profile_thumbnail_sizes}")
 
         try:
-            cursor = conn.cursor()
-            if not alias:
-                cursor.execute(
-                    """
-                    INSERT INTO cf_names (name, first_name, middle_name, last_name) VALUES (?, ?, ?, ?)
-                    """,
-                    (name, first_name, middle_name, last_name),
-                )
-            else:
-                cursor.execute(
-                    """
-                    INSERT INTO cf_names (name, alias) VALUES (?, ?)
-                    """,
-                    (name, alias),
-                )
-            cfid = cursor.lastrowid
-            # Inserts into the other fields some data
-            if staff_username is not None:
+            with database.read() as conn:
+                cursor = conn.cursor()
+                if size is not None:
+                    cursor.execute(
+                        "SELECT image, mimetype, content_hash FROM cf_profile_thumbnails WHERE cfid = ? AND size = ?",
+                        (cfid, size)
+                    )
+                    data = cursor.fetchone()
+                    if data:
+                        return data[0], data[1], data[2]
+
                 cursor.execute(
-                    "INSERT INTO cf_staff_usernames (cfid, username) VALUES (?, ?)",
-                    (cfid, staff_username)
+                    "SELECT image, mimetype, content_hash FROM cf_profile_images WHERE cfid = ?",
+                    (cfid,)
                 )
-            cursor.execute(
-                "INSERT INTO cf_ages (cfid, age) VALUES (?, ?)",
-                (cfid, -1)
-            )
-            cursor.execute(
-                "INSERT INTO cf_pronouns (cfid, subjective, objective) VALUES (?, ?, ?)",
-                (cfid, "UNK", "UNK")
-            )
-            cursor.execute(
-                """
-                INSERT INTO cf_is_dianetics_pc (cfid, is_dn_pc) VALUES (?, ?)
-                """,
-                (cfid, False)
-            )
-            cursor.execute(
-                """
-                INSERT INTO cf_occupations (cfid, occupation) VALUES (?, ?)
-                """,
-                (cfid, "Unknown Occupation")
-            )
-            cursor.execute(
-                """
-                INSERT INTO cf_name_types (cfid, nametype) VALUES (?, ?)
-                """,
-                (cfid, profile_type)
-            )
+                data = cursor.fetchone()
+                if not data:
+                    return None
+                image_bytes, mimetype, content_hash = data
 
-            conn.commit()
-            return cfid
+            if content_hash is None or size is not None:
+                # Uploaded before thumbnails existed. Build them now so later requests are cheap.
+                try:
+                    with database.write() as conn:
+                        store_profile_image(conn.cursor(), cfid, image_bytes)
+                except centralfiles.errors.ImageTooLarge:
+                    logbook.warning(f"The stored profile image for cfid {cfid} is too large to make thumbnails from")
+                    return None
+                return centralfiles.get_profile_image_variant(cfid, size)
+
+            return image_bytes, mimetype, content_hash
         except sqlite3.OperationalError as err:
-            logbook.error("Error adding a name!", err)
-            conn.rollback()
-        finally:
-            conn.close()
+            logbook.error(f"Error getting profile image for cfid {cfid}: {err}", exception=err)
+            return None
 
     @staticmethod
-    def delete_name(cfid):
-        is_staff = centralfiles.get_profile_is_staff(cfid)
-        if is_staff:
-            return -1
+    def dupe_check(name:str):
+        """
+        Returns if there is someone with the same data in the database.
+        "candidates" holds the likely duplicates from centralfiles.duplicates.find, exact matches included.
+        """
+        with database.read() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT cfid FROM cf_names WHERE name = ?",
+                    (name,)
+                )
+                data = cursor.fetchall()
 
-        conn = sqlite3.connect(DB_PATH)
-        try:
-            cursor = conn.cursor()
-            cursor.execute(
-                "DELETE FROM cf_names WHERE cfid = ?",
-                (cfid,),
-            )
-            conn.commit()
-            # Returns True if any row deleted
-            return cursor.rowcount > 0
-        except sqlite3.OperationalError:
-            conn.rollback()
-            return False
-        finally:
-            conn.close()
+                cfid_list = [item[0] for item in data]
+                return {
+                    "exists": len(cfid_list) != 0,
+                    "cfids": cfid_list,
+                    "candidates": centralfiles.duplicates.find(name),
+                }
+            except sqlite3.OperationalError as err:
+                logbook.error(f"Error checking for duplicates: {err}")
+                return {
+                    "exists": False,
+                    "error": "Database error occurred while checking for duplicates."
+                }
+
+    # bm25 weights for the cf_search columns: names, notes, contact, occupation
+    _search_weights = (10.0, 1.0, 4.0, 2.0)
 
     @staticmethod
-    def get_names():
-        conn = sqlite3.connect(DB_PATH)
-        try:
+    def search(query:str, limit:int=20, offset:int=0):
+        """
+        Ranked search over names, aliases, profile notes, contact details and occupations.
+        Every word in the query must match the start of a word somewhere in the file.
+
+        :return: (results, total) where results is a list of {"cfid", "name"} best match first,
+        and total is how many files matched altogether.
+        """
+        words = re.findall(r"\w+", query)
+        if not words:
+            return [], 0
+        match = " ".join(f'"{word}"*' for word in words)
+        weights = ", ".join(str(weight) for weight in centralfiles._search_weights)
+
+        with database.read() as conn:
             cursor = conn.cursor()
+            cursor.execute("SELECT count(*) FROM cf_search WHERE cf_search MATCH ?", (match,))
+            total = cursor.fetchone()[0]
             cursor.execute(
-                "SELECT name, cfid FROM cf_names ORDER BY name ASC"
+                f"""
+                SELECT n.cfid, n.name
+                FROM cf_search
+                JOIN cf_names n ON n.cfid = cf_search.rowid
+                WHERE cf_search MATCH ?
+                ORDER BY bm25(cf_search, {weights})
+                LIMIT ? OFFSET ?
+                """,
+                (match, limit, offset),
             )
-            data = cursor.fetchall()
+            results = [{"cfid": cfid, "name": name} for cfid, name in cursor.fetchall()]
 
-            parsed_names = []
-            parsed_cfids = []
-            for item in data:
-                parsed_names.append(item[0])
-                parsed_cfids.append(item[1])
+        return results, total
 
-            return parsed_names, parsed_cfids
-        except sqlite3.OperationalError:
-            conn.rollback()
-        finally:
-            conn.close()
+    class duplicates:
+        """
+        Likely duplicate people, found through the cf_dupe_keys and cf_name_trigrams postings
+        rather than by comparing against every file.
+        """
+        min_score = 0.5
+        # How many of the best trigram matches get scored properly
+        candidate_pool = 200
 
-    @staticmethod
-    def get_profile(name=None, cfid=None):
-        if name is None and cfid is None:
-            raise ValueError("Name and CFID cannot both be None!")
+        @staticmethod
+        def backfill():
+            """
+            Indexes every file that isn't indexed yet, e.g. ones added before duplicate detection existed.
+            Run once at startup, after the database is modernized. Returns how many files were indexed.
+            """
+            with database.write() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT cfid FROM cf_names n
+                    WHERE NOT EXISTS (SELECT 1 FROM cf_name_trigrams t WHERE t.cfid = n.cfid)
+                    """
+                )
+                cfids = [row[0] for row in cursor.fetchall()]
+                for cfid in cfids:
+                    _index_duplicate_keys(cursor, cfid)
+            if cfids:
+                logbook.info(f"Indexed {len(cfids)} files for duplicate detection")
+            return len(cfids)
 
-        with sqlite3.connect(DB_PATH) as conn:
-            try:
+        @staticmethod
+        def find(name:str, alias:str=None, email:str=None, phone:str=None, exclude_cfid:int=None, limit:int=10, min_score:float=None):
+            """
+            Ranks the files most likely to be the same person.
+
+            :return: A list of {"cfid", "name", "score", "reasons"}, best match first. score is 0 to 1,
+            reasons lists any of "email", "phone", "sounds_alike" and "similar_name".
+            """
+            if min_score is None:
+                min_score = centralfiles.duplicates.min_score
+
+            keys, trigrams = _duplicate_keys(name, alias, email, phone)
+            reasons = {}
+            shared_trigrams = {}
+
+            with database.read() as conn:
                 cursor = conn.cursor()
-                if cfid is None:
+                if keys:
+                    # Looked up by (kind, key) so each pair is a search on the primary key, not a scan
+                    placeholders = ", ".join("(?, ?)" for _ in keys)
                     cursor.execute(
-                        "SELECT cfid, name FROM cf_names WHERE name = ?",
-                        (name,),
+                        f"SELECT cfid, kind, key FROM cf_dupe_keys WHERE (kind, key) IN (VALUES {placeholders})",
+                        [value for pair in keys for value in pair],
                     )
-                    data = cursor.fetchall()
-                    if len(data) == 0:
-                        raise centralfiles.errors.ProfileNotFound()
-                    elif len(data) != 1:
-                        raise centralfiles.errors.TooManyProfiles()
-                    else:
-                        cfid = data[0][0]
-                        name = data[0][1]
-                else:
+                    for cfid, kind, key in cursor.fetchall():
+                        reasons.setdefault(cfid, set()).add({"sig": "sounds_alike"}.get(kind, kind))
+
+                if trigrams:
+                    placeholders = ", ".join("?" for _ in trigrams)
                     cursor.execute(
-                        "SELECT cfid, name FROM cf_names WHERE cfid = ?",
-                        (cfid,),
+                        f"""
+                        SELECT cfid, count(*) AS shared FROM cf_name_trigrams
+                        WHERE trigram IN ({placeholders})
+                        GROUP BY cfid ORDER BY shared DESC LIMIT ?
+                        """,
+                        [*trigrams, centralfiles.duplicates.candidate_pool],
                     )
-                    data = cursor.fetchone()
-                    try:
-                        cfid = data[0]
-                        name = data[1]
-                    except TypeError:
-                        return False
+                    shared_trigrams = dict(cursor.fetchall())
 
-                cfid = int(cfid)
-                name = str(name)
+                candidates = [cfid for cfid in dict.fromkeys([*reasons, *shared_trigrams]) if cfid != exclude_cfid]
+                if not candidates:
+                    return []
 
-                # Gets the age, pronouns, and all case notes.
+                placeholders = ", ".join("?" for _ in candidates)
                 cursor.execute(
-                    """
-                    SELECT age from cf_ages WHERE cfid = ?
+                    f"""
+                    SELECT n.cfid, n.name, (SELECT count(*) FROM cf_name_trigrams t WHERE t.cfid = n.cfid)
+                    FROM cf_names n WHERE n.cfid IN ({placeholders})
                     """,
-                    (cfid,),
+                    candidates,
                 )
-                stored_age = cursor.fetchone()[0]
+                rows = cursor.fetchall()
+
+            results = []
+            for cfid, candidate_name, trigram_count in rows:
+                shared = shared_trigrams.get(cfid, 0)
+                union = len(trigrams) + trigram_count - shared
+                similarity = shared / union if union else 0.0
+                candidate_reasons = reasons.get(cfid, set())
+
+                score = similarity
+                if similarity >= min_score:
+                    candidate_reasons.add("similar_name")
+                if "sounds_alike" in candidate_reasons:
+                    score = max(score, 0.8)
+                if candidate_reasons & {"email", "phone"}:
+                    score = 1.0
+
+                if score >= min_score and candidate_reasons:
+                    results.append({
+                        "cfid": cfid,
+                        "name": candidate_name,
+                        "score": round(score, 3),
+                        "reasons": sorted(candidate_reasons),
+                    })
+
+            results.sort(key=lambda result: (-result["score"], result["cfid"]))
+            return results[:limit]
 
-                # Gets the profile type of the individual
+        @staticmethod
+        def scan_clusters():
+            """
+            Groups every file into clusters of likely duplicates: files sharing an email address,
+            a phone number or a name that sounds the same, joined transitively.
+
+            :return: A list of {"cfids", "names", "reasons"}, biggest cluster first. Files without duplicates are left out.
+            """
+            with database.read() as conn:
+                cursor = conn.cursor()
                 cursor.execute(
                     """
-                    SELECT nametype from cf_name_types WHERE cfid = ?
-                    """,
-                    (cfid,),
+                    SELECT a.cfid, b.cfid, a.kind
+                    FROM cf_dupe_keys a
+                    JOIN cf_dupe_keys b ON b.kind = a.kind AND b.key = a.key AND b.cfid > a.cfid
+                    WHERE a.kind IN ('sig', 'email', 'phone')
+                    """
                 )
-                profile_type = cursor.fetchone()
-                if not profile_type:
-                    profile_type = "Unspecified"
-                else:
-                    profile_type = profile_type[0]
+                pairs = cursor.fetchall()
+
+                # Union-find over the matching pairs
+                parents = {}
+
+                def root(cfid):
+                    parents.setdefault(cfid, cfid)
+                    while parents[cfid] != cfid:
+                        parents[cfid] = parents[parents[cfid]]
+                        cfid = parents[cfid]
+                    return cfid
+
+                for first, second, _ in pairs:
+                    parents[root(first)] = root(second)
+
+                clusters = {}
+                for cfid in parents:
+                    clusters.setdefault(root(cfid), {"cfids": [], "reasons": set()})["cfids"].append(cfid)
+                for first, _, kind in pairs:
+                    clusters[root(first)]["reasons"].add({"sig": "sounds_alike"}.get(kind, kind))
+
+                names = {}
+                cfids = list(parents)
+                for start in range(0, len(cfids), centralfiles._profile_batch_size):
+                    batch = cfids[start:start + centralfiles._profile_batch_size]
+                    placeholders = ", ".join("?" for _ in batch)
+                    cursor.execute(f"SELECT cfid, name FROM cf_names WHERE cfid IN ({placeholders})", batch)
+                    names.update(cursor.fetchall())
+
+            results = [
+                {
+                    "cfids": sorted(cluster["cfids"]),
+                    "names": {cfid: names.get(cfid) for cfid in sorted(cluster["cfids"])},
+                    "reasons": sorted(cluster["reasons"]),
+                }
+                for cluster in clusters.values()
+            ]
+            results.sort(key=lambda cluster: (-len(cluster["cfids"]), cluster["cfids"][0]))
+            return results
 
+    @staticmethod
+    def get_profile_is_staff(cfid):
+        with database.read() as conn:
+            try:
+                cursor = conn.cursor()
                 cursor.execute(
                     """
-                    SELECT subjective, objective FROM cf_pronouns WHERE cfid = ?
+                    SELECT username from cf_staff_usernames WHERE cfid = ?
                     """,
                     (cfid,),
                 )
                 data = cursor.fetchone()
-                subject_pron = data[0]
-                objective_pron = data[1]
+                if data:
+                    is_staff = bool(data[0])
+                else:
+                    is_staff = False
+                return is_staff
+            except sqlite3.OperationalError:
+                conn.rollback()
+                return False
+
+    @staticmethod
+    def add_name(first_name:str=None, last_name:str=None, middle_name:str=None, alias:str=None, profile_type:str = None, staff_username=None):
+        """
+        Docstring for add_name
+        
+        :param name: The full name for the person being added
+        :param staff_username: If the user is staff, enter their username and we'll assosciate the username with the person.
+        """
+        with database.write() as conn:
+
+            if not profile_type.lower() in ['individual', 'company', 'group leader']:
+                raise ValueError(f"fInvalid profile type for name {first_name}, alias {alias}: {profile_type}")
+
+            if not alias:
+                if not first_name:
+                    raise ValueError("No first name entered!")
+                name = first_name
+                if middle_name:
+                    name += f" {middle_name}"
+                if last_name:
+                    name += f" {last_name}"
+            else:
+                name = alias
 
+            try:
+                cursor = conn.cursor()
+                if not alias:
+                    cursor.execute(
+                        """
+                        INSERT INTO cf_names (name, first_name, middle_name, last_name) VALUES (?, ?, ?, ?)
+                        """,
+                        (name, first_name, middle_name, last_name),
+                    )
+                else:
+                    cursor.execute(
+                        """
+                        INSERT INTO cf_names (name, alias) VALUES (?, ?)
+                        """,
+                        (name, alias),
+                    )
+                cfid = cursor.lastrowid
+                # Inserts into the other fields some data
+                if staff_username is not None:
+                    cursor.execute(
+                        "INSERT INTO cf_staff_usernames (cfid, username) VALUES (?, ?)",
+                        (cfid, staff_username)
+                    )
                 cursor.execute(
-                    """
-                    SELECT note_id, note, add_date, author FROM cf_profile_notes WHERE cfid = ? ORDER BY add_date DESC
-                    """,
-                    (cfid,),
+                    "INSERT INTO cf_ages (cfid, age) VALUES (?, ?)",
+                    (cfid, -1)
+                )
+                cursor.execute(
+                    "INSERT INTO cf_pronouns (cfid, subjective, objective) VALUES (?, ?, ?)",
+                    (cfid, "UNK", "UNK")
                 )
-                data = cursor.fetchall()
-                profile_notes = {}
-                for item in data:
-                    note_id = item[0]
-                    profile_notes[note_id] = {
-                        "note": item[1],
-                        "add_date": item[2],
-                        "author": item[3],
-                    }
-
                 cursor.execute(
                     """
-                    SELECT is_dn_pc FROM cf_is_dianetics_pc WHERE cfid = ?
+                    INSERT INTO cf_is_dianetics_pc (cfid, is_dn_pc) VALUES (?, ?)
                     """,
-                    (cfid,),
+                    (cfid, False)
                 )
-                try:
-                    is_dn_pc = bool(cursor.fetchone()[0])
-                except (TypeError, IndexError):
-                    is_dn_pc = False
-
                 cursor.execute(
                     """
-                    SELECT occupation FROM cf_occupations WHERE cfid = ?
+                    INSERT INTO cf_occupations (cfid, occupation) VALUES (?, ?)
                     """,
-                    (cfid,),
+                    (cfid, "Unknown Occupation")
                 )
-                try:
-                    occupation = str(cursor.fetchone()[0])
-                except (TypeError, IndexError):
-                    occupation = "Unemployed"
-
                 cursor.execute(
                     """
-                    SELECT date_of_birth FROM cf_dates_of_birth WHERE cfid = ?
+                    INSERT INTO cf_name_types (cfid, nametype) VALUES (?, ?)
                     """,
-                    (cfid,)
+                    (cfid, profile_type)
                 )
-                try:
-                    data = cursor.fetchone()
-                    date_of_birth = data[0]
-                except (TypeError, IndexError):
-                    date_of_birth = None
-
-                # Parse and store original datetime for age calculation
-                dob_for_age = None
-                if type(date_of_birth) is str:
-                    dob_for_age = datetime.datetime.strptime(date_of_birth, "%Y-%m-%d %H:%M:%S")
-                    date_of_birth = dob_for_age.strftime("%d/%m/%Y")
-                elif type(date_of_birth) == datetime.datetime:
-                    dob_for_age = date_of_birth
-                    date_of_birth = date_of_birth.strftime("%d/%m/%Y")
-
-                # Calculate age if we have a valid date of birth
-                # We calculate this each time so the age is ALWAYS accurate.
-                if dob_for_age:
-                    today = datetime.datetime.now()
-                    calced_age = today.year - dob_for_age.year - ((today.month, today.day) < (dob_for_age.month, dob_for_age.day))
-                    # Update the age in the database
-                    if calced_age > stored_age:
-                        cursor.execute(
-                            """
-                            INSERT INTO cf_ages (cfid, age) VALUES (?, ?)
-                            ON CONFLICT(cfid) DO UPDATE SET age=excluded.age
-                            """,
-                            (cfid, calced_age)
-                        )
-                        stored_age = calced_age
-                    conn.commit()
 
+                _index_duplicate_keys(cursor, cfid)
+
+                conn.commit()
+                return cfid
+            except sqlite3.OperationalError as err:
+                logbook.error("Error adding a name!", err)
+                conn.rollback()
+
+    @staticmethod
+    @_invalidates_profile
+    def delete_name(cfid):
+        is_staff = centralfiles.get_profile_is_staff(cfid)
+        if is_staff:
+            return -1
+
+        with database.write() as conn:
+            try:
+                cursor = conn.cursor()
                 cursor.execute(
-                    """
-                    SELECT phone_no, email_addr, home_addr FROM cf_pc_contact_details WHERE cfid = ?
-                    """,
+                    "DELETE FROM cf_names WHERE cfid = ?",
                     (cfid,),
                 )
-                try:
-                    data = cursor.fetchone()
-                    phone_no, email_addr, home_addr = data
-                except (TypeError, IndexError):
-                    phone_no, email_addr, home_addr = None, None, None
-            except TypeError as err:
-                logbook.error("Something went wrong fetching the data for a profile!", exception=err)
-                raise err
-            
-            # Names
+                deleted = cursor.rowcount
+                _index_duplicate_keys(cursor, cfid)
+                conn.commit()
+                # Returns True if any row deleted
+                return deleted > 0
+            except sqlite3.OperationalError:
+                conn.rollback()
+                return False
+
+    @staticmethod
+    def get_names():
+        with database.read() as conn:
             try:
+                cursor = conn.cursor()
                 cursor.execute(
-                    """
-                    SELECT first_name, middle_name, last_name, alias FROM cf_names WHERE cfid = ?
-                    """,
-                    (cfid,)
+                    "SELECT name, cfid FROM cf_names ORDER BY name ASC"
                 )
-                data = cursor.fetchone()
-                first_name = data[0]
-                middle_name = data[1]
-                last_name = data[2]
-                alias = data[3]
-            except sqlite3.OperationalError as err:
-                logbook.error(f"Error getting the names for cfid {cfid}: {err}", exception=err)
+                data = cursor.fetchall()
+
+                parsed_names = []
+                parsed_cfids = []
+                for item in data:
+                    parsed_names.append(item[0])
+                    parsed_cfids.append(item[1])
+
+                return parsed_names, parsed_cfids
+            except sqlite3.OperationalError:
                 conn.rollback()
-                first_name = "ERR_FETCHING"
-                middle_name = "ERR_FETCHING"
-                last_name = "ERR_FETCHING"
-                alias = "ERR_FETCHING"
-            except TypeError:
-                first_name = "ERR_FETCHING"
-                middle_name = "ERR_FETCHING"
-                last_name = "ERR_FETCHING"
-                alias = "ERR_FETCHING"
-
-        profile = {
-            "cfid": cfid,
-            "name": name,
-            "age": stored_age,
-            "occupation": occupation,
-            "pronouns": {
-                "subject_pron": subject_pron,
-                "objective_pron": objective_pron,
-            },
-            "profile_notes": profile_notes,
-            "is_dianetics_pc": is_dn_pc,
-            "date_of_birth": date_of_birth,
-            "phone_no": phone_no,
-            "email_addr": email_addr,
-            "home_addr": home_addr,
-            "type": profile_type,
-            "is_staff": authbook.check_exists(cfid=cfid),
-            "first_name": first_name,
-            "middle_name": middle_name,
-            "last_name": last_name,
-            "alias": alias
-        }
 
-        return profile
+    names_page_max = 500
 
     @staticmethod
-    def get_all_profiles():
-        conn = sqlite3.connect(DB_PATH)
+    def _encode_names_cursor(name:str, cfid:int) -> str:
+        return base64.urlsafe_b64encode(json.dumps([name, cfid]).encode()).decode()
 
+    @staticmethod
+    def _decode_names_cursor(cursor:str):
         try:
+            name, cfid = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return str(name), int(cfid)
+        except (ValueError, TypeError) as err:
+            raise ValueError("Invalid cursor") from err
+
+    @staticmethod
+    def list_names(limit:int=100, after:str=None, nametype:str=None, is_staff:bool=None):
+        """
+        One page of names in name order. Pages are found by seeking idx_cf_names_name_cfid past the last
+        name of the previous page, so every page costs the same no matter how deep into the list it is.
+
+        :param limit: Names per page, at most names_page_max.
+        :param after: The "next" cursor returned with the previous page. None starts from the beginning.
+        :param nametype: Only include this profile type, e.g. "individual".
+        :param is_staff: Only include staff (True) or only non-staff (False).
+        :return: ([[cfid, name], ...], the cursor for the next page or None on the last page)
+        """
+        if not 1 <= limit <= centralfiles.names_page_max:
+            raise ValueError(f"limit must be between 1 and {centralfiles.names_page_max}")
+
+        conditions = []
+        params = []
+        joins = ""
+        if after is not None:
+            conditions.append("(n.name, n.cfid) > (?, ?)")
+            params.extend(centralfiles._decode_names_cursor(after))
+        if nametype is not None:
+            joins = "JOIN cf_name_types t ON t.cfid = n.cfid"
+            conditions.append("t.nametype = ?")
+            params.append(nametype)
+        if is_staff is not None:
+            conditions.append(f"{'' if is_staff else 'NOT '}EXISTS (SELECT 1 FROM cf_staff_usernames s WHERE s.cfid = n.cfid)")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with database.read() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT cfid, name FROM cf_names")
+            cursor.execute(
+                f"""
+                SELECT n.cfid, n.name FROM cf_names n
+                {joins}
+                {where}
+                ORDER BY n.name, n.cfid
+                LIMIT ?
+                """,
+                [*params, limit + 1],
+            )
             rows = cursor.fetchall()
 
-            all_profiles = []
+        items = [[cfid, name] for cfid, name in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last_cfid, last_name = items[-1]
+            next_cursor = centralfiles._encode_names_cursor(last_name, last_cfid)
+        return items, next_cursor
+
+    # Every 1:1 cf_* table a profile is built from, joined onto cf_names in one pass.
+    _profile_query = """
+        SELECT n.cfid, n.name, n.first_name, n.middle_name, n.last_name, n.alias,
+               a.age, t.nametype, p.subjective, p.objective, d.is_dn_pc, o.occupation,
+               b.date_of_birth, c.phone_no, c.email_addr, c.home_addr, s.username
+        FROM cf_names n
+        LEFT JOIN cf_ages a ON a.cfid = n.cfid
+        LEFT JOIN cf_name_types t ON t.cfid = n.cfid
+        LEFT JOIN cf_pronouns p ON p.cfid = n.cfid
+        LEFT JOIN cf_is_dianetics_pc d ON d.cfid = n.cfid
+        LEFT JOIN cf_occupations o ON o.cfid = n.cfid
+        LEFT JOIN cf_dates_of_birth b ON b.cfid = n.cfid
+        LEFT JOIN cf_pc_contact_details c ON c.cfid = n.cfid
+        LEFT JOIN cf_staff_usernames s ON s.cfid = n.cfid
+        WHERE n.cfid IN ({placeholders})
+    """
+    _profile_batch_size = 500
 
-            for cfid, name in rows:
-                profile = {
-                    "cfid": cfid,
-                    "name": name,
-                    "age": None,
-                    "pronouns": {
-                        "subject_pron": None,
-                        "objective_pron": None,
-                    },
-                    "profile_notes": {},
-                }
+    @staticmethod
+    def get_profiles(cfids) -> dict:
+        """
+        Builds the profiles for many cfids at once: one joined query for the 1:1 tables and one for notes per batch.
+        Profiles already in profile_cache are served from it.
 
-                # Get age
-                cursor.execute("SELECT age FROM cf_ages WHERE cfid = ?", (cfid,))
-                age_data = cursor.fetchone()
-                if age_data:
-                    profile["age"] = age_data[0]
+        :param cfids: An iterable of cfids
+        :return: {cfid: profile} for every cfid that exists, each in the same shape as get_profile returns.
+        """
+        cfids = list(dict.fromkeys(int(cfid) for cfid in cfids))
+        cached = {}
+        for cfid in cfids:
+            profile = profile_cache.get(cfid)
+            if profile is not None:
+                cached[cfid] = profile
+        missing = [cfid for cfid in cfids if cfid not in cached]
+        generations = {cfid: profile_cache.generation(cfid) for cfid in missing}
+
+        profiles = {}
+        age_updates = []
+
+        with database.read() as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(missing), centralfiles._profile_batch_size):
+                batch = missing[start:start + centralfiles._profile_batch_size]
+                placeholders = ", ".join("?" for _ in batch)
+
+                cursor.execute(centralfiles._profile_query.format(placeholders=placeholders), batch)
+                for row in cursor.fetchall():
+                    (cfid, name, first_name, middle_name, last_name, alias,
+                     stored_age, profile_type, subject_pron, objective_pron, is_dn_pc, occupation,
+                     date_of_birth, phone_no, email_addr, home_addr, staff_username) = row
+
+                    # Parse and store original datetime for age calculation
+                    dob_for_age = None
+                    if type(date_of_birth) is str:
+                        try:
+                            dob_for_age = datetime.datetime.strptime(date_of_birth, "%Y-%m-%d %H:%M:%S")
+                            date_of_birth = dob_for_age.strftime("%d/%m/%Y")
+                        except ValueError:
+                            pass
+                    elif type(date_of_birth) == datetime.datetime:
+                        dob_for_age = date_of_birth
+                        date_of_birth = date_of_birth.strftime("%d/%m/%Y")
+
+                    # Calculate age if we have a valid date of birth
+                    # We calculate this each time so the age is ALWAYS accurate.
+                    if dob_for_age:
+                        today = datetime.datetime.now()
+                        calced_age = today.year - dob_for_age.year - ((today.month, today.day) < (dob_for_age.month, dob_for_age.day))
+                        if stored_age is None or calced_age > stored_age:
+                            age_updates.append((cfid, calced_age))
+                            stored_age = calced_age
+
+                    profiles[cfid] = {
+                        "cfid": int(cfid),
+                        "name": str(name),
+                        "age": stored_age,
+                        "occupation": str(occupation) if occupation is not None else "Unemployed",
+                        "pronouns": {
+                            "subject_pron": subject_pron,
+                            "objective_pron": objective_pron,
+                        },
+                        "profile_notes": {},
+                        "is_dianetics_pc": bool(is_dn_pc),
+                        "date_of_birth": date_of_birth,
+                        "phone_no": phone_no,
+                        "email_addr": email_addr,
+                        "home_addr": home_addr,
+                        "type": profile_type if profile_type else "Unspecified",
+                        "is_staff": staff_username is not None,
+                        "first_name": first_name,
+                        "middle_name": middle_name,
+                        "last_name": last_name,
+                        "alias": alias
+                    }
 
-                # Get pronouns
                 cursor.execute(
-                    "SELECT subjective, objective FROM cf_pronouns WHERE cfid = ?", (cfid,)
+                    f"""
+                    SELECT cfid, note_id, note, add_date, author FROM cf_profile_notes
+                    WHERE cfid IN ({placeholders}) ORDER BY add_date DESC
+                    """,
+                    batch,
                 )
-                pronoun_data = cursor.fetchone()
-                if pronoun_data:
-                    profile["pronouns"]["subject_pron"] = pronoun_data[0]
-                    profile["pronouns"]["objective_pron"] = pronoun_data[1]
+                for cfid, note_id, note, add_date, author in cursor.fetchall():
+                    if cfid in profiles:
+                        profiles[cfid]["profile_notes"][note_id] = {
+                            "note": note,
+                            "add_date": add_date,
+                            "author": author,
+                        }
+
+        # Update the ages in the database
+        if age_updates:
+            try:
+                with database.write() as conn:
+                    conn.executemany(
+                        """
+                        INSERT INTO cf_ages (cfid, age) VALUES (?, ?)
+                        ON CONFLICT(cfid) DO UPDATE SET age=excluded.age
+                        """,
+                        age_updates
+                    )
+            except sqlite3.OperationalError as err:
+                logbook.error(f"Error updating calculated ages: {err}", exception=err)
+
+        for cfid, profile in profiles.items():
+            profile_cache.set(cfid, profile, generations[cfid])
+        profiles.update(cached)
+
+        return profiles
 
-                # Get profile notes
+    @staticmethod
+    def get_profile(name=None, cfid=None):
+        if name is None and cfid is None:
+            raise ValueError("Name and CFID cannot both be None!")
+
+        if cfid is None:
+            with database.read() as conn:
+                cursor = conn.cursor()
                 cursor.execute(
-                    "SELECT note_id, note, add_date, author FROM cf_profile_notes WHERE cfid = ?",
-                    (cfid,),
+                    "SELECT cfid FROM cf_names WHERE name = ?",
+                    (name,),
                 )
-                notes_data = cursor.fetchall()
-                for row in notes_data:
-                    if not row or len(row) != 4:
-                        continue
+                data = cursor.fetchall()
+            if len(data) == 0:
+                raise centralfiles.errors.ProfileNotFound()
+            elif len(data) != 1:
+                raise centralfiles.errors.TooManyProfiles()
+            cfid = data[0][0]
+
+        profile = centralfiles.get_profiles([cfid]).get(int(cfid))
+        if profile is None:
+            return False
+        return profile
+
+    # field name -> (SQL expression, the cf_* table it needs joined as alias, or None for cf_names itself)
+    profile_field_columns = {
+        "name": ("n.name", None),
+        "first_name": ("n.first_name", None),
+        "middle_name": ("n.middle_name", None),
+        "last_name": ("n.last_name", None),
+        "alias": ("n.alias", None),
+        "address": ("c.home_addr", "c"),
+        "email": ("c.email_addr", "c"),
+        "phone": ("c.phone_no", "c"),
+        "is_staff": ("s.username IS NOT NULL", "s"),
+        "occupation": ("COALESCE(o.occupation, 'Unemployed')", "o"),
+        "type": ("COALESCE(t.nametype, 'Unspecified')", "t"),
+        "is_dianetics_pc": ("COALESCE(d.is_dn_pc, 0)", "d"),
+    }
+    _profile_field_joins = {
+        "c": "LEFT JOIN cf_pc_contact_details c ON c.cfid = n.cfid",
+        "s": "LEFT JOIN cf_staff_usernames s ON s.cfid = n.cfid",
+        "o": "LEFT JOIN cf_occupations o ON o.cfid = n.cfid",
+        "t": "LEFT JOIN cf_name_types t ON t.cfid = n.cfid",
+        "d": "LEFT JOIN cf_is_dianetics_pc d ON d.cfid = n.cfid",
+    }
+
+    @staticmethod
+    def get_profile_fields(cfids, fields) -> dict:
+        """
+        Gets a few fields for many cfids with one query per batch, only joining the tables those fields live in.
 
-                    note_id, note, add_date, author = int(row), str(row[1]), row[2], str(row[3])
-                    # noinspection PyTypeChecker
-                    profile["profile_notes"][note_id] = {
-                        "note": note,
-                        "add_date": add_date,
-                        "author": author,
+        :param cfids: An iterable of cfids
+        :param fields: Which of profile_field_columns to return
+        :return: {cfid: {field: value}} for every cfid that exists
+        """
+        fields = list(dict.fromkeys(fields))
+        if not fields:
+            raise ValueError("At least one field must be requested")
+        unknown = [field for field in fields if field not in centralfiles.profile_field_columns]
+        if unknown:
+            raise ValueError(f"Unknown profile fields: {', '.join(unknown)}")
+
+        columns = [centralfiles.profile_field_columns[field] for field in fields]
+        joins = dict.fromkeys(join for _, join in columns if join is not None)
+        select = ", ".join(expression for expression, _ in columns)
+        join_sql = "\n".join(centralfiles._profile_field_joins[join] for join in joins)
+        booleans = {index for index, field in enumerate(fields) if field in ("is_staff", "is_dianetics_pc")}
+
+        cfids = list(dict.fromkeys(int(cfid) for cfid in cfids))
+        results = {}
+        with database.read() as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(cfids), centralfiles._profile_batch_size):
+                batch = cfids[start:start + centralfiles._profile_batch_size]
+                placeholders = ", ".join("?" for _ in batch)
+                cursor.execute(
+                    f"""
+                    SELECT n.cfid, {select}
+                    FROM cf_names n
+                    {join_sql}
+                    WHERE n.cfid IN ({placeholders})
+                    """,
+                    batch,
+                )
+                for row in cursor.fetchall():
+                    results[row[0]] = {
+                        field: bool(value) if index in booleans else value
+                        for index, (field, value) in enumerate(zip(fields, row[1:]))
+                    }
+
+        return results
+
+    # Optional parts of a get_all_profiles entry. cfid and name are always included.
+    profile_list_fields = ("age", "pronouns", "profile_notes")
+
+    @staticmethod
+    def get_all_profiles(limit:int=None, offset:int=0, fields=None):
+        """
+        Lists profiles ordered by cfid with one query per child table for every 500 profiles.
+
+        :param limit: How many profiles to return. None returns all of them.
+        :param offset: How many profiles to skip first.
+        :param fields: Which of profile_list_fields to include. None includes all of them.
+        """
+        if fields is None:
+            fields = centralfiles.profile_list_fields
+        fields = set(fields)
+        unknown = fields - set(centralfiles.profile_list_fields)
+        if unknown:
+            raise ValueError(f"Unknown profile fields: {', '.join(sorted(unknown))}")
+
+        with database.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT cfid, name FROM cf_names ORDER BY cfid LIMIT ? OFFSET ?",
+                (-1 if limit is None else int(limit), int(offset))
+            )
+
+            profiles = {}
+            for cfid, name in cursor.fetchall():
+                profile = {"cfid": cfid, "name": name}
+                if "age" in fields:
+                    profile["age"] = None
+                if "pronouns" in fields:
+                    profile["pronouns"] = {
+                        "subject_pron": None,
+                        "objective_pron": None,
                     }
+                if "profile_notes" in fields:
+                    profile["profile_notes"] = {}
+                profiles[cfid] = profile
+
+            # The child tables are read for exactly the cfids fetched above, so rows added or removed meanwhile
+            # can't shift the page under them
+            cfids = list(profiles)
+            for start in range(0, len(cfids), centralfiles._profile_batch_size):
+                batch = cfids[start:start + centralfiles._profile_batch_size]
+                placeholders = ", ".join("?" for _ in batch)
+
+                if "age" in fields:
+                    cursor.execute(f"SELECT cfid, age FROM cf_ages WHERE cfid IN ({placeholders})", batch)
+                    for cfid, age in cursor.fetchall():
+                        profiles[cfid]["age"] = age
+
+                if "pronouns" in fields:
+                    cursor.execute(
+                        f"SELECT cfid, subjective, objective FROM cf_pronouns WHERE cfid IN ({placeholders})", batch
+                    )
+                    for cfid, subjective, objective in cursor.fetchall():
+                        profiles[cfid]["pronouns"]["subject_pron"] = subjective
+                        profiles[cfid]["pronouns"]["objective_pron"] = objective
 
-                all_profiles.append(profile)
+                if "profile_notes" in fields:
+                    cursor.execute(
+                        f"""
+                        SELECT cfid, note_id, note, add_date, author FROM cf_profile_notes
+                        WHERE cfid IN ({placeholders}) ORDER BY note_id
+                        """,
+                        batch,
+                    )
+                    for cfid, note_id, note, add_date, author in cursor.fetchall():
+                        # noinspection PyTypeChecker
+                        profiles[cfid]["profile_notes"][int(note_id)] = {
+                            "note": str(note),
+                            "add_date": add_date,
+                            "author": str(author),
+                        }
 
-            return all_profiles
+        return list(profiles.values())
 
-        finally:
-            conn.close()
+    @staticmethod
+    def count_profiles():
+        with database.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM cf_names")
+            return cursor.fetchone()[0]
 
     @staticmethod
     def get_assosciated_invoices(cfid):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             try:
                 cur = conn.cursor()
                 cur.execute(
@@ -1628,7 +2559,7 @@ class centralfiles:
 
     @staticmethod
     def get_assosciated_debts(cfid):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             try:
                 cur = conn.cursor()
                 cur.execute(
@@ -1656,4 +2587,58 @@ class centralfiles:
                 return parsed_data
             except sqlite3.OperationalError:
                 conn.rollback()
-                return []
\ No newline at end of file
+                return []
+
+def _parse_flag(value:str) -> bool:
+    return value.lower() == "true"
+
+def _parse_date_of_birth(value:str):
+    if value.count("-") == 0:
+        raise ValueError("Invalid time format")
+    return datetime.datetime.strptime(value.lower(), "%Y-%m-%d")
+
+def _parse_pronouns(value:str):
+    pronouns = value.split("/")
+    if len(pronouns) != 2:
+        raise ValueError("Format for pronouns is Invalid. Enter pronouns like She/Her or They/Him")
+    return pronouns
+
+def _parse_tone_level(value:str) -> float:
+    level = float(value)
+    if level > 4.0 or level < 0.0:
+        raise ValueError("Invalid level")
+    return level
+
+# Every field /api/files/modify accepts: field -> (parser for the submitted string, function setting the parsed value on a cfid)
+modify_fields = {
+    "age": (int, lambda cfid, value: centralfiles.modify(cfid).age(value)),
+    "dob": (_parse_date_of_birth, lambda cfid, value: centralfiles.modify(cfid).date_of_birth(date_of_birth=value)),
+    "occupation": (str, lambda cfid, value: centralfiles.modify(cfid).occupation(value)),
+    "pronouns": (_parse_pronouns, lambda cfid, value: centralfiles.modify(cfid).pronouns(subjective=value[0], objective=value[1])),
+    "name": (str, lambda cfid, value: centralfiles.modify(cfid).name(value)),
+    "first_name": (str, lambda cfid, value: centralfiles.modify(cfid).first_name(value)),
+    "middle_name": (str, lambda cfid, value: centralfiles.modify(cfid).middle_name(value)),
+    "last_name": (str, lambda cfid, value: centralfiles.modify(cfid).last_name(value)),
+    "alias": (str, lambda cfid, value: centralfiles.modify(cfid).alias(value)),
+    "phone_no": (str, lambda cfid, value: centralfiles.modify(cfid).phone_no(value)),
+    "email_addr": (str, lambda cfid, value: centralfiles.modify(cfid).email_address(value)),
+    "home_addr": (str, lambda cfid, value: centralfiles.modify(cfid).home_address(value)),
+    "prof_type": (str, lambda cfid, value: centralfiles.modify(cfid).profile_type(value)),
+    "is_dianetics": (_parse_flag, lambda cfid, value: centralfiles.modify(cfid).is_dn_pc(value)),
+    "last_action": (str, lambda cfid, value: centralfiles.dianetics.modify(cfid).add_action(value)),
+    "sonic_shutoff": (_parse_flag, lambda cfid, value: centralfiles.dianetics.modify(cfid).is_sonic_off(value)),
+    "visio_shutoff": (_parse_flag, lambda cfid, value: centralfiles.dianetics.modify(cfid).is_visio_off(value)),
+    "stuck_case": (_parse_flag, lambda cfid, value: centralfiles.dianetics.modify(cfid).is_stuck_case(value)),
+    "stuck_age": (int, lambda cfid, value: centralfiles.dianetics.modify(cfid).stuck_age(value)),
+    "control_case": (_parse_flag, lambda cfid, value: centralfiles.dianetics.modify(cfid).is_control_case(value)),
+    "fabricator_case": (_parse_flag, lambda cfid, value: centralfiles.dianetics.modify(cfid).is_fabricator_case(value)),
+    "tone_level": (_parse_tone_level, lambda cfid, value: centralfiles.dianetics.tonescale(cfid).set_level(value)),
+    "can_handle_life": (str, lambda cfid, value: centralfiles.modify(cfid).can_handle_life(value)),
+    "chem_assist": (str, lambda cfid, value: centralfiles.modify(cfid).chem_assist(value)),
+}
+
+# Fields that need the dianetics permission
+dianetics_modify_fields = {
+    "is_dianetics", "last_action", "sonic_shutoff", "visio_shutoff", "stuck_case", "stuck_age",
+    "control_case", "fabricator_case", "tone_level", "can_handle_life", "chem_assist",
+}
@@ -1,17 +1,16 @@
-from modules.centralfiles.classes import centralfiles, update_mind_class_estimation
+from modules.centralfiles.classes import centralfiles, update_mind_class_estimation, calculate_mind_class_estimation, recompute_all_mind_classes, profile_thumbnail_sizes
 from fastapi.responses import JSONResponse, HTMLResponse, Response
-from library.authperms import set_permission, AuthPerms
+from library.authperms import set_permission
 from fastapi.templating import Jinja2Templates
 from library.logbook import LogBookHandler
 from library.auth import route_prechecks
+from library.httpcache import etag_matches
 from fastapi import APIRouter, Request
 from library.email import client_email
-from library.database import DB_PATH
-from library.auth import authbook
+from library.database import database
 from typing import Dict, Optional
 from collections import Counter
 from pydantic import BaseModel
-import asyncio
 import datetime
 import sqlite3
 import base64
@@ -51,34 +50,78 @@ class DeleteNameData(BaseModel):
 @set_permission(permission="central_files")
 async def show_reg(request: Request):
     token:str = route_prechecks(request)
-    username = authbook.token_owner(token)
+    username = request.state.auth.username
     logbook.info(f"IP {request.client.host}, User {username} has accessed the C/F Page.")
-    is_admin = authbook.is_user_admin(username)
+    is_admin = request.state.auth.is_admin
     return templates.TemplateResponse(request, "index.html", {'user': username, 'user_is_admin': is_admin})
 
 @router.get("/files/dupecheck/{name}", response_class=HTMLResponse)
 @set_permission(permission="central_files")
 async def dupe_check(request: Request, name: str):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host}, User {authbook.token_owner(token)} Has checked for duplicates for cfid {name}")
-    result = centralfiles.dupe_check(str(name))
+    logbook.info(f"IP {request.client.host}, User {request.state.auth.username} Has checked for duplicates for cfid {name}")
+    result = await database.run(centralfiles.dupe_check, str(name))
     if result["exists"]:
-        return JSONResponse(content={"exists": True, "cfids": result["cfids"]}, status_code=200)
+        return JSONResponse(content={"exists": True, "cfids": result["cfids"], "candidates": result["candidates"]}, status_code=200)
     else:
         if result.get("error", None) is None:
-            return JSONResponse(content={"exists": False}, status_code=404)
+            return JSONResponse(content={"exists": False, "candidates": result["candidates"]}, status_code=404)
         else:
             return JSONResponse(content={"exists": -1, "error": result["error"]}, status_code=500)
 
+search_max_limit = 100
+
+class DuplicateCandidatesData(BaseModel):
+    name: str
+    alias: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    exclude_cfid: Optional[int] = None
+    limit: int = 10
+
+@router.post("/api/files/duplicates/candidates", response_class=JSONResponse)
+@set_permission(permission="central_files")
+async def duplicate_candidates(request: Request, data: DuplicateCandidatesData):
+    token:str = route_prechecks(request)
+    logbook.info(f"IP {request.client.host}, User {request.state.auth.username} Has checked for likely duplicates of {data.name}")
+    candidates = await database.run(
+        centralfiles.duplicates.find,
+        data.name, alias=data.alias, email=data.email, phone=data.phone,
+        exclude_cfid=data.exclude_cfid, limit=max(1, min(data.limit, search_max_limit)),
+    )
+    return JSONResponse(content={"candidates": candidates}, status_code=200)
+
+@router.get("/api/files/duplicates/clusters", response_class=JSONResponse)
+@set_permission(permission="central_files")
+async def duplicate_clusters(request: Request):
+    token:str = route_prechecks(request)
+    logbook.info(f"IP {request.client.host}, User {request.state.auth.username} Has scanned all files for duplicates")
+    clusters = await database.run(centralfiles.duplicates.scan_clusters)
+    return JSONResponse(content={"clusters": clusters}, status_code=200)
+
+@router.get("/api/files/search", response_class=JSONResponse)
+@set_permission(permission="central_files")
+async def search_files(request: Request, q: str, limit: int = 20, offset: int = 0):
+    token:str = route_prechecks(request)
+    logbook.info(f"IP {request.client.host}, User {request.state.auth.username} Has searched the central files")
+    if limit < 1 or limit > search_max_limit or offset < 0:
+        return JSONResponse(content={"error": f"limit must be between 1 and {search_max_limit} and offset cannot be negative."}, status_code=400)
+    try:
+        results, total = await database.run(centralfiles.search, q, limit, offset)
+    except sqlite3.OperationalError as err:
+        logbook.error(f"Error searching the central files: {err}", exception=err)
+        return JSONResponse(content={"error": "Database error occurred while searching."}, status_code=500)
+    return JSONResponse(content={"results": results, "total": total, "limit": limit, "offset": offset}, status_code=200)
+
 @router.get("/files/get/{cfid}")
 @set_permission(permission="central_files")
 async def get_file(request: Request, cfid: int):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} Has fetched the folder for cfid {cfid} under account {authbook.token_owner(token)}")
-    profile = centralfiles.get_profile(cfid=int(cfid))
-    assosciated_invoices = centralfiles.get_assosciated_invoices(cfid)
-    assosciated_debts = centralfiles.get_assosciated_debts(cfid)
-    dianetics_profile = centralfiles.dianetics.get_profile(cfid=cfid)
+    logbook.info(f"IP {request.client.host} Has fetched the folder for cfid {cfid} under account {request.state.auth.username}")
+    profile = await database.run(centralfiles.get_profile, cfid=int(cfid))
+    assosciated_invoices = await database.run(centralfiles.get_assosciated_invoices, cfid)
+    assosciated_debts = await database.run(centralfiles.get_assosciated_debts, cfid)
+    dianetics_profile = await database.run(centralfiles.dianetics.get_profile, cfid=cfid)
 
     return templates.TemplateResponse(
         request,
@@ -91,145 +134,57 @@ async def get_file(request: Request, cfid: int):
         }
     )
 
+async def apply_modifications(request: Request, changes: list):
+    """
+    Runs centralfiles.modify.batch for a route and turns its errors into responses.
+    """
+    user = request.state.auth.username
+    try:
+        await database.run(
+            centralfiles.modify.batch,
+            changes,
+            allow_dianetics=request.state.auth.permissions.get("dianetics", False),
+        )
+    except PermissionError as err:
+        logbook.warning(f"User {user} attempted to modify Dianetics fields without permission: {err}")
+        return JSONResponse(content={"success": False, "error": "Insufficient permissions to modify Dianetics fields."}, status_code=403)
+    except ValueError as err:
+        return JSONResponse(content={"success": False, "error": str(err)}, status_code=400)
+    except (centralfiles.errors.ModifyFailed, sqlite3.IntegrityError) as err:
+        logbook.error(f"Update by {user} rolled back: {err}", exception=err)
+        return JSONResponse(content={"success": False, "error": "Update failed"}, status_code=400)
+    except Exception as err:
+        logbook.error(f"Error applying updates by {user}: {err}", exception=err)
+        return JSONResponse(content={"success": False, "error": "Internal server error"}, status_code=500)
+    return JSONResponse(content={"success": True, "applied": len(changes)}, status_code=200)
+
 @router.post("/api/files/modify", response_class=JSONResponse)
 @set_permission(permission="central_files")
 async def modify_file(request: Request, data: ModifyFileData):
     token:str = route_prechecks(request)
-    user = authbook.token_owner(token)
-    logbook.info(f"Request from {request.client.host} ({user}) to modify cfid {data.cfid}: field '{data.field}' with value '{data.value}'")
-    is_staff = centralfiles.get_profile_is_staff(data.cfid)
-
-    dn_fields = [
-        'is_dianetics',
-        'last_action',
-        'sonic_shutoff',
-        'visio_shutoff',
-        'stuck_case',
-        'stuck_age',
-        'control_case',
-        'fabricator_case',
-        'tone_level',
-        'can_handle_life',
-        'chem_assist'
-    ]
+    logbook.info(f"Request from {request.client.host} ({request.state.auth.username}) to modify cfid {data.cfid}: field '{data.field}' with value '{data.value}'")
+    return await apply_modifications(request, [(data.cfid, data.field, data.value)])
 
-    try:
-        if data.field == "age":
-            centralfiles.modify(data.cfid).age(int(data.value))
-            success = True
-        elif data.field == "dob":
-            if data.value.count("-") == 0:
-                return JSONResponse(content={"success": False, "error": "Invalid time format"}, status_code=400)
-
-            datetime_obj = datetime.datetime.now().strptime(data.value.lower(), "%Y-%m-%d")
-            centralfiles.modify(data.cfid).date_of_birth(
-                date_of_birth=datetime_obj
-            )
-            success = True
-        elif data.field == "occupation":
-            if is_staff:
-                return JSONResponse(content={"success": False, "error": "You cannot modify a staff members occupation using CF."}, status_code=400)
-            centralfiles.modify(data.cfid).occupation(data.value)
-            success = True
-        elif data.field == "pronouns":
-            if not len(data.value.split("/")) == 2:
-                return JSONResponse(content={"success": False, "error": "Format for pronouns is Invalid. Enter pronouns like She/Her or They/Him"}, status_code=400)
-            centralfiles.modify(data.cfid).pronouns(
-                subjective=data.value.split("/")[0],
-                objective=data.value.split("/")[1],
-            )
-            success = True
-        elif data.field == "name":
-            centralfiles.modify(data.cfid).name(data.value)
-            success = True
-        elif data.field == "first_name":
-            centralfiles.modify(data.cfid).first_name(data.value)
-            success = True
-        elif data.field == "middle_name":
-            centralfiles.modify(data.cfid).middle_name(data.value)
-            success = True
-        elif data.field == "last_name":
-            centralfiles.modify(data.cfid).last_name(data.value)
-            success = True
-        elif data.field == "alias":
-            centralfiles.modify(data.cfid).alias(data.value)
-            success = True
-        elif data.field == "phone_no":
-            centralfiles.modify(data.cfid).phone_no(data.value)
-            success = True
-        elif data.field == "email_addr":
-            centralfiles.modify(data.cfid).email_address(data.value)
-            success = True
-        elif data.field == "home_addr":
-            centralfiles.modify(data.cfid).home_address(data.value)
-            success = True
-        elif data.field == "prof_type":
-            centralfiles.modify(data.cfid).profile_type(data.value)
-            success = True
-        else:
-            if data.field not in dn_fields:
-                raise ValueError(f"Invalid field specified, {data.field}")
-
-        # Permission protected fields.
-        if data.field in dn_fields:
-            if AuthPerms.check_allowed(user, "dianetics") is False:
-                logbook.warning(f"User {user} attempted to modify Dianetics field '{data.field}' without permission.")
-                return JSONResponse(content={"success": False, "error": "Insufficient permissions to modify Dianetics fields."}, status_code=403)
-
-            if data.field == "is_dianetics":
-                centralfiles.modify(data.cfid).is_dn_pc(True if data.value.lower() == "true" else False)
-                success = True
-            elif data.field == "last_action":
-                centralfiles.dianetics.modify(data.cfid).add_action(data.value)
-                success = True
-            elif data.field == "sonic_shutoff":
-                centralfiles.dianetics.modify(data.cfid).is_sonic_off(True if data.value.lower() == "true" else False)
-                success = True
-            elif data.field == "visio_shutoff":
-                centralfiles.dianetics.modify(data.cfid).is_visio_off(True if data.value.lower() == "true" else False)
-                success = True
-            elif data.field == "stuck_case":
-                centralfiles.dianetics.modify(data.cfid).is_stuck_case(True if data.value.lower() == "true" else False)
-                success = True
-            elif data.field == "stuck_age":
-                centralfiles.dianetics.modify(data.cfid).stuck_age(True if data.value.lower() == "true" else False)
-                success = True
-            elif data.field == "control_case":
-                centralfiles.dianetics.modify(data.cfid).is_control_case(True if data.value.lower() == "true" else False)
-                success = True
-            elif data.field == "fabricator_case":
-                centralfiles.dianetics.modify(data.cfid).is_fabricator_case(True if data.value.lower() == "true" else False)
-                success = True
-            elif data.field == "tone_level":
-                centralfiles.dianetics.tonescale(data.cfid).set_level(float(data.value))
-                success = True
-            elif data.field == "can_handle_life":
-                centralfiles.modify(data.cfid).can_handle_life(data.value)
-                success = True
-            elif data.field == "chem_assist":
-                centralfiles.modify(data.cfid).chem_assist(data.value)
-                success = True
-            else:
-                success = False
-
-            if data.field in ['can_handle_life', 'visio_shutoff', 'sonic_shutoff']:
-                # Update mind class estimation if these fields are changed
-                update_mind_class_estimation(str(data.cfid))
+class BulkModifyFileData(BaseModel):
+    changes: list[ModifyFileData]
 
-        if success:
-            return JSONResponse(content={"success": True}, status_code=200)
-        else:
-            return JSONResponse(content={"success": False, "error": "Update failed"}, status_code=400)
-    except Exception as err:
-        logbook.error(f"Error updating cfid {data.cfid}: {err}", exception=err)
-        return JSONResponse(content={"success": False, "error": "Internal server error"}, status_code=500)
+# Many fields, for one or many cfids, in one transaction. Nothing is written unless every change is valid.
+@router.post("/api/files/modify/bulk", response_class=JSONResponse)
+@set_permission(permission="central_files")
+async def modify_files(request: Request, data: BulkModifyFileData):
+    token:str = route_prechecks(request)
+    logbook.info(
+        f"Request from {request.client.host} ({request.state.auth.username}) to modify {len(data.changes)} fields: "
+        + ", ".join(f"cfid {change.cfid} '{change.field}'" for change in data.changes)
+    )
+    return await apply_modifications(request, [(change.cfid, change.field, change.value) for change in data.changes])
 
 @router.post("/api/files/note/modify", response_class=JSONResponse)
 @set_permission(permission="central_files")
 async def modify_note(request: Request, data: NoteData):
     token:str = route_prechecks(request)
-    logbook.info(f"Request from IP {request.client.host} under account {authbook.token_owner(token)} to modify note ID {data.note_id} to \"{data.note}\"")
-    success = centralfiles.notes(data.note_id).modify(data.note)
+    logbook.info(f"Request from IP {request.client.host} under account {request.state.auth.username} to modify note ID {data.note_id} to \"{data.note}\"")
+    success = await database.run(centralfiles.notes(data.note_id).modify, data.note)
     if success:
         return JSONResponse(content={"success": True}, status_code=200)
     else:
@@ -239,8 +194,8 @@ async def modify_note(request: Request, data: NoteData):
 @set_permission(permission="central_files")
 async def delete_note(request: Request, data: NoteDeleteData):
     token:str = route_prechecks(request)
-    logbook.info(f"Request from IP {request.client.host} to DELETE note ID {data.note_id} by account {authbook.token_owner(token)}")
-    success = centralfiles.notes(data.note_id).delete()
+    logbook.info(f"Request from IP {request.client.host} to DELETE note ID {data.note_id} by account {request.state.auth.username}")
+    success = await database.run(centralfiles.notes(data.note_id).delete)
     if success:
         return JSONResponse(content={"success": True}, status_code=200)
     else:
@@ -250,10 +205,10 @@ async def delete_note(request: Request, data: NoteDeleteData):
 @set_permission(permission="central_files")
 async def create_note(request: Request, data: NoteCreateData):
     token:str = route_prechecks(request)
-    logbook.info(f"Request from IP {request.client.host} to CREATE a note by account {authbook.token_owner(token)}")
+    logbook.info(f"Request from IP {request.client.host} to CREATE a note by account {request.state.auth.username}")
 
-    author = authbook.token_owner(token)
-    note_id = centralfiles.notes.create(data.cfid, data.note, author)
+    author = request.state.auth.username
+    note_id = await database.run(centralfiles.notes.create, data.cfid, data.note, author)
     success = note_id is not None
 
     if success:
@@ -272,8 +227,8 @@ async def create_note(request: Request, data: NoteCreateData):
 @set_permission(permission="central_files")
 async def get_names(request: Request):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} Has fetched all names under account {authbook.token_owner(token)}")
-    names, cfid_list = centralfiles.get_names()
+    logbook.info(f"IP {request.client.host} Has fetched all names under account {request.state.auth.username}")
+    names, cfid_list = await database.run(centralfiles.get_names)
     data = {
         "names": names,
         "cfids": cfid_list
@@ -283,13 +238,37 @@ async def get_names(request: Request):
         status_code=200,
     )
 
+# Paged version of get_names. Items are [cfid, name]; pass "next" back as after= for the following page.
+@router.get("/api/files/names", response_class=JSONResponse)
+@set_permission(permission="central_files")
+async def list_names(request: Request, limit: int = 100, after: str = None, type: str = None, staff: bool = None):
+    token:str = route_prechecks(request)
+    logbook.info(f"IP {request.client.host} Has fetched a page of names under account {request.state.auth.username}")
+    try:
+        items, next_cursor = await database.run(centralfiles.list_names, limit, after, type, staff)
+    except ValueError as err:
+        return JSONResponse(content={"error": str(err)}, status_code=400)
+    return JSONResponse(content={"items": items, "next": next_cursor}, status_code=200)
+
 @router.get("/api/files/get_all_profile", response_class=HTMLResponse)
 @set_permission(permission="central_files")
-async def get_all_profiles(request: Request):
+async def get_all_profiles(request: Request, limit: int = None, offset: int = 0, fields: str = None):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} Has fetched all names under account {authbook.token_owner(token)}")
+    logbook.info(f"IP {request.client.host} Has fetched all names under account {request.state.auth.username}")
+    if (limit is not None and limit < 0) or offset < 0:
+        return JSONResponse(content={"error": "limit and offset cannot be negative."}, status_code=400)
+
+    field_list = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    try:
+        profiles = await database.run(centralfiles.get_all_profiles, limit=limit, offset=offset, fields=field_list)
+    except ValueError as err:
+        return JSONResponse(content={"error": str(err)}, status_code=400)
+
     data = {
-        "profiles": centralfiles.get_all_profiles(),
+        "profiles": profiles,
+        "total": await database.run(centralfiles.count_profiles),
+        "limit": limit,
+        "offset": offset,
     }
     return JSONResponse(
         content=data,
@@ -300,9 +279,9 @@ async def get_all_profiles(request: Request):
 @set_permission(permission="central_files")
 async def get_profile(request: Request, data: NamePostData):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} fetched profile '{data.name}' under account {authbook.token_owner(token)}")
+    logbook.info(f"IP {request.client.host} fetched profile '{data.name}' under account {request.state.auth.username}")
     try:
-        profile = centralfiles.get_profile(name=data.name)
+        profile = await database.run(centralfiles.get_profile, name=data.name)
         return JSONResponse(content=profile, status_code=200)
     except centralfiles.errors.ProfileNotFound:
         return JSONResponse(content={"error": "Profile not found."}, status_code=404)
@@ -320,18 +299,20 @@ class CreateNamePostData(BaseModel):
 @set_permission(permission="central_files")
 async def create_name(request: Request, data: CreateNamePostData):
     token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
+    owner = request.state.auth.username
     logbook.info(f"Request from IP {request.client.host}; Request from account {owner} to CREATE name '{data.first_name}', alias {data.alias}")
 
     if not data.alias:
-        cfid = centralfiles.add_name(
+        cfid = await database.run(
+            centralfiles.add_name,
             first_name=data.first_name,
             middle_name=data.middle_name,
             last_name=data.last_name,
             profile_type=data.profile_type
         )
     else:
-        cfid = centralfiles.add_name(
+        cfid = await database.run(
+            centralfiles.add_name,
             alias=data.alias,
             profile_type=data.profile_type
         )
@@ -345,8 +326,8 @@ async def create_name(request: Request, data: CreateNamePostData):
 @set_permission(permission="central_files")
 async def delete_name(request: Request, data: DeleteNameData):
     token:str = route_prechecks(request)
-    logbook.info(f"Request from IP {request.client.host}; account {authbook.token_owner(token)} to DELETE CFID '{data.cfid}'")
-    success = centralfiles.delete_name(data.cfid)
+    logbook.info(f"Request from IP {request.client.host}; account {request.state.auth.username} to DELETE CFID '{data.cfid}'")
+    success = await database.run(centralfiles.delete_name, data.cfid)
     if success is True:
         return JSONResponse(content={"success": True}, status_code=200)
     elif success == -1:  # Staff account
@@ -368,8 +349,8 @@ class SubmitActionData(BaseModel):
 @set_permission(["central_files", "dianetics"])
 async def submit_action(request: Request, data: SubmitActionData):
     token:str = route_prechecks(request)
-    logbook.info(f"Request from IP {request.client.host}; account {authbook.token_owner(token)} to SUBMIT action '{data.action}' for cfid {data.cfid}")
-    success = centralfiles.dianetics.modify(data.cfid).add_action(data.action)
+    logbook.info(f"Request from IP {request.client.host}; account {request.state.auth.username} to SUBMIT action '{data.action}' for cfid {data.cfid}")
+    success = await database.run(centralfiles.dianetics.modify(data.cfid).add_action, data.action)
     if success:
         return JSONResponse(content={"success": True}, status_code=200)
     else:
@@ -379,76 +360,76 @@ async def submit_action(request: Request, data: SubmitActionData):
 @set_permission(["central_files", "dianetics"])
 async def submit_action(request: Request, cfid):
     token:str = route_prechecks(request)
-    logbook.info(f"Request from IP {request.client.host}; Request from account {authbook.token_owner(token)} to get all auditing actions for cfid {cfid}")
-    actions = centralfiles.dianetics.list_actions(cfid)
+    logbook.info(f"Request from IP {request.client.host}; Request from account {request.state.auth.username} to get all auditing actions for cfid {cfid}")
+    actions = await database.run(centralfiles.dianetics.list_actions, cfid)
     return JSONResponse(content=actions, status_code=200)
 
+# Profile images only change on upload, and uploads change the ETag.
+profile_image_cache_control = "private, max-age=120"
+
 @router.get("/api/files/{cfid}/profile_icon")
 @set_permission(permission="central_files")
-async def get_profile_image(request: Request, cfid: int):
+async def get_profile_image(request: Request, cfid: int, size: int = 256):
+    """
+    Serves a profile image. size is one of the thumbnail sizes (64 or 256), or 0 for the original upload.
+    """
     token:str = route_prechecks(request)
-    logbook.info(f"Request from IP {request.client.host}; account {authbook.token_owner(token)} to get profile image for cfid {cfid}")
-    image_data = centralfiles.get_profile_image(cfid)
-    
-    # Return the image bytes with appropriate headers
+    logbook.info(f"Request from IP {request.client.host}; account {request.state.auth.username} to get profile image for cfid {cfid}")
+    if size != 0 and size not in profile_thumbnail_sizes:
+        return JSONResponse(content={"error": f"size must be 0 or one of {list(profile_thumbnail_sizes)}"}, status_code=400)
+    variant_size = size or None
+
+    # Answer revalidation from the hash alone so the image itself is never read
+    content_hash = await database.run(centralfiles.get_profile_image_hash, cfid)
+    if content_hash is not None:
+        etag = f'"{content_hash}-{size}"'
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": profile_image_cache_control})
+
+    variant = await database.run(centralfiles.get_profile_image_variant, cfid, variant_size)
+    if variant is None:
+        return Response(status_code=404)
+
+    image_data, mimetype, content_hash = variant
+    if not mimetype or not mimetype.startswith("image/"):
+        # Never let an upload be served back as something a browser would render
+        mimetype = "application/octet-stream"
     return Response(
         content=image_data,
-        media_type="image/jpeg"  # or "image/png", "image/gif" depending on your image format
+        media_type=mimetype,
+        headers={"ETag": f'"{content_hash}-{size}"', "Cache-Control": profile_image_cache_control}
     )
 
-# Simple in-memory cache with TTL
-class ProfileCache:
-    def __init__(self, ttl_seconds: int = 300):  # 5 minutes default TTL
-        self.cache: Dict[int, Dict] = {}
-        self.timestamps: Dict[int, float] = {}
-        self.ttl = ttl_seconds
-        self.lock = asyncio.Lock()
-    
-    async def get(self, cfid: int) -> Optional[Dict]:
-        async with self.lock:
-            if cfid in self.cache:
-                # Check if cache entry is still valid
-                if asyncio.get_event_loop().time() - self.timestamps[cfid] < self.ttl:
-                    return self.cache[cfid]
-                else:
-                    # Remove expired entry
-                    del self.cache[cfid]
-                    del self.timestamps[cfid]
-            return None
-    
-    async def set(self, cfid: int, profile: Dict):
-        async with self.lock:
-            self.cache[cfid] = profile
-            self.timestamps[cfid] = asyncio.get_event_loop().time()
-    
-    async def invalidate(self, cfid: int):
-        async with self.lock:
-            if cfid in self.cache:
-                del self.cache[cfid]
-                del self.timestamps[cfid]
+async def get_cached_profile(cfid: int) -> Optional[Dict]:
+    """Get a profile through the shared central files profile cache"""
+    return await database.run(centralfiles.get_profile, cfid=cfid)
 
-# Initialize cache
-profile_cache = ProfileCache(ttl_seconds=30)
+class ProfileFieldsData(BaseModel):
+    cfids: list[int]
+    fields: list[str]
 
-async def get_cached_profile(cfid: int) -> Optional[Dict]:
-    """Get profile from cache or database with caching"""
-    # Try cache first
-    cached_profile = await profile_cache.get(cfid)
-    if cached_profile:
-        logbook.info(f"Cache hit for profile cfid {cfid}")
-        return cached_profile
-    
-    # Cache miss, fetch from database
-    profile = centralfiles.get_profile(cfid=cfid)
-    if profile:
-        await profile_cache.set(cfid, profile)
-    
-    return profile
+# Batched alternative to the single field routes below
+@router.post("/api/files/fields", response_class=JSONResponse)
+@set_permission(permission="central_files")
+async def get_profile_fields(request: Request, data: ProfileFieldsData):
+    token:str = route_prechecks(request)
+    logbook.info(f"Request from IP {request.client.host}; account {request.state.auth.username} to get fields {', '.join(data.fields)} for {len(data.cfids)} cfids")
+    try:
+        profiles = await database.run(centralfiles.get_profile_fields, data.cfids, data.fields)
+    except ValueError as err:
+        return JSONResponse(content={"error": str(err)}, status_code=400)
+    return JSONResponse(
+        content={
+            "profiles": {str(cfid): values for cfid, values in profiles.items()},
+            "missing": [cfid for cfid in dict.fromkeys(data.cfids) if cfid not in profiles],
+        },
+        status_code=200
+    )
 
 # Helper function for common response logic
 async def get_profile_field(cfid: int, field_name: str, field_display_name: str, request: Request, token: str):
     """Helper to get a specific field from profile with caching"""
-    logbook.info(f"Request from IP {request.client.host}; account {authbook.token_owner(token)} to get profile {field_display_name} for cfid {cfid}")
+    logbook.info(f"Request from IP {request.client.host}; account {request.state.auth.username} to get profile {field_display_name} for cfid {cfid}")
     
     profile = await get_cached_profile(cfid)
     if not profile:
@@ -491,7 +472,7 @@ async def get_profile_phone(request: Request, cfid: int):
 async def get_profile_is_staff(request: Request, cfid: int):
     route_prechecks(request)
     return {
-        "is_staff": centralfiles.get_profile_is_staff(cfid)
+        "is_staff": await database.run(centralfiles.get_profile_is_staff, cfid)
     }
 
 class UploadProfileImageData(BaseModel):
@@ -502,13 +483,13 @@ class UploadProfileImageData(BaseModel):
 @set_permission(permission="central_files")
 async def upload_profile_image(request: Request, data: UploadProfileImageData):
     token:str = route_prechecks(request)
-    logbook.info(f"Request from IP {request.client.host}; account {authbook.token_owner(token)} to upload profile image for cfid {data.cfid}")
+    logbook.info(f"Request from IP {request.client.host}; account {request.state.auth.username} to upload profile image for cfid {data.cfid}")
     
     try:
         # Decode base64 string back to bytes
         file_bytes = base64.b64decode(data.img_bytes)
         
-        success = centralfiles.modify(data.cfid).profile_image(file_bytes)
+        success = await database.run(centralfiles.modify(data.cfid).profile_image, file_bytes)
         if success:
             return JSONResponse(content={"success": True}, status_code=200)
         else:
@@ -517,6 +498,9 @@ async def upload_profile_image(request: Request, data: UploadProfileImageData):
     except base64.binascii.Error as e:
         logbook.error(f"Base64 decoding error for cfid {data.cfid}: {e}")
         return JSONResponse(content={"success": False, "error": "Invalid image data format"}, status_code=400)
+    except centralfiles.errors.ImageTooLarge as e:
+        logbook.warning(f"Rejected a profile image for cfid {data.cfid}: {e}")
+        return JSONResponse(content={"success": False, "error": str(e)}, status_code=400)
     except Exception as e:
         logbook.error(f"Unexpected error uploading profile image for cfid {data.cfid}: {e}")
         return JSONResponse(content={"success": False, "error": "Internal server error"}, status_code=500)
@@ -525,9 +509,9 @@ async def upload_profile_image(request: Request, data: UploadProfileImageData):
 @set_permission(permission="central_files")
 async def get_occupation(request: Request, cfid: int):
     token:str = route_prechecks(request)
-    logbook.info(f"Request from IP {request.client.host}; account {authbook.token_owner(token)} to get the occupation for cfid {cfid}")
+    logbook.info(f"Request from IP {request.client.host}; account {request.state.auth.username} to get the occupation for cfid {cfid}")
     try:
-        occupation_data = centralfiles.get_occupation(cfid)
+        occupation_data = await database.run(centralfiles.get_occupation, cfid)
     except centralfiles.errors.ProfileNotFound:
         return JSONResponse(content={"error": "Profile not found."}, status_code=404)
     return HTMLResponse(occupation_data, status_code=200)
@@ -537,9 +521,9 @@ async def get_occupation(request: Request, cfid: int):
 @set_permission(["central_files", "dianetics"])
 async def load_pc_file(request: Request, cfid):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Has accessed the PC folder of {cfid}")
-    profile = centralfiles.get_profile(cfid=int(cfid))
-    dianetics_profile = centralfiles.dianetics.get_profile(cfid=cfid)
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Has accessed the PC folder of {cfid}")
+    profile = await database.run(centralfiles.get_profile, cfid=int(cfid))
+    dianetics_profile = await database.run(centralfiles.dianetics.get_profile, cfid=cfid)
     return templates.TemplateResponse(
         request,
         "pc_profile.html",
@@ -557,9 +541,8 @@ class SetThetaData(BaseModel):
 @set_permission(["central_files", "dianetics"])
 async def set_theta(request: Request, post_data: SetThetaData):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is setting CFID {post_data.cfid}'s Theta Count to {post_data.theta_count}")
-    success = centralfiles.dianetics.modify(post_data.cfid).set_theta_count(post_data.theta_count)
-    update_mind_class_estimation(str(post_data.cfid))
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is setting CFID {post_data.cfid}'s Theta Count to {post_data.theta_count}")
+    success = await database.run(centralfiles.dianetics.modify(post_data.cfid).set_theta_count, post_data.theta_count)
 
     return JSONResponse(
         content={"success": success},
@@ -570,8 +553,8 @@ async def set_theta(request: Request, post_data: SetThetaData):
 @set_permission(permission="central_files")
 async def load_agreements_page(request: Request, cfid):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Has accessed the PC folder of {cfid}")
-    profile = centralfiles.get_profile(cfid=int(cfid))
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Has accessed the PC folder of {cfid}")
+    profile = await database.run(centralfiles.get_profile, cfid=int(cfid))
     return templates.TemplateResponse(
         request,
         "agreements.html",
@@ -588,7 +571,7 @@ class add_agreement_data(BaseModel):
 @set_permission(permission="central_files")
 async def route_add_agreement(request: Request, data:add_agreement_data, cfid):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Has added an agreement for CFID {cfid}, that agreement being \"{data.agreement}\"")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Has added an agreement for CFID {cfid}, that agreement being \"{data.agreement}\"")
     
     try:
         data.date_promised = datetime.datetime.strptime(data.date_promised, "%Y-%m-%d")
@@ -600,7 +583,8 @@ async def route_add_agreement(request: Request, data:add_agreement_data, cfid):
             status_code=400
         )
 
-    success = centralfiles.agreements.add_agreement(
+    success = await database.run(
+        centralfiles.agreements.add_agreement,
         cfid=cfid,
         agreement=data.agreement,
         date_agreed=data.date_promised
@@ -617,9 +601,9 @@ async def route_add_agreement(request: Request, data:add_agreement_data, cfid):
 @set_permission(permission="central_files")
 async def route_get_agreements(request: Request, cfid):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is listing all agreements with CFID {cfid}.")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is listing all agreements with CFID {cfid}.")
 
-    agreements_list:list = centralfiles.agreements.get_agreements(cfid=cfid)
+    agreements_list:list = await database.run(centralfiles.agreements.get_agreements, cfid=cfid)
 
     if agreements_list is False:
         return JSONResponse(
@@ -640,9 +624,9 @@ class SetFulfilledData(BaseModel):
 @set_permission(permission="central_files")
 async def route_set_fulfilled_status(request: Request, data: SetFulfilledData, cfid):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is listing all agreements with CFID {cfid}.")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is listing all agreements with CFID {cfid}.")
 
-    success = centralfiles.agreements.set_fulfilled_status(cfid=int(cfid), agreement_id=int(data.agreement_id), value=bool(data.value))
+    success = await database.run(centralfiles.agreements.set_fulfilled_status, cfid=int(cfid), agreement_id=int(data.agreement_id), value=bool(data.value))
 
     return HTMLResponse(
         content=str(success),
@@ -656,9 +640,9 @@ class DelAgreementData(BaseModel):
 @set_permission(permission="central_files")
 async def route_set_fulfilled_status(request: Request, data: DelAgreementData, cfid):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is listing all agreements with CFID {cfid}.")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is listing all agreements with CFID {cfid}.")
 
-    success = centralfiles.agreements.delete(cfid=cfid, agreement_id=int(data.agreement_id))
+    success = await database.run(centralfiles.agreements.delete, cfid=cfid, agreement_id=int(data.agreement_id))
 
     return HTMLResponse(
         content=str(success),
@@ -667,7 +651,7 @@ async def route_set_fulfilled_status(request: Request, data: DelAgreementData, c
  
 class AuditingLog:
     def list_all_sessions(cfid):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             cur = conn.cursor()
             try:
                 cur.execute(
@@ -693,7 +677,7 @@ class AuditingLog:
         return parsed_data
 
     def new_session(date:datetime.datetime, cfid:int, auditor:str):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.write() as conn:
             cur = conn.cursor()
             try:
                 cur.execute(
@@ -720,7 +704,7 @@ class AuditingLog:
 
         def set_status(self, value:int=1):
             # Stat 1 = Comp'd, Stat 2 = Pending, Stat 3 = Cancelled
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 cur = conn.cursor()
                 try:
                     cur.execute(
@@ -737,7 +721,7 @@ class AuditingLog:
             return True
 
         def delete_action(self, action_id:int):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 cur = conn.cursor()
                 try:
                     cur.execute(
@@ -753,7 +737,7 @@ class AuditingLog:
             return True
 
         def set_action_status(self, status, action_id):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 cur = conn.cursor()
                 try:
                     cur.execute(
@@ -770,7 +754,7 @@ class AuditingLog:
                     return False
 
         def add_action(self, action_text):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 cur = conn.cursor()
                 try:
                     cur.execute(
@@ -787,7 +771,7 @@ class AuditingLog:
                     return False
 
         def delete_engram(self, engram_id):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 cur = conn.cursor()
                 try:
                     cur.execute(
@@ -802,7 +786,7 @@ class AuditingLog:
                     return False
 
         def list_engrams(self):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.read() as conn:
                 cur = conn.cursor()
                 try:
                     cur.execute(
@@ -828,7 +812,7 @@ class AuditingLog:
             return parsed_data
 
         def get_session_details(self):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.read() as conn:
                 cur = conn.cursor()
                 try:
                     cur.execute(
@@ -857,7 +841,7 @@ class AuditingLog:
             }
 
         def list_planned_actions(self):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.read() as conn:
                 cur = conn.cursor()
                 try:
                     cur.execute(
@@ -887,7 +871,7 @@ class AuditingLog:
             incident = str(incident)
             somatic = str(somatic)
             incident_age = int(incident_age)
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 cur = conn.cursor()
                 try:
                     cur.execute(
@@ -904,7 +888,7 @@ class AuditingLog:
             return True
 
         def set_remarks_value(self, text_value:str):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 cur = conn.cursor()
                 try:
                     cur.execute(
@@ -922,7 +906,7 @@ class AuditingLog:
             return True
 
         def set_session_details(self, preclear_cfid, date, summary, duration, auditor):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 cur = conn.cursor()
                 try:
                     cur.execute(
@@ -940,7 +924,7 @@ class AuditingLog:
             return True
         
         def delete_session(self):
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 cur = conn.cursor()
                 try:
                     cur.execute(
@@ -959,8 +943,8 @@ class AuditingLog:
 @set_permission(["central_files", "dianetics"])
 async def load_sessions_page(request: Request, cfid):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Has accessed the session records of {cfid}")
-    profile = centralfiles.get_profile(cfid=int(cfid))
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Has accessed the session records of {cfid}")
+    profile = await database.run(centralfiles.get_profile, cfid=int(cfid))
     return templates.TemplateResponse(
         request,
         "sessions_list.html",
@@ -973,9 +957,9 @@ async def load_sessions_page(request: Request, cfid):
 @set_permission(["central_files", "dianetics"])
 async def list_all_sessions(request: Request, cfid):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Has accessed the session records of {cfid}")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Has accessed the session records of {cfid}")
     
-    all_sessions = AuditingLog.list_all_sessions(cfid)
+    all_sessions = await database.run(AuditingLog.list_all_sessions, cfid)
 
     return JSONResponse(
         content=all_sessions,
@@ -986,7 +970,7 @@ async def list_all_sessions(request: Request, cfid):
 @set_permission(["central_files", "dianetics"])
 async def create_session(request: Request, cfid:int, date:str):
     token:str = route_prechecks(request)
-    username = authbook.token_owner(token)
+    username = request.state.auth.username
     logbook.info(f"{request.client.host} ({username}) Has accessed the session records of {cfid}")
     
     try:
@@ -1008,7 +992,8 @@ async def create_session(request: Request, cfid:int, date:str):
             status_code=400
         )
 
-    new_session_id = AuditingLog.new_session(
+    new_session_id = await database.run(
+        AuditingLog.new_session,
         date=date,
         cfid=cfid,
         auditor=username
@@ -1023,17 +1008,17 @@ async def create_session(request: Request, cfid:int, date:str):
 @set_permission(["central_files", "dianetics"])
 async def load_sessions_page(request: Request, cfid, session_id):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Has accessed to access the specific session {session_id} for {cfid}")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Has accessed to access the specific session {session_id} for {cfid}")
     
     try:
-        session = AuditingLog.session(session_id=session_id)
+        session = await database.run(AuditingLog.session, session_id=session_id)
     except LookupError:
         with open("modules/404.html", "r") as file:
             content = file.read()
         return HTMLResponse(content, status_code=404)
 
-    profile = centralfiles.get_profile(cfid=int(cfid))
-    session_data = session.get_session_details()
+    profile = await database.run(centralfiles.get_profile, cfid=int(cfid))
+    session_data = await database.run(session.get_session_details)
 
     status_map = {
         1: "completed",
@@ -1062,9 +1047,11 @@ class set_details_data(BaseModel):
 @set_permission(["central_files", "dianetics"])
 async def route_set_session_details(request: Request, cfid, session_id, data: set_details_data):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is setting details for the session {session_id} for CFID {cfid}")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is setting details for the session {session_id} for CFID {cfid}")
     
-    success = AuditingLog.session(session_id).set_session_details(
+    session = await database.run(AuditingLog.session, session_id)
+    success = await database.run(
+        session.set_session_details,
         preclear_cfid=cfid,
         date=data.date,
         summary=data.summary,
@@ -1086,9 +1073,10 @@ class set_remarks_data(BaseModel):
 @set_permission(["central_files", "dianetics"])
 async def route_set_session_details(request: Request, cfid, session_id, data: set_remarks_data):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is setting details for the session {session_id} for CFID {cfid}")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is setting details for the session {session_id} for CFID {cfid}")
 
-    success = AuditingLog.session(session_id).set_remarks_value(session_id, data.text_value)
+    session = await database.run(AuditingLog.session, session_id)
+    success = await database.run(session.set_remarks_value, session_id, data.text_value)
 
     return JSONResponse(
         content={
@@ -1107,9 +1095,10 @@ class AddEngramData(BaseModel):
 @set_permission(["central_files", "dianetics"])
 async def route_add_engram(request: Request, cfid, session_id, data: AddEngramData):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is setting details for the session {session_id} for CFID {cfid}")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is setting details for the session {session_id} for CFID {cfid}")
 
-    success = AuditingLog.session(session_id).add_engram(data.actions, data.incident, data.somatic, data.incident_age)
+    session = await database.run(AuditingLog.session, session_id)
+    success = await database.run(session.add_engram, data.actions, data.incident, data.somatic, data.incident_age)
 
     return JSONResponse(
         content={
@@ -1122,9 +1111,10 @@ async def route_add_engram(request: Request, cfid, session_id, data: AddEngramDa
 @set_permission(["central_files", "dianetics"])
 async def route_list_engrams(request: Request, cfid, session_id):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is setting details for the session {session_id} for CFID {cfid}")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is setting details for the session {session_id} for CFID {cfid}")
 
-    engrams = AuditingLog.session(session_id).list_engrams()
+    session = await database.run(AuditingLog.session, session_id)
+    engrams = await database.run(session.list_engrams)
 
     return JSONResponse(
         content={
@@ -1138,8 +1128,9 @@ async def route_list_engrams(request: Request, cfid, session_id):
 @set_permission(["central_files", "dianetics"])
 async def route_delete_engram(request: Request, cfid, session_id, engram_id):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is attempting to delete engram {engram_id} for session {session_id}, CFID {cfid}")
-    success = AuditingLog.session(session_id=session_id).delete_engram(engram_id)
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is attempting to delete engram {engram_id} for session {session_id}, CFID {cfid}")
+    session = await database.run(AuditingLog.session, session_id)
+    success = await database.run(session.delete_engram, engram_id)
     return JSONResponse(
         content={
             "success": success
@@ -1151,8 +1142,9 @@ async def route_delete_engram(request: Request, cfid, session_id, engram_id):
 @set_permission(["central_files", "dianetics"])
 async def delete_session(request: Request, cfid, session_id):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is attempting to delete the session {session_id} for {cfid}")
-    success = AuditingLog.session(session_id).delete_session()
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is attempting to delete the session {session_id} for {cfid}")
+    session = await database.run(AuditingLog.session, session_id)
+    success = await database.run(session.delete_session)
     return JSONResponse(
         content={
             "success": success
@@ -1178,8 +1170,9 @@ async def session_set_status(request: Request, cfid, session_id:int, status_code
             status_code=400
         )
 
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is attempting to mark session ID {session_id} as code {status_code} for {cfid}")
-    success = AuditingLog.session(session_id).set_status(status_code)
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is attempting to mark session ID {session_id} as code {status_code} for {cfid}")
+    session = await database.run(AuditingLog.session, session_id)
+    success = await database.run(session.set_status, status_code)
     return JSONResponse(
         content={
             "success": success
@@ -1191,9 +1184,10 @@ async def session_set_status(request: Request, cfid, session_id:int, status_code
 @set_permission(["central_files", "dianetics"])
 async def list_session_actions(request: Request, cfid, session_id):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) is listing planned actions for session {session_id} (CFID {cfid})")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) is listing planned actions for session {session_id} (CFID {cfid})")
     
-    actions_list = AuditingLog.session(session_id).list_planned_actions()
+    session = await database.run(AuditingLog.session, session_id)
+    actions_list = await database.run(session.list_planned_actions)
     
     if actions_list is False:
         return JSONResponse(
@@ -1216,9 +1210,10 @@ class AddActionData(BaseModel):
 @set_permission(["central_files", "dianetics"])
 async def add_session_action(request: Request, cfid, session_id, data: AddActionData):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is adding an action for session {session_id}, CFID {cfid}")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is adding an action for session {session_id}, CFID {cfid}")
     
-    action_id = AuditingLog.session(session_id=session_id).add_action(data.action_text)
+    session = await database.run(AuditingLog.session, session_id)
+    action_id = await database.run(session.add_action, data.action_text)
 
     return JSONResponse(
         content={
@@ -1234,9 +1229,10 @@ class CompletedActionData(BaseModel):
 @set_permission(["central_files", "dianetics"])
 async def update_session_action(request: Request, cfid, session_id, action_id, data: CompletedActionData):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is adding an action for session {session_id}, CFID {cfid}")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is adding an action for session {session_id}, CFID {cfid}")
     
-    action_id = AuditingLog.session(session_id=session_id).set_action_status(data.completed, action_id=action_id)
+    session = await database.run(AuditingLog.session, session_id)
+    action_id = await database.run(session.set_action_status, data.completed, action_id=action_id)
 
     return JSONResponse(
         content={
@@ -1249,13 +1245,14 @@ async def update_session_action(request: Request, cfid, session_id, action_id, d
 @set_permission(["central_files", "dianetics"])
 async def delete_session_action(request: Request, cfid, session_id, action_id):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is adding an action for session {session_id}, CFID {cfid}")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is adding an action for session {session_id}, CFID {cfid}")
     
     session_id = int(session_id)
     cfid = int(cfid)
     action_id = int(action_id)
 
-    success = AuditingLog.session(session_id).delete_action(action_id)
+    session = await database.run(AuditingLog.session, session_id)
+    success = await database.run(session.delete_action, action_id)
 
     return JSONResponse(
         content={
@@ -1268,8 +1265,8 @@ async def delete_session_action(request: Request, cfid, session_id, action_id):
 @set_permission(["central_files", "dianetics"])
 async def open_scheduling_page(request: Request, cfid):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is accessing the scheduling page for {cfid}")
-    profile = centralfiles.get_profile(cfid=int(cfid))
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is accessing the scheduling page for {cfid}")
+    profile = await database.run(centralfiles.get_profile, cfid=int(cfid))
     return templates.TemplateResponse(
         request,
         "scheduling.html",
@@ -1278,123 +1275,11 @@ async def open_scheduling_page(request: Request, cfid):
         }
     )
 
-DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-
-def get_week_dates(reference_date=None):
-    """
-    Given reference_date, return list of 7 date objects (Mon-Sun) for the week containing the reference_date.
-    """
-    if reference_date is None:
-        ref = datetime.datetime.now().date()
-    elif isinstance(reference_date, datetime.datetime):
-        ref = reference_date.date()
-    elif isinstance(reference_date, str):
-        ref = datetime.datetime.strptime(reference_date, "%Y-%m-%d").date()
-    else:
-        ref = reference_date
-
-    # Calculate Monday of the week containing the reference date
-    # weekday(): Monday=0, Sunday=6
-    offset = ref.weekday()  # 0-6
-    monday = ref - datetime.timedelta(days=offset)
-
-    return [monday + datetime.timedelta(days=i) for i in range(7)]
-
-def get_scheduling_data(cfid, reference_date=None):
-    """
-    Returns FULL WEEK (Monday\u2013Sunday) structured schedule data.
-    """
-
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-
-        # --- Get full week range ---
-        week_dates = get_week_dates(reference_date)
-        date_strings = [d.isoformat() for d in week_dates]
-
-        # ------------------------------------------------------------------------------
-        # 1. Fetch normal (non-repeating) schedules
-        # ------------------------------------------------------------------------------
-        cur.execute(
-            f"""
-            SELECT cfid, date, time_str, activity, auditor, room
-            FROM dn_schedule_data
-            WHERE cfid = ?
-            AND DATE(date) IN ({','.join('?' * len(date_strings))})
-            """,
-            (cfid, *date_strings)
-        )
-        normal_schedules = cur.fetchall()
-
-        # ------------------------------------------------------------------------------
-        # 2. Fetch repeating schedules
-        # ------------------------------------------------------------------------------
-        cur.execute(
-            """
-            SELECT cfid, start_date, repeat_integer, end_date,
-                   time_str, activity, auditor, room
-            FROM dn_scheduling_data_repeating
-            WHERE cfid = ?
-            """,
-            (cfid,)
-        )
-        repeating_schedules = cur.fetchall()
-
-    # ------------------------------------------------------------------------------
-    # Build frontend-ready result: every day present
-    # ------------------------------------------------------------------------------
-    output = { day: {} for day in DAY_NAMES }
-
-    # Map ISO-date to weekday name
-    date_to_day_name = { date_strings[i]: DAY_NAMES[i] for i in range(7) }
-
-    # Helper to insert
-    def insert(day_name, time_str, activity, auditor, room):
-        output[day_name][time_str] = {
-            "time": time_str,
-            "activity": activity,
-            "auditor": auditor,
-            "room": room
-        }
-
-    # ------------------------------------------------------------------------------
-    # Insert NORMAL schedules
-    # ------------------------------------------------------------------------------
-    for row in normal_schedules:
-        date = row["date"].split(" ")[0]  # Cuts out all after the date
-        day_name = date_to_day_name[date]
-        insert(day_name, row["time_str"], row["activity"], row["auditor"], row["room"])
-
-    # ------------------------------------------------------------------------------
-    # Insert REPEATING schedules (expand)
-    # ------------------------------------------------------------------------------
-    for row in repeating_schedules:
-        start = datetime.datetime.strptime(row["start_date"], "%Y-%m-%d").date()
-        end = datetime.datetime.strptime(row["end_date"], "%Y-%m-%d").date()
-        repeat_n = int(row["repeat_integer"])
-
-        time_str = row["time_str"]
-        activity = row["activity"]
-        auditor = row["auditor"]
-        room = row["room"]
-
-        for d, iso in zip(week_dates, date_strings):
-            if d < start or d > end:
-                continue
-
-            delta_days = (d - start).days
-            if delta_days % repeat_n == 0:
-                day_name = date_to_day_name[iso]
-                insert(day_name, time_str, activity, auditor, room)
-
-    return output
-
 @router.get("/api/files/get/{cfid}/scheduling/fetch/week/{date}")
 @set_permission(["central_files", "dianetics"])
 async def open_scheduling_page(request: Request, cfid:int, date:str):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is accessing the set scheduling for {cfid}")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is accessing the set scheduling for {cfid}")
 
     try:
         dateobj = datetime.datetime.strptime(date, "%Y-%m-%d")
@@ -1406,7 +1291,7 @@ async def open_scheduling_page(request: Request, cfid:int, date:str):
             status_code=400
         )
     
-    schedule_data = get_scheduling_data(cfid, dateobj)
+    schedule_data = await database.run(centralfiles.schedule.pc_week, cfid, dateobj)
     
     return JSONResponse(
         content=schedule_data,
@@ -1420,51 +1305,21 @@ class ScheduleCellData(BaseModel):
     auditor: str = ""
     room: str
 
-@router.post("/api/files/get/{cfid}/scheduling/save/cell/{day}")
-@set_permission(["central_files", "dianetics"])
-async def set_scheduling_cell(
-    request: Request, 
-    cfid: int, 
-    day: str, 
-    postdata: ScheduleCellData
-):
-    token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) editing schedule for CFID {cfid} on {day}")
-
-    if not postdata.activity and not postdata.auditor and not postdata.room:
-        return JSONResponse(
-            content={
-                "success": False,
-                "error": "You need to fill out at least activity, room or auditor key. They're not both required, but one must be present."
-            }
-        )
-
-    weekdays = {
-        "monday": 0,
-        "tuesday": 1,
-        "wednesday": 2,
-        "thursday": 3,
-        "friday": 4,
-        "saturday": 5,
-        "sunday": 6
-    }
-    
-    # Gets the start of the week we are currently in
-    datenow = datetime.datetime.now()
-    week_start = datenow - datetime.timedelta(days=datenow.weekday())
-    set_for_day_date = week_start + datetime.timedelta(weekdays[day.lower()])
-
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
+def save_schedule_cell(cfid: int, set_for_day_date: str, postdata: ScheduleCellData):
+    """
+    Inserts or updates one schedule cell. Returns False if no room was given.
+    """
+    with database.write() as conn:
         cur = conn.cursor()
+        cur.row_factory = sqlite3.Row
 
         # Ensure only one entry per time + room per day
         cur.execute(
             """
             SELECT activity, auditor, room, schedule_id FROM dn_schedule_data
-            WHERE cfid = ? AND time_str = ? AND room = ?
+            WHERE cfid = ? AND date = ? AND time_str = ? AND room = ?
             """,
-            (cfid, postdata.time, postdata.room)
+            (cfid, set_for_day_date, postdata.time, postdata.room)
         )
         data = cur.fetchone()
         existing = data is not None
@@ -1484,9 +1339,7 @@ async def set_scheduling_cell(
             except TypeError:
                 auditor = None
         if not room:
-            return JSONResponse(
-                content={"success": False, "error": "You did not specify 'room' (str) key."}
-            )
+            return False
 
         if existing:
             schedule_id = data[3]
@@ -1509,15 +1362,77 @@ async def set_scheduling_cell(
             logbook.info("Inserted new schedule cell")
 
         conn.commit()
+    return True
+
+@router.post("/api/files/get/{cfid}/scheduling/save/cell/{day}")
+@set_permission(["central_files", "dianetics"])
+async def set_scheduling_cell(
+    request: Request, 
+    cfid: int, 
+    day: str, 
+    postdata: ScheduleCellData
+):
+    token:str = route_prechecks(request)
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) editing schedule for CFID {cfid} on {day}")
+
+    if not postdata.activity and not postdata.auditor and not postdata.room:
+        return JSONResponse(
+            content={
+                "success": False,
+                "error": "You need to fill out at least activity, room or auditor key. They're not both required, but one must be present."
+            }
+        )
+
+    weekdays = {
+        "monday": 0,
+        "tuesday": 1,
+        "wednesday": 2,
+        "thursday": 3,
+        "friday": 4,
+        "saturday": 5,
+        "sunday": 6
+    }
+    
+    # Gets the start of the week we are currently in
+    week_start, _ = centralfiles.schedule.week_range()
+    set_for_day_date = (week_start + datetime.timedelta(weekdays[day.lower()])).isoformat()
+
+    if not await database.run(save_schedule_cell, cfid, set_for_day_date, postdata):
+        return JSONResponse(
+            content={"success": False, "error": "You did not specify 'room' (str) key."}
+        )
 
     return JSONResponse({"success": True, "message": "Schedule cell saved successfully."}, 200)
 
+# Week or month of sessions for one PC (cfid=), auditor (auditor=), room (room=) or everyone.
+@router.get("/api/files/schedule/{period}", response_class=JSONResponse)
+@set_permission(["central_files", "dianetics"])
+async def get_schedule_view(request: Request, period: str, date: str = None, cfid: int = None, auditor: str = None, room: str = None):
+    token:str = route_prechecks(request)
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is viewing the {period} schedule for cfid={cfid} auditor={auditor} room={room}")
+    try:
+        view = await database.run(centralfiles.schedule.view, period, date, cfid=cfid, auditor=auditor, room=room)
+    except ValueError as err:
+        return JSONResponse(content={"error": str(err)}, status_code=400)
+    return JSONResponse(content=view, status_code=200)
+
+@router.get("/api/files/schedule/conflicts/{start}/{end}", response_class=JSONResponse)
+@set_permission(["central_files", "dianetics"])
+async def get_schedule_conflicts(request: Request, start: str, end: str, cfid: int = None, auditor: str = None, room: str = None):
+    token:str = route_prechecks(request)
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is checking schedule conflicts from {start} to {end}")
+    try:
+        conflicts = await database.run(centralfiles.schedule.conflicts, start, end, cfid=cfid, auditor=auditor, room=room)
+    except ValueError as err:
+        return JSONResponse(content={"error": str(err)}, status_code=400)
+    return JSONResponse(content={"conflicts": conflicts}, status_code=200)
+
 @router.get("/files/get/{cfid}/flags")
 @set_permission("central_files")
 async def open_flags_page(request: Request, cfid):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is accessing the file flags for {cfid}")
-    profile = centralfiles.get_profile(cfid=int(cfid))
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is accessing the file flags for {cfid}")
+    profile = await database.run(centralfiles.get_profile, cfid=int(cfid))
     return templates.TemplateResponse(
         request,
         "flags.html",
@@ -1529,39 +1444,85 @@ async def open_flags_page(request: Request, cfid):
 # Note: Integration of below dianetics code may not be ideal. This was basically copy-pasted from the obsolete and deleted dianetics module.
 
 class Dianetics_CF:
+    # sort= values for list_all_pcs and the columns they order by. cfid breaks ties.
+    pc_sort_columns = {
+        "name": "n.name COLLATE NOCASE",
+        "cfid": "d.cfid",
+        "tone_level": "tone_level",
+        "mind_class": "actual_class",
+        "last_session": "last_session",
+    }
+    mind_class_names = {
+        0: "Undetermined",
+        1: "Class A",
+        2: "Class B",
+        3: "Class C",
+    }
+
     @staticmethod
-    def list_all_pcs():
-        with sqlite3.connect(DB_PATH) as conn:
+    def list_all_pcs(limit:int=None, offset:int=0, sort:str="name", descending:bool=False):
+        """
+        The preclear roster from one joined query, with what the Dianetics pages show for each PC.
+
+        :return: (page of PCs, total number of PCs), or None on a database error.
+        """
+        if sort not in Dianetics_CF.pc_sort_columns:
+            raise ValueError(f"sort must be one of {', '.join(Dianetics_CF.pc_sort_columns)}")
+        direction = "DESC" if descending else "ASC"
+
+        with database.read() as conn:
             try:
                 cursor = conn.cursor()
+                cursor.execute("SELECT count(*) FROM cf_is_dianetics_pc WHERE is_dn_pc = True")
+                total = cursor.fetchone()[0]
                 cursor.execute(
-                    "SELECT cfid FROM cf_is_dianetics_pc WHERE is_dn_pc = True"
+                    f"""
+                    SELECT d.cfid, n.name,
+                           COALESCE(t.est_tone_level, -1) AS tone_level,
+                           COALESCE(m.actual_class, 0) AS actual_class,
+                           COALESCE(m.apparent_class, 0),
+                           (
+                               SELECT MAX(s.date) FROM sessions_list s
+                               WHERE s.preclear_cfid = d.cfid AND s.status_code = 1
+                           ) AS last_session,
+                           COALESCE(sc.is_stuck_case, False), COALESCE(sc.stuck_age, -1),
+                           COALESCE(cc.is_control_case, False)
+                    FROM cf_is_dianetics_pc d
+                    JOIN cf_names n ON n.cfid = d.cfid
+                    LEFT JOIN cf_tonescale_records t ON t.cfid = d.cfid
+                    LEFT JOIN cf_pc_mind_class m ON m.cfid = d.cfid
+                    LEFT JOIN cf_dn_stuck_case sc ON sc.cfid = d.cfid
+                    LEFT JOIN cf_dn_control_case cc ON cc.cfid = d.cfid
+                    WHERE d.is_dn_pc = True
+                    ORDER BY {Dianetics_CF.pc_sort_columns[sort]} {direction}, d.cfid {direction}
+                    LIMIT ? OFFSET ?
+                    """,
+                    (-1 if limit is None else limit, offset)
                 )
                 data = cursor.fetchall()
-            except Exception as err:
+            except sqlite3.OperationalError as err:
                 logbook.error(f"Error while fetching CF data: {err}", exception=err)
                 return None
 
         parsed_data = []
-        for item in data:
-            with sqlite3.connect(DB_PATH) as conn:
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        "SELECT name FROM cf_names WHERE cfid = ?",
-                        (item[0],)
-                    )
-                    pc_name = cursor.fetchone()[0]
-                except Exception as err:
-                    logbook.error(f"Error while fetching PC name: {err}", exception=err)
-                    continue
-
-            parsed_data.append({"cfid": item[0], "name": pc_name})
-        return parsed_data
+        for (cfid, pc_name, tone_level, actual_class, apparent_class, last_session,
+             is_stuck_case, stuck_age, is_control_case) in data:
+            parsed_data.append({
+                "cfid": cfid,
+                "name": pc_name,
+                "tone_level": tone_level,
+                "mind_class_actual": Dianetics_CF.mind_class_names.get(actual_class, "Undetermined"),
+                "mind_class_apparent": Dianetics_CF.mind_class_names.get(apparent_class, "Undetermined"),
+                "last_session": str(last_session)[:10] if last_session is not None else None,
+                "is_stuck_case": bool(is_stuck_case),
+                "stuck_age": stuck_age,
+                "is_control_case": bool(is_control_case),
+            })
+        return parsed_data, total
 
     @staticmethod
     def get_preclear_data(cfid):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute(
@@ -1579,15 +1540,26 @@ class Dianetics_CF:
 
 @router.get("/api/dianetics/preclear/list")
 @set_permission(permission="dianetics")
-async def list_preclears(request: Request):
+async def list_preclears(request: Request, limit: int = None, offset: int = 0, sort: str = "name", descending: bool = False):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)}) Is listing all preclears.")
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username}) Is listing all preclears.")
+    if (limit is not None and limit < 0) or offset < 0:
+        return JSONResponse(content={"error": "limit and offset cannot be negative."}, status_code=400)
 
-    all_pcs = Dianetics_CF.list_all_pcs()
+    try:
+        all_pcs = await database.run(Dianetics_CF.list_all_pcs, limit, offset, sort, descending)
+    except ValueError as err:
+        return JSONResponse(content={"error": str(err)}, status_code=400)
 
     if all_pcs is not None:
+        preclears, total = all_pcs
         return JSONResponse(
-            content=all_pcs,
+            content={
+                "preclears": preclears,
+                "total": total,
+                "limit": limit,
+                "offset": offset,
+            },
             status_code=200,
         )
     else:
@@ -1645,29 +1617,32 @@ chart_to_db_map = {
 
 chart_columns = chart_to_db_map.keys()
 
+def get_chart_row(cfid):
+    with database.read() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM CF_hubbard_chard_of_eval WHERE cfid = ?",
+            (cfid,)
+        )
+        return cursor.fetchone()
+
 @router.get("/api/dianetics/dianometry/get-chart/{cfid}")
 @set_permission(permission="dianetics")
 async def get_chart(request: Request, cfid):
     token:str = route_prechecks(request)
     logbook.info(
-        f"IP {request.client.host} ({authbook.token_owner(token)}) is fetching the chart data for CFID {cfid}."
+        f"IP {request.client.host} ({request.state.auth.username}) is fetching the chart data for CFID {cfid}."
     )
 
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT * FROM CF_hubbard_chard_of_eval WHERE cfid = ?",
-                (cfid,)
-            )
-            row = cursor.fetchone()
-            if not row:
-                return JSONResponse([], status_code=200)
-
-            data = row[1:]  # skip cfid column, take the rest as tone levels
+        row = await database.run(get_chart_row, cfid)
     except Exception as err:
         logbook.error(f"Error while fetching chart data: {err}")
         return JSONResponse([], status_code=500)
+    if not row:
+        return JSONResponse([], status_code=200)
+
+    data = row[1:]  # skip cfid column, take the rest as tone levels
 
     # Transform into an array of {column_name, tone_level}
     response_data = []
@@ -1691,7 +1666,7 @@ def calculate_new_ts_position(cfid):
     and returning the most common tone level.
     """
     # Get all tone level positions for the CFID
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.read() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "SELECT * FROM CF_hubbard_chard_of_eval WHERE cfid = ?",
@@ -1717,7 +1692,7 @@ def update_tonescale_estimation(cfid):
     new_ts_position = calculate_new_ts_position(cfid)
     if new_ts_position is not None:
         try:
-            with sqlite3.connect(DB_PATH) as conn:
+            with database.write() as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -1734,19 +1709,9 @@ def update_tonescale_estimation(cfid):
     else:
         logbook.warning(f"CFID {cfid} not found in CF_hubbard_chard_of_eval table.")
 
-@router.post("/api/dianetics/dianometry/update-chart")
-@set_permission(permission="dianetics")
-async def update_chart(request: Request, data: update_chart_data):
-    token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)}) is updating the chart data for CFID {data.cfid}, column {data.column_name}, tone level {data.tone_level}")
-
-    if data.column_name not in chart_columns:
-        return JSONResponse({"success": False, "error": "Invalid column name."}, status_code=400)
-
-    column_name = chart_to_db_map[data.column_name]  # Convert to DB column name
-
+def set_chart_value(cfid, column_name: str, tone_level):
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.write() as conn:
             cursor = conn.cursor()
             # Note: Keep this secure and sanitised.
             cursor.execute(
@@ -1755,16 +1720,31 @@ async def update_chart(request: Request, data: update_chart_data):
                 VALUES (?, ?)
                 ON CONFLICT(cfid) DO UPDATE SET {column_name}=excluded.{column_name}
                 """,
-                (data.cfid, data.tone_level)
+                (cfid, tone_level)
             )
             conn.commit()
 
-            update_tonescale_estimation(data.cfid)
-            return JSONResponse({"success": True}, status_code=200)
+            update_tonescale_estimation(cfid)
+            return True
     except sqlite3.OperationalError as err:
         logbook.error(f"Database error while updating chart data: {err}", exception=err)
         conn.rollback()
-        return JSONResponse({"success": False, "error": "Database error occurred while updating chart data."}, status_code=500)
+        return False
+
+@router.post("/api/dianetics/dianometry/update-chart")
+@set_permission(permission="dianetics")
+async def update_chart(request: Request, data: update_chart_data):
+    token:str = route_prechecks(request)
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username}) is updating the chart data for CFID {data.cfid}, column {data.column_name}, tone level {data.tone_level}")
+
+    if data.column_name not in chart_columns:
+        return JSONResponse({"success": False, "error": "Invalid column name."}, status_code=400)
+
+    column_name = chart_to_db_map[data.column_name]  # Convert to DB column name
+
+    if await database.run(set_chart_value, data.cfid, column_name, data.tone_level):
+        return JSONResponse({"success": True}, status_code=200)
+    return JSONResponse({"success": False, "error": "Database error occurred while updating chart data."}, status_code=500)
 
 class dyn_strengths_data(BaseModel):
     cfid: int
@@ -1778,16 +1758,8 @@ dynamic_map = {
     "Mankind": 4
 }
 
-@router.post("/api/dianetics/dianometry/dyn_strengths/set")
-@set_permission(permission="dianetics")
-async def dyn_strengths(request: Request, data: dyn_strengths_data):
-    token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)}) is setting dyn strengths for {data.cfid}.")
-
-    dyn_strength = int(data.strength)
-    dyn_number = dynamic_map[data.dynamic]
-
-    with sqlite3.connect(DB_PATH) as conn:
+def set_dyn_strength(cfid: int, dyn_number: int, dyn_strength: int):
+    with database.write() as conn:
         try:
             cur = conn.cursor()
             cur.execute(
@@ -1796,36 +1768,56 @@ async def dyn_strengths(request: Request, data: dyn_strengths_data):
                 VALUES (?, ?)
                 ON CONFLICT(cfid) DO UPDATE SET dyn_{dyn_number}=excluded.dyn_{dyn_number}
                 """,
-                (data.cfid, dyn_strength,)
+                (cfid, dyn_strength,)
             )
+            if update_mind_class_estimation(cfid) is False:
+                raise sqlite3.OperationalError("mind class could not be recomputed")
             conn.commit()
-            update_mind_class_estimation(data.cfid)
-            return JSONResponse({"success": True}, status_code=200)
+            return True
         except sqlite3.OperationalError as err:
             logbook.error(f"Database error while updating dyn strengths: {err}", exception=err)
             conn.rollback()
-            return JSONResponse({"success": False, "error": "Database error occurred while updating dyn strengths."}, status_code=500)
+            return False
 
-@router.get("/api/dianetics/dianometry/dyn_strengths/get/{cfid}")
-@set_permission(permission="dianetics")
-async def get_dyn_strengths(request: Request, cfid):
-    token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)}) is getting all dyn strengths for {cfid}.")
-
-    update_mind_class_estimation(cfid)
-
-    with sqlite3.connect(DB_PATH) as conn:
+def get_dyn_strength_row(cfid):
+    """
+    Returns the PC's dyn strengths row (None if never set), or False on a database error.
+    """
+    with database.read() as conn:
         try:
             cur = conn.cursor()
             cur.execute(
                 "SELECT dyn_1, dyn_2, dyn_3, dyn_4 FROM cf_dynamic_strengths WHERE cfid = ?",
                 (cfid,)
             )
-            data = cur.fetchone()
+            return cur.fetchone()
         except sqlite3.OperationalError as err:
             logbook.error(f"Database error while fetching dyn strengths: {err}", exception=err)
             conn.rollback()
-            return JSONResponse({"error": "Database error occurred while fetching dyn strengths."}, status_code=500)
+            return False
+
+@router.post("/api/dianetics/dianometry/dyn_strengths/set")
+@set_permission(permission="dianetics")
+async def dyn_strengths(request: Request, data: dyn_strengths_data):
+    token:str = route_prechecks(request)
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username}) is setting dyn strengths for {data.cfid}.")
+
+    dyn_strength = int(data.strength)
+    dyn_number = dynamic_map[data.dynamic]
+
+    if await database.run(set_dyn_strength, data.cfid, dyn_number, dyn_strength):
+        return JSONResponse({"success": True}, status_code=200)
+    return JSONResponse({"success": False, "error": "Database error occurred while updating dyn strengths."}, status_code=500)
+
+@router.get("/api/dianetics/dianometry/dyn_strengths/get/{cfid}")
+@set_permission(permission="dianetics")
+async def get_dyn_strengths(request: Request, cfid):
+    token:str = route_prechecks(request)
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username}) is getting all dyn strengths for {cfid}.")
+
+    data = await database.run(get_dyn_strength_row, cfid)
+    if data is False:
+        return JSONResponse({"error": "Database error occurred while fetching dyn strengths."}, status_code=500)
 
     if data is None:
         return JSONResponse([
@@ -1850,56 +1842,66 @@ class shutoffs_data(BaseModel):
     name: str
     state: bool
 
-@router.post("/api/dianetics/dianometry/shutoffs/set")
-@set_permission(permission="dianetics")
-async def set_shutoffs(request: Request, data: shutoffs_data):
-    token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)}) is setting shutoff {data.name} for {data.cfid} to {data.state}.")
-
-    update_mind_class_estimation(data.cfid)
-
-    with sqlite3.connect(DB_PATH) as conn:
+def set_shutoff(cfid: int, name: str, state: bool):
+    with database.write() as conn:
         try:
             cur = conn.cursor()
             cur.execute(
                 f"""
-                INSERT INTO cf_dn_shutoffs (cfid, {data.name}_shutoff)
+                INSERT INTO cf_dn_shutoffs (cfid, {name}_shutoff)
                 VALUES (?, ?)
-                ON CONFLICT(cfid) DO UPDATE SET {data.name}_shutoff=excluded.{data.name}_shutoff
+                ON CONFLICT(cfid) DO UPDATE SET {name}_shutoff=excluded.{name}_shutoff
                 """,
-                (data.cfid, data.state,)
+                (cfid, state,)
             )
+            if update_mind_class_estimation(cfid) is False:
+                raise sqlite3.OperationalError("mind class could not be recomputed")
             conn.commit()
-            return JSONResponse({"success": True}, status_code=200)
+            return True
         except sqlite3.OperationalError as err:
             logbook.error(f"Database error while updating shutoffs: {err}", exception=err)
             conn.rollback()
-            return JSONResponse({"success": False, "error": "Database error occurred while updating shutoffs."}, status_code=500)
-
-@router.get("/api/dianetics/dianometry/shutoffs/get/{cfid}")
-@set_permission(permission=["dianetics", "central_files"])
-async def get_shutoffs(request: Request, cfid):
-    token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)}) is getting all shutoffs for {cfid}.")
-
-    try:
-        # We update it here and now incase the values were changed elsewhere
-        update_mind_class_estimation(cfid)
-    except Exception as err:
-        logbook.error(f"Error while updating mind class estimation: {err}", exception=err)
+            return False
 
-    with sqlite3.connect(DB_PATH) as conn:
+def get_shutoffs_row(cfid):
+    """
+    Returns the PC's shutoffs row (None if never set), or False on a database error.
+    """
+    with database.read() as conn:
         try:
             cur = conn.cursor()
             cur.execute(
                 "SELECT sonic_shutoff, visio_shutoff FROM cf_dn_shutoffs WHERE cfid = ?",
                 (cfid,)
             )
-            data = cur.fetchone()
+            return cur.fetchone()
         except sqlite3.OperationalError as err:
             logbook.error(f"Database error while fetching shutoffs: {err}", exception=err)
             conn.rollback()
-            return JSONResponse({"error": "Database error occurred while fetching shutoffs."}, status_code=500)
+            return False
+
+@router.post("/api/dianetics/dianometry/shutoffs/set")
+@set_permission(permission="dianetics")
+async def set_shutoffs(request: Request, data: shutoffs_data):
+    token:str = route_prechecks(request)
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username}) is setting shutoff {data.name} for {data.cfid} to {data.state}.")
+
+    if data.name not in ("sonic", "visio"):
+        return JSONResponse({"success": False, "error": "Unknown shutoff."}, status_code=400)
+
+    if await database.run(set_shutoff, data.cfid, data.name, data.state):
+        return JSONResponse({"success": True}, status_code=200)
+    return JSONResponse({"success": False, "error": "Database error occurred while updating shutoffs."}, status_code=500)
+
+@router.get("/api/dianetics/dianometry/shutoffs/get/{cfid}")
+@set_permission(permission=["dianetics", "central_files"])
+async def get_shutoffs(request: Request, cfid):
+    token:str = route_prechecks(request)
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username}) is getting all shutoffs for {cfid}.")
+
+    data = await database.run(get_shutoffs_row, cfid)
+    if data is False:
+        return JSONResponse({"error": "Database error occurred while fetching shutoffs."}, status_code=500)
 
     try:
         sonic_shutoff = bool(data[0])
@@ -1921,24 +1923,38 @@ mind_level_map = {
     3: "Class C"
 }
 
-@router.get("/api/dianetics/dianometry/get_mind_class/{cfid}")
-@set_permission(permission=["dianetics", "central_files"])
-async def get_mind_class(request: Request, cfid):
-    token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)}) is getting mind class for {cfid}.")
-    # Very often when getting mind class, other values have changed. So we update it here.
-    with sqlite3.connect(DB_PATH) as conn:
+def get_mind_class_row(cfid: int):
+    """
+    Returns the stored (actual, apparent) mind class (None if never stored), or False on a database error.
+    """
+    with database.read() as conn:
         try:
             cur = conn.cursor()
             cur.execute(
                 "SELECT actual_class, apparent_class FROM cf_pc_mind_class WHERE cfid = ?",
                 (cfid,)
             )
-            data = cur.fetchone()
+            return cur.fetchone()
         except sqlite3.OperationalError as err:
             logbook.error(f"Database error while fetching mind class: {err}", exception=err)
             conn.rollback()
-            return JSONResponse({"error": "Database error occurred while fetching mind class."}, status_code=500)
+            return False
+
+@router.get("/api/dianetics/dianometry/get_mind_class/{cfid}")
+@set_permission(permission=["dianetics", "central_files"])
+async def get_mind_class(request: Request, cfid:int):
+    token:str = route_prechecks(request)
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username}) is getting mind class for {cfid}.")
+    # The stored class is kept current by the writes to its inputs, so it is only computed here if it was never stored.
+    # Nothing is stored by this read; that happens on the next write to one of the inputs.
+    data = await database.run(get_mind_class_row, cfid)
+    if data is False:
+        return JSONResponse({"error": "Database error occurred while fetching mind class."}, status_code=500)
+
+    if not data:
+        mind_class = await database.run(calculate_mind_class_estimation, cfid)
+        if mind_class is not None:
+            data = (mind_class["actual"], mind_class["apparent"])
 
     if not data:
         return JSONResponse({"error": "Mind class not found."}, status_code=404)
@@ -1949,6 +1965,17 @@ async def get_mind_class(request: Request, cfid):
             },
             status_code=200
         )
+
+@router.post("/api/dianetics/dianometry/mind_class/recompute")
+@set_permission(permission="dianetics")
+async def recompute_mind_classes(request: Request):
+    token:str = route_prechecks(request)
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username}) is recomputing every stored mind class.")
+
+    count = await database.run(recompute_all_mind_classes)
+    if count is False:
+        return JSONResponse({"success": False, "error": "Database error occurred while recomputing mind classes."}, status_code=500)
+    return JSONResponse({"success": True, "count": count}, status_code=200)
     
 from library.email import client_email, recipient_profile
 
@@ -1956,12 +1983,12 @@ from library.email import client_email, recipient_profile
 @set_permission(permission=['central_files', 'mail_view'])
 async def show_mail_page(request: Request, cfid:int):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host}, User {authbook.token_owner(token)} has accessed the C/F Emailing page for {cfid}.")
+    logbook.info(f"IP {request.client.host}, User {request.state.auth.username} has accessed the C/F Emailing page for {cfid}.")
     return templates.TemplateResponse(
         request,
         "mail.html",
         {
-            "profile": centralfiles.get_profile(cfid=cfid)
+            "profile": await database.run(centralfiles.get_profile, cfid=cfid)
         }
     )
 
@@ -1973,7 +2000,7 @@ class send_mail_data(BaseModel):
 @set_permission(permission=['central_files', 'mail_send', 'mail_view'])
 async def mail_user(request: Request, cfid:int, data: send_mail_data):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is sending mail to CFID {cfid}")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is sending mail to CFID {cfid}")
     profile = await get_cached_profile(cfid)
     mail_address = profile['email_addr']
 
@@ -1992,8 +2019,8 @@ async def mail_user(request: Request, cfid:int, data: send_mail_data):
 @set_permission(permission=['central_files', 'mail_view'])
 async def show_mail_page(request: Request):
     token:str = route_prechecks(request)
-    username = authbook.token_owner(token)
-    is_admin = authbook.is_user_admin(username)
+    username = request.state.auth.username
+    is_admin = request.state.auth.is_admin
     logbook.info(f"IP {request.client.host}, User {username} has accessed the C/F Bulk Emailing page.")
     return templates.TemplateResponse(
         request,
@@ -2011,7 +2038,7 @@ class send_bulk_mail_data(BaseModel):
 @set_permission(permission=['central_files', 'mail_send', 'mail_bulk_send', 'mail_view'])
 async def mail_user(request: Request, data: send_bulk_mail_data):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is bulk-mailing.")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is bulk-mailing.")
 
     recipients_list = []
 
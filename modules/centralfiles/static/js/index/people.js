@@ -120,32 +120,34 @@ function showEmptyState() {
   list.innerHTML = `<div class="empty-state"><div class="empty-icon">👤</div><p>No people found. Add someone to get started.</p></div>`;
 }
 
-async function get_name_is_staff(cfid) {
+// Staff status and occupation for many people in one request
+async function fetchPeopleDetails(cfids) {
   try {
-    const res = await fetch(`/api/files/${cfid}/is_staff`);
-    if (res.ok) {
-      const d = await res.json();
-      return d.is_staff ? " 🛡️" : "";
-    }
-    return "";
+    const data = await fetchJSON('/api/files/fields', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ cfids: cfids.map(Number), fields: ['is_staff', 'occupation'] })
+    });
+    return data.profiles || {};
   } catch {
-    return "";
+    return {};
   }
 }
 
-async function createPersonCard(name, cfid) {
+async function createPersonCard(name, cfid, details) {
   const container = document.createElement('div');
   container.className = 'person-card-container';
   container.dataset.cfid = cfid;
   container.dataset.name = name;
-  const staffEmoji = await get_name_is_staff(cfid);
+  const staffEmoji = details && details.is_staff ? " 🛡️" : "";
+  const occupation = details ? (details.occupation || '—') : 'Occupation unavailable';
   container.innerHTML = `
     <a class="person-card" href="/files/get/${cfid ?? encodeURIComponent(name)}">
       <div class="person-card-content">
-        <img class="profile-image" src="/api/files/${cfid}/profile_icon" alt="${name}" onerror="this.src='data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNjAiIGhlaWdodD0iNjAiIHZpZXdCb3g9IjAgMCA2MCA2MCIgZmlsbD0ibm9uZSIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48Y2lyY2xlIGN4PSIzMCIgY3k9IjMwIiByPSIzMCIgZmlsbD0iI2U5ZWNlZiIvPjxwYXRoIGQ9Ik0zMCAzM0MzMy4zMTM3IDMzIDM2IDMwLjMxMzcgMzYgMjdDMzYgMjMuNjg2MyAzMy4zMTM3IDIxIDMwIDIxQzI2LjY4NjMgMjEgMjQgMjMuNjg2MyAyNCAyN0MyNCAzMC4zMTM3IDI2LjY4NjMgMzMgMzAgMzNaIiBmaWxsPSIjNmM3NTdkIi8+PHBhdGggZD0iTTQyIDM5QzQyIDQxLjIwOTEgNDAuMjA5MSA0MyAzOCA0M0gyMkMxOS43OTA5IDQzIDE4IDQxLjIwOTEgMTggMzlDMTggMzQuNTgyNSAyNS4zNzIgMzIgMzAgMzJDMzQuNjI4IDMyIDQyIDM0LjU4MjUgNDIgMzlaIiBmaWxsPSIjNmM3NTdkIi8+PC9zdmc+'">
+        <img class="profile-image" src="/api/files/${cfid}/profile_icon?size=64" alt="${name}" onerror="this.src='data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNjAiIGhlaWdodD0iNjAiIHZpZXdCb3g9IjAgMCA2MCA2MCIgZmlsbD0ibm9uZSIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48Y2lyY2xlIGN4PSIzMCIgY3k9IjMwIiByPSIzMCIgZmlsbD0iI2U5ZWNlZiIvPjxwYXRoIGQ9Ik0zMCAzM0MzMy4zMTM3IDMzIDM2IDMwLjMxMzcgMzYgMjdDMzYgMjMuNjg2MyAzMy4zMTM3IDIxIDMwIDIxQzI2LjY4NjMgMjEgMjQgMjMuNjg2MyAyNCAyN0MyNCAzMC4zMTM3IDI2LjY4NjMgMzMgMzAgMzNaIiBmaWxsPSIjNmM3NTdkIi8+PHBhdGggZD0iTTQyIDM5QzQyIDQxLjIwOTEgNDAuMjA5MSA0MyAzOCA0M0gyMkMxOS43OTA5IDQzIDE4IDQxLjIwOTEgMTggMzlDMTggMzQuNTgyNSAyNS4zNzIgMzIgMzAgMzJDMzQuNjI4IDMyIDQyIDM0LjU4MjUgNDIgMzlaIiBmaWxsPSIjNmM3NTdkIi8+PC9zdmc+'">
         <div class="person-info">
           <div class="person-name">${name}${staffEmoji}</div>
-          <div class="person-occupation occupation-loading">Loading occupation...</div>
+          <div class="person-occupation"></div>
         </div>
       </div>
     </a>
@@ -155,18 +157,11 @@ async function createPersonCard(name, cfid) {
       </svg>
     </button>
   `;
+  // Occupations are free text, so they must not be parsed as HTML
+  container.querySelector('.person-occupation').textContent = occupation;
   return container;
 }
 
-async function loadOccupation(card, cfid) {
-  try {
-    const res = await fetch(`/api/files/${cfid}/occupation`);
-    const text = res.ok ? await res.text() : 'Occupation unavailable';
-    const el = card.querySelector('.person-occupation');
-    if (el) { el.textContent = text || '—'; el.classList.remove('occupation-loading'); }
-  } catch { }
-}
-
 function showDeleteConfirmation(card) {
   deletePersonData = { card, cfid: card.dataset.cfid, name: card.dataset.name };
   deletePersonNameSpan.textContent = card.dataset.name;
@@ -220,9 +215,11 @@ async function addName() {
   const displayName = constructName();
   
   try {
-    const dupe = await fetch(`/files/dupecheck/${encodeURIComponent(displayName)}`).then(r => r.ok ? r.json() : { exists: false });
-    if (dupe.exists) {
-      if (!confirm(`Name exists (cfids: ${dupe.cfids}). Add anyway?`)) { 
+    const dupe = await fetch(`/files/dupecheck/${encodeURIComponent(displayName)}`).then(r => (r.ok || r.status === 404) ? r.json() : { exists: false });
+    const candidates = dupe.candidates || [];
+    if (dupe.exists || candidates.length > 0) {
+      const matches = candidates.map(c => `${c.name} (cfid ${c.cfid})`).join(', ') || `cfids: ${dupe.cfids}`;
+      if (!confirm(`${dupe.exists ? 'Name exists' : 'Possible duplicates'}: ${matches}. Add anyway?`)) { 
         closeAddModal();
         return; 
       }
@@ -237,9 +234,9 @@ async function addName() {
     if (data.success && data.cfid) {
       if (list.querySelector('.empty-state')) list.innerHTML = '';
       // Use displayName for the card, which will show the full constructed name
-      const card = await createPersonCard(displayName, data.cfid);
+      const details = await fetchPeopleDetails([data.cfid]);
+      const card = await createPersonCard(displayName, data.cfid, details[data.cfid]);
       list.appendChild(card);
-      loadOccupation(card, data.cfid);
       closeAddModal();
     } else alert('Server error: ' + (data.error || 'Unknown error'));
   } catch (err) {
@@ -247,19 +244,61 @@ async function addName() {
   }
 }
 
-async function Get_Names() {
+// Names are loaded a page at a time as the list is scrolled
+const namesPageSize = 100;
+let namesCursor = null;
+let namesLoading = false;
+let namesExhausted = false;
+// Bumped whenever the list is reset or searched, so responses for an older list are dropped
+let namesGeneration = 0;
+const namesSentinel = document.createElement('div');
+const namesObserver = new IntersectionObserver((entries) => {
+  if (entries.some(entry => entry.isIntersecting)) loadNextNames();
+});
+
+async function appendPeople(people, generation) {
+  const details = await fetchPeopleDetails(people.map(([cfid]) => cfid));
+  if (generation !== namesGeneration) return false;
+  const fragment = document.createDocumentFragment();
+  for (const [cfid, name] of people) {
+    fragment.appendChild(await createPersonCard(name, cfid, details[cfid]));
+  }
+  list.appendChild(fragment);
+  return true;
+}
+
+async function loadNextNames() {
+  if (namesLoading || namesExhausted) return;
+  const generation = namesGeneration;
+  namesLoading = true;
   try {
-    const data = await fetchJSON('/api/files/get_names');
-    if (!Array.isArray(data.names) || data.names.length === 0) { showEmptyState(); return; }
-    list.innerHTML = '';
-    const fragment = document.createDocumentFragment();
-    for (let i = 0; i < data.names.length; i++) {
-      const card = await createPersonCard(data.names[i], data.cfids[i]);
-      fragment.appendChild(card);
-      loadOccupation(card, data.cfids[i]);
-    }
-    list.appendChild(fragment);
-  } catch { showEmptyState(); }
+    const params = new URLSearchParams({ limit: namesPageSize });
+    if (namesCursor) params.set('after', namesCursor);
+    const data = await fetchJSON(`/api/files/names?${params}`);
+    if (generation !== namesGeneration) return;
+    if (!namesCursor && data.items.length === 0) { showEmptyState(); namesExhausted = true; return; }
+    if (!namesCursor) list.innerHTML = '';
+    if (!await appendPeople(data.items, generation)) return;
+    namesCursor = data.next;
+    namesExhausted = !data.next;
+    // Keep the sentinel last so scrolling to it asks for the next page
+    if (!namesExhausted) list.appendChild(namesSentinel);
+    else namesSentinel.remove();
+  } catch {
+    if (generation === namesGeneration && !namesCursor) showEmptyState();
+  } finally {
+    if (generation === namesGeneration) namesLoading = false;
+  }
+}
+
+async function Get_Names() {
+  // Any page load still in flight belongs to the old list and is dropped when it returns
+  namesGeneration++;
+  namesLoading = false;
+  namesCursor = null;
+  namesExhausted = false;
+  namesObserver.observe(namesSentinel);
+  await loadNextNames();
 }
 
 // event delegation delete
@@ -271,17 +310,32 @@ list.addEventListener('click', (e) => {
   }
 });
 
+// Searching asks the server, so people who haven't been paged in yet are found too
+let filterTimer = null;
 window.filterNames = function() {
-  const filter = document.getElementById('search-input').value.toLowerCase();
-  const items = list.querySelectorAll('.person-card-container');
-  let visibleCount = 0;
-  items.forEach(item => {
-    const name = item.dataset.name?.toLowerCase() || '';
-    if (name.includes(filter)) { item.style.display = ''; visibleCount++; }
-    else { item.style.display = 'none'; }
-  });
-  const counter = document.getElementById('people-counter');
-  if (counter) counter.innerText = visibleCount + ' visible';
+  clearTimeout(filterTimer);
+  filterTimer = setTimeout(async () => {
+    const filter = document.getElementById('search-input').value.trim();
+    const counter = document.getElementById('people-counter');
+    if (!filter) {
+      if (counter) counter.innerText = 'all';
+      Get_Names();
+      return;
+    }
+    const generation = ++namesGeneration;
+    namesObserver.unobserve(namesSentinel);
+    namesSentinel.remove();
+    try {
+      const data = await fetchJSON(`/api/files/search?${new URLSearchParams({ q: filter, limit: namesPageSize })}`);
+      if (generation !== namesGeneration) return;
+      list.innerHTML = '';
+      if (data.results.length === 0) showEmptyState();
+      else if (!await appendPeople(data.results.map(result => [result.cfid, result.name]), generation)) return;
+      if (counter) counter.innerText = data.total + ' found';
+    } catch {
+      if (generation === namesGeneration) showEmptyState();
+    }
+  }, 250);
 };
 
 document.addEventListener('DOMContentLoaded', () => {
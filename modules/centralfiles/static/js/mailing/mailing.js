@@ -47,43 +47,17 @@ async function fetchJSON(url, options) {
     return res.json();
 }
 
-// Get is_staff indicator (from people.js)
-async function getNameIsStaff(cfid) {
+// Staff status, occupation and email for many people in one request
+async function fetchPeopleDetails(cfids) {
     try {
-        const res = await fetch(`/api/files/${cfid}/is_staff`);
-        if (res.ok) {
-            const d = await res.json();
-            return d.is_staff ? " 🛡️" : "";
-        }
-        return "";
-    } catch {
-        return "";
-    }
-}
-
-// Load occupation for a person (from people.js)
-async function loadOccupation(cfid, personObj) {
-    try {
-        const res = await fetch(`/api/files/${cfid}/occupation`);
-        const text = res.ok ? await res.text() : 'Occupation unavailable';
-        personObj.occupation = text || '—';
-    } catch {
-        personObj.occupation = 'Occupation unavailable';
-    }
-}
-
-// Get email for a person (you may need to adjust this endpoint)
-async function getPersonEmail(cfid) {
-    try {
-        // Try to get email - you might have a different endpoint
-        const res = await fetch(`/api/files/${cfid}/email`);
-        if (res.ok) {
-            return await res.text();
-        }
-        // Fallback: generate email from name
-        return null;
+        const data = await fetchJSON('/api/files/fields', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ cfids: cfids.map(Number), fields: ['is_staff', 'occupation', 'email'] })
+        });
+        return data.profiles || {};
     } catch {
-        return null;
+        return {};
     }
 }
 
@@ -99,35 +73,30 @@ async function Get_Names() {
         // Clear existing people
         people = [];
         
+        const details = await fetchPeopleDetails(data.cfids);
+        
         // Build people array with cfids
         for (let i = 0; i < data.names.length; i++) {
             const name = data.names[i];
             const cfid = data.cfids[i];
+            const personDetails = details[cfid];
             
             // Get staff indicator
-            const staffEmoji = await getNameIsStaff(cfid);
+            const staffEmoji = personDetails && personDetails.is_staff ? " 🛡️" : "";
             
-            // Try to get email
-            let email = await getPersonEmail(cfid);
+            let email = personDetails ? personDetails.email : null;
             if (!email) {
                 // Generate a placeholder email if none exists
                 email = generateEmail(name);
             }
             
             // Create person object
-            const person = {
+            people.push({
                 name: name + staffEmoji,
                 rawName: name,
                 cfid: cfid,
                 email: email,
-                occupation: 'Loading...'
-            };
-            
-            people.push(person);
-            
-            // Load occupation asynchronously
-            loadOccupation(cfid, person).then(() => {
-                renderPeopleList();
+                occupation: personDetails ? (personDetails.occupation || '—') : 'Occupation unavailable'
             });
         }
         
@@ -209,7 +178,7 @@ function renderPeopleList() {
                         ${isSelected ? 'checked' : ''} 
                         onchange="togglePersonSelection('${person.email}', ${index})">
                 <div class="person-card-content" onclick="togglePersonSelection('${person.email}', ${index})">
-                    <img class="profile-image small" src="/api/files/${person.cfid}/profile_icon" 
+                    <img class="profile-image small" src="/api/files/${person.cfid}/profile_icon?size=64" 
                          alt="${escapeHtml(person.rawName)}" 
                          onerror="this.src='data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNjAiIGhlaWdodD0iNjAiIHZpZXdCb3g9IjAgMCA2MCA2MCIgZmlsbD0ibm9uZSIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48Y2lyY2xlIGN4PSIzMCIgY3k9IjMwIiByPSIzMCIgZmlsbD0iI2U5ZWNlZiIvPjxwYXRoIGQ9Ik0zMCAzM0MzMy4zMTM3IDMzIDM2IDMwLjMxMzcgMzYgMjdDMzYgMjMuNjg2MyAzMy4zMTM3IDIxIDMwIDIxQzI2LjY4NjMgMjEgMjQgMjMuNjg2MyAyNCAyN0MyNCAzMC4zMTM3IDI2LjY4NjMgMzMgMzAgMzNaIiBmaWxsPSIjNmM3NTdkIi8+PHBhdGggZD0iTTQyIDM5QzQyIDQxLjIwOTEgNDAuMjA5MSA0MyAzOCA0M0gyMkMxOS43OTA5IDQzIDE4IDQxLjIwOTEgMTggMzlDMTggMzQuNTgyNSAyNS4zNzIgMzIgMzAgMzJDMzQuNjI4IDMyIDQyIDM0LjU4MjUgNDIgMzlaIiBmaWxsPSIjNmM3NTdkIi8+PC9zdmc+'">
                     <div class="person-info">
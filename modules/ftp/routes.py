@@ -1,5 +1,5 @@
 from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
-from library.auth import route_prechecks, authbook
+from library.auth import route_prechecks
 from fastapi.templating import Jinja2Templates
 from library.authperms import set_permission
 from library.logbook import LogBookHandler
@@ -66,7 +66,7 @@ async def ftp(request: Request):
 @set_permission("ftp_server")
 async def walk_ftp(request: Request, data: walk_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) accessed ftp dir {data.path}.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) accessed ftp dir {data.path}.")
 
     try:
         path, jail_real = resolve_path(data.path)
@@ -100,7 +100,7 @@ class UploadData(BaseModel):
 @set_permission("ftp_server")
 async def upload_ftp(request: Request, data: UploadData):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is uploading files to {data.path}.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is uploading files to {data.path}.")
 
     file_path, jail_real = resolve_path(data.path)
     if not os.path.exists(file_path):
@@ -125,7 +125,7 @@ async def upload_ftp(request: Request, data: UploadData):
 @set_permission("ftp_server")
 async def download_ftp(request: Request, path: str):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) downloaded file {path}.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) downloaded file {path}.")
 
     try:
         file_path, jail_real = resolve_path(path)
@@ -144,7 +144,7 @@ class delete_data(BaseModel):
 @set_permission("ftp_server")
 async def delete_ftp(request: Request, data: delete_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is deleting file/folder {data.path}.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is deleting file/folder {data.path}.")
     file_path, jail_real = resolve_path(data.path)
 
     if os.path.commonpath([jail_real, file_path]) != jail_real:
@@ -178,7 +178,7 @@ def validate_path(path):
 @set_permission("ftp_server")
 async def rename_ftp(request: Request, data: rename_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is renaming file/folder {data.path} to {data.new_name}.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is renaming file/folder {data.path} to {data.new_name}.")
     file_path, jail_real = resolve_path(data.path)
 
     if os.path.commonpath([jail_real, file_path]) != jail_real:
@@ -205,7 +205,7 @@ class mk_folder_data(BaseModel):
 @set_permission("ftp_server")
 async def create_folder(request: Request, data: mk_folder_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is creating folder {data.path}.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is creating folder {data.path}.")
     file_path, jail_real = resolve_path(data.path)
 
     if os.path.commonpath([jail_real, file_path]) != jail_real:
@@ -227,7 +227,7 @@ class mk_file_data(BaseModel):
 @set_permission("ftp_server")
 async def create_file(request: Request, data: mk_file_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is creating file {data.path}.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is creating file {data.path}.")
     file_path, jail_real = resolve_path(data.path)
 
     if os.path.commonpath([jail_real, file_path]) != jail_real:
@@ -249,7 +249,7 @@ class read_file_data(BaseModel):
 @set_permission("ftp_server")
 async def read_file(request: Request, data: read_file_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is reading file {data.path}.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is reading file {data.path}.")
     file_path, jail_real = resolve_path(data.path)
 
     if os.path.commonpath([jail_real, file_path]) != jail_real:
@@ -272,7 +272,7 @@ class save_file_data(BaseModel):
 @set_permission("ftp_server")
 async def save_file(request: Request, data: save_file_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is the saving file {data.path}.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is the saving file {data.path}.")
     file_path, jail_real = resolve_path(data.path)
 
     if os.path.commonpath([jail_real, file_path]) != jail_real:
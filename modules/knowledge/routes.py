@@ -1,10 +1,10 @@
 from library.authperms import valid_perms, set_permission, AuthPerms
 from fastapi.responses import HTMLResponse, JSONResponse
-from library.auth import route_prechecks, authbook
+from library.auth import route_prechecks, authbook, invalidate_auth_cache
 from fastapi.templating import Jinja2Templates
 from library.logbook import LogBookHandler
 from fastapi import APIRouter, Request
-from library.database import DB_PATH
+from library.database import database
 from pydantic import BaseModel
 from library import settings
 import sqlite3
@@ -20,7 +20,7 @@ logbook = LogBookHandler("Admin Panel")
 @set_permission(permission="admin_panel")
 async def show_admin_panel(request: Request):
     token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
+    owner = request.state.auth.username
     logbook.info(f"IP {request.client.host} (user: {owner}) has accessed the admin panel.")
 
     return templates.TemplateResponse(
@@ -33,18 +33,34 @@ async def show_admin_panel(request: Request):
 @set_permission(permission="admin_panel")
 async def list_users(request: Request):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is listing all users.")
-    users = authbook.list_users()
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is listing all users.")
+    users = await database.run(authbook.list_users)
     return JSONResponse({
         "valid_permissions": valid_perms,
         "users": users
     }, status_code=200)
 
+def set_arrested(username: str, arrested: bool):
+    with database.write() as conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE authbook SET arrested = ? WHERE username = ?",
+                (arrested, username,)
+            )
+            conn.commit()
+            invalidate_auth_cache(username=username)
+            return True
+        except sqlite3.OperationalError as err:
+            logbook.error(f"Database error while {'arresting' if arrested else 'releasing'} user: {err}", exception=err)
+            conn.rollback()
+            return False
+
 @router.get("/api/knowledge/arrest/{username}")
 @set_permission(permission="admin_panel")
 async def arrest_user(request: Request, username: str):
     token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
+    owner = request.state.auth.username
     logbook.info(f"IP {request.client.host} (user: {owner}) is arresting user {username}.")
 
     if owner == username:
@@ -56,7 +72,7 @@ async def arrest_user(request: Request, username: str):
             status_code=400
         )
 
-    if authbook.is_user_admin(username):
+    if await database.run(authbook.is_user_admin, username):
         return JSONResponse(
             content={
                 "success": False,
@@ -65,44 +81,51 @@ async def arrest_user(request: Request, username: str):
             status_code=400
         )
 
-    with sqlite3.connect(DB_PATH) as conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE authbook SET arrested = true WHERE username = ?",
-                (username,)
-            )
-            conn.commit()
-            return JSONResponse({"success": True, "message": "User arrested successfully."}, status_code=200)
-        except sqlite3.OperationalError as err:
-            logbook.error(f"Database error while arresting user: {err}", exception=err)
-            conn.rollback()
-            return JSONResponse({"success": False, "error": "Database error occurred."}, status_code=500)
+    if await database.run(set_arrested, username, True):
+        return JSONResponse({"success": True, "message": "User arrested successfully."}, status_code=200)
+    return JSONResponse({"success": False, "error": "Database error occurred."}, status_code=500)
 
 @router.get("/api/knowledge/release/{username}")
 @set_permission(permission="admin_panel")
 async def release_user(request: Request, username: str):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is releasing user {username}.")
-    with sqlite3.connect(DB_PATH) as conn:
-        try:
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is releasing user {username}.")
+    if await database.run(set_arrested, username, False):
+        return JSONResponse({"success": True, "message": "User released successfully."}, status_code=200)
+    return JSONResponse({"success": False, "error": "Database error occurred."}, status_code=500)
+
+def set_permission_value(username: str, permission: str, value: bool):
+    try:
+        with database.write() as conn:
             cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE authbook SET arrested = false WHERE username = ?",
-                (username,)
-            )
+            user_perms = AuthPerms.perms_for_user(username, fill_not_set=False)
+
+            if user_perms.get(permission) is None:
+                cursor.execute(
+                    """
+                    INSERT INTO auth_permissions (username, permission, allowed) VALUES (?, ?, ?)
+                    """,
+                    (username, permission, value)
+                )
+            else:
+                cursor.execute(
+                    """
+                    UPDATE auth_permissions SET allowed = ? WHERE username = ? AND permission = ?
+                    """,
+                    (value, username, permission)
+                )
             conn.commit()
-            return JSONResponse({"success": True, "message": "User released successfully."}, status_code=200)
-        except sqlite3.OperationalError as err:
-            logbook.error(f"Database error while releasing user: {err}", exception=err)
-            conn.rollback()
-            return JSONResponse({"success": False, "error": "Database error occurred."}, status_code=500)
+        invalidate_auth_cache(username=username)
+        return True
+    except sqlite3.OperationalError as err:
+        logbook.error(f"Database error while updating permission: {err}", exception=err)
+        return False
 
 @router.get("/api/knowledge/perm/set/{username}/{permission}/{value}")
 @set_permission(permission="admin_panel")
 async def set_user_permission(request: Request, username: str, permission: str, value: bool):
     token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
+    owner = request.state.auth.username
     logbook.info(f"IP {request.client.host} (user: {owner}) is setting permission '{permission}' = {value} for user {username}.")
 
     if username == owner:
@@ -113,7 +136,7 @@ async def set_user_permission(request: Request, username: str, permission: str,
             },
             status_code=400
         )
-    if authbook.is_user_admin(username):
+    if await database.run(authbook.is_user_admin, username):
         return JSONResponse(
             content={
                 "success": False,
@@ -128,30 +151,9 @@ async def set_user_permission(request: Request, username: str, permission: str,
     if permission not in valid_perms:
         return JSONResponse({"success": False, "error": f"Invalid permission: {permission}"}, status_code=400)
 
-    try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            user_perms = AuthPerms.perms_for_user(username, fill_not_set=False)
-
-            if user_perms.get(permission) is None:
-                cursor.execute(
-                    """
-                    INSERT INTO auth_permissions (username, permission, allowed) VALUES (?, ?, ?)
-                    """,
-                    (username, permission, value)
-                )
-            else:
-                cursor.execute(
-                    """
-                    UPDATE auth_permissions SET allowed = ? WHERE username = ? AND permission = ?
-                    """,
-                    (value, username, permission)
-                )
-            conn.commit()
+    if await database.run(set_permission_value, username, permission, value):
         return JSONResponse({"success": True, "permission": permission, "value": value}, status_code=200)
-    except sqlite3.OperationalError as err:
-        logbook.error(f"Database error while updating permission: {err}", exception=err)
-        return JSONResponse({"success": False, "error": "Database error occurred."}, status_code=500)
+    return JSONResponse({"success": False, "error": "Database error occurred."}, status_code=500)
 
 # ===== Settings Management Endpoints =====
 class SettingsData(BaseModel):
@@ -161,12 +163,12 @@ class SettingsData(BaseModel):
 @set_permission(permission="admin_panel")
 async def load_settings(request: Request):
     token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
+    owner = request.state.auth.username
     logbook.info(f"IP {request.client.host} (user: {owner}) is loading settings.")
     try:
         data = settings.groupget.all()
         
-        if not AuthPerms.check_allowed(owner, "mail_login_view"):
+        if not request.state.auth.permissions.get("mail_login_view", False):
             data['sys_email_password'] = "HIDDEN"
             data['system_email'] = "HIDDEN"
 
@@ -179,7 +181,7 @@ async def load_settings(request: Request):
 @set_permission(permission="admin_panel")
 async def save_settings(request: Request, data: SettingsData):
     token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
+    owner = request.state.auth.username
     logbook.info(f"IP {request.client.host} (user: {owner}) is saving settings.")
     for setting, value in data.config.items():
         setting = str(setting).lower()
@@ -189,7 +191,7 @@ async def save_settings(request: Request, data: SettingsData):
                 status_code=400
             )
         try:
-            if not AuthPerms.check_allowed(owner, "mail_login_edit"):
+            if not request.state.auth.permissions.get("mail_login_edit", False):
                 if setting == "system_email":
                     value = settings.get.system_email()
                 if setting == "sys_email_password":
@@ -6,8 +6,7 @@ from library.logbook import LogBookHandler
 from library.auth import route_prechecks
 from decimal import Decimal, getcontext
 from fastapi import APIRouter, Request
-from library.database import DB_PATH
-from library.auth import authbook
+from library.database import database
 from pydantic import BaseModel
 from library import settings
 import datetime
@@ -26,7 +25,7 @@ getcontext().prec = 28  # precision for financial calculations
 @set_permission(permission=["ledger"])
 async def show_home(request: Request):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) has accessed the ledger.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) has accessed the ledger.")
     return templates.TemplateResponse(
         request,
         "ledger.html",
@@ -36,116 +35,99 @@ async def show_home(request: Request):
 @set_permission(permission=["accounts_view"])
 async def load_accounts(request: Request):
     token:str = route_prechecks(request)
-    owner = authbook.token_owner(token)
+    owner = request.state.auth.username
     logbook.info(f"IP {request.client.host} (user: {owner}) is loading finance accounts.")
-    with sqlite3.connect(DB_PATH) as conn:
-        try:
-            cursor = conn.cursor()
-
-            cursor.execute(
-                "SELECT account_id, account_name, double_entries, balance FROM finance_accounts",
-            )
-            data = cursor.fetchall()
+    try:
+        data = await database.fetchall(
+            "SELECT account_id, account_name, double_entries, balance FROM finance_accounts",
+        )
 
-            parsed_data = []
-            for item in data:
-                parsed_data.append({
-                    "account_id": item[0],
-                    "account_name": item[1],
-                    "is_double_entry": bool(item[2]),
-                    "balance": item[3]
-                })
-            return parsed_data
-        except sqlite3.OperationalError as err:
-            logbook.error("Error in loading accounts!", err)
-            conn.rollback()
-            return None
+        parsed_data = []
+        for item in data:
+            parsed_data.append({
+                "account_id": item[0],
+                "account_name": item[1],
+                "is_double_entry": bool(item[2]),
+                "balance": item[3]
+            })
+        return parsed_data
+    except sqlite3.OperationalError as err:
+        logbook.error("Error in loading accounts!", err)
+        return None
 
 @router.get("/api/finances/account/total_expenses/{account_id}")
 @set_permission(permission=["accounts_view"])
 async def get_total_expenses(request: Request, account_id:int):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) has accessed total expenses for account ID {account_id}.")
-    with sqlite3.connect(DB_PATH) as conn:
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) has accessed total expenses for account ID {account_id}.")
+    try:
+        data = await database.fetchone(
+            "SELECT SUM(amount) FROM finance_transactions WHERE is_expense = true AND account_id = ?",
+            (account_id,)
+        )
         try:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT SUM(amount) FROM finance_transactions WHERE is_expense = true AND account_id = ?",
-                (account_id,)
-            )
-            data = cursor.fetchone()
-            try:
-                amount = data[0]
-            except TypeError:
-                amount = None
-            if amount is None:
-                return 0
-            return HTMLResponse(f"{data[0]}", status_code=200)
-        except sqlite3.OperationalError:
-            conn.rollback()
-            return None
+            amount = data[0]
+        except TypeError:
+            amount = None
+        if amount is None:
+            return 0
+        return HTMLResponse(f"{data[0]}", status_code=200)
+    except sqlite3.OperationalError:
+        return None
 
 @router.get("/api/finances/account/total_income/{account_id}")
 @set_permission(permission=["accounts_view"])
 async def get_total_income(request: Request, account_id:int):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is fetching the gross income for account ID {account_id}")
-    with sqlite3.connect(DB_PATH) as conn:
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is fetching the gross income for account ID {account_id}")
+    try:
+        data = await database.fetchone(
+            "SELECT SUM(amount) FROM finance_transactions WHERE is_expense = false AND account_id = ?",
+            (account_id,)
+        )
         try:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT SUM(amount) FROM finance_transactions WHERE is_expense = false AND account_id = ?",
-                (account_id,)
-            )
-            data = cursor.fetchone()
-            try:
-                amount = data[0]
-            except TypeError:
-                amount = None
-            if amount is None:
-                return 0
-
             amount = data[0]
-            # Round-down the decimal points to 2
-            amount = round(amount, 2)
-            return HTMLResponse(f"{amount}", status_code=200)
-        except sqlite3.OperationalError:
-            conn.rollback()
-            return None
+        except TypeError:
+            amount = None
+        if amount is None:
+            return 0
+
+        amount = data[0]
+        # Round-down the decimal points to 2
+        amount = round(amount, 2)
+        return HTMLResponse(f"{amount}", status_code=200)
+    except sqlite3.OperationalError:
+        return None
 
 @router.get("/api/finances/load_transactions/{account_id}")
 @set_permission(permission=["accounts_view"])
 async def load_transactions(request: Request, account_id: int):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is loading all transactions for account {account_id}")
-    with sqlite3.connect(DB_PATH) as conn:
-        try:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT transaction_id, account_id, amount, is_expense, description, date, time
-                FROM finance_transactions
-                WHERE account_id = ?
-                ORDER BY date DESC, time DESC
-                """,
-                (account_id,)
-            )
-            data = cursor.fetchall()
-            parsed_data = []
-            for item in data:
-                parsed_data.append({
-                    "transaction_id": item[0],
-                    "account_id": item[1],
-                    "amount": item[2],
-                    "is_expense": item[3],
-                    "description": item[4],
-                    "date": item[5],
-                    "time": item[6]
-                })
-            return JSONResponse(parsed_data, status_code=200)
-        except sqlite3.OperationalError:
-            conn.rollback()
-            return JSONResponse(content={"error": "Database error occurred while fetching transactions."}, status_code=500)
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is loading all transactions for account {account_id}")
+    try:
+        data = await database.fetchall(
+            """
+            SELECT transaction_id, account_id, amount, is_expense, description, date, time
+            FROM finance_transactions
+            WHERE account_id = ?
+            ORDER BY date DESC, time DESC
+            """,
+            (account_id,)
+        )
+        parsed_data = []
+        for item in data:
+            parsed_data.append({
+                "transaction_id": item[0],
+                "account_id": item[1],
+                "amount": item[2],
+                "is_expense": item[3],
+                "description": item[4],
+                "date": item[5],
+                "time": item[6]
+            })
+        return JSONResponse(parsed_data, status_code=200)
+    except sqlite3.OperationalError:
+        return JSONResponse(content={"error": "Database error occurred while fetching transactions."}, status_code=500)
 
 class finances_data(BaseModel):
     account_id: int
@@ -158,9 +140,9 @@ class finances_data(BaseModel):
 @set_permission(permission=["accounts_add_transaction"])
 async def modify_finances(request: Request, data: finances_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) has modified finances.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) has modified finances.")
 
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.write() as conn:
         try:
             cur = conn.cursor()
 
@@ -213,24 +195,21 @@ async def modify_finances(request: Request, data: finances_data):
 @set_permission(permission=["accounts_view"])
 async def get_receipt(request: Request, transaction_id: int):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is getting the receipt for transaction ID {transaction_id}")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is getting the receipt for transaction ID {transaction_id}")
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT receipt FROM transaction_receipts WHERE transaction_id = ?",
-                (transaction_id,)
-            )
-            data = cursor.fetchone()
+        data = await database.fetchone(
+            "SELECT receipt FROM transaction_receipts WHERE transaction_id = ?",
+            (transaction_id,)
+        )
 
-            if data is None or data[0] is None:
-                return JSONResponse(
-                    content={"error": "Receipt not found."},
-                    status_code=404
-                )
+        if data is None or data[0] is None:
+            return JSONResponse(
+                content={"error": "Receipt not found."},
+                status_code=404
+            )
 
-            receipt_bytes = data[0]
-            return StreamingResponse(io.BytesIO(receipt_bytes), media_type="image/png")
+        receipt_bytes = data[0]
+        return StreamingResponse(io.BytesIO(receipt_bytes), media_type="image/png")
     except sqlite3.OperationalError:
         return JSONResponse(
             content={"error": "Database error occurred while fetching receipt."},
@@ -241,24 +220,21 @@ async def get_receipt(request: Request, transaction_id: int):
 @set_permission(permission=["accounts_view"])
 async def get_receipt_mime(request: Request, transaction_id: int):
     token:str = route_prechecks(request)
-    logbook.info(f"{request.client.host} ({authbook.token_owner(token)}) Is getting the receipt Mime for transaction {transaction_id}")
+    logbook.info(f"{request.client.host} ({request.state.auth.username}) Is getting the receipt Mime for transaction {transaction_id}")
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT receipt_mimetype FROM transaction_receipts WHERE transaction_id = ?",
-                (transaction_id,)
-            )
-            data = cursor.fetchone()
-            if data is None or data[0] is None:
-                return HTMLResponse(
-                    content="",  # It can handle this
-                    status_code=404
-                )
+        data = await database.fetchone(
+            "SELECT receipt_mimetype FROM transaction_receipts WHERE transaction_id = ?",
+            (transaction_id,)
+        )
+        if data is None or data[0] is None:
             return HTMLResponse(
-                data[0],
-                status_code=200
+                content="",  # It can handle this
+                status_code=404
             )
+        return HTMLResponse(
+            data[0],
+            status_code=200
+        )
     except sqlite3.OperationalError:
         return HTMLResponse(
             "",  # It can handle this
@@ -272,8 +248,8 @@ class transaction_delete(BaseModel):
 @set_permission(permission=["accounts_del_transaction"])
 async def del_transaction(request: Request, data: transaction_delete):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) has deleted a finance transaction.")
-    with sqlite3.connect(DB_PATH) as conn:
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) has deleted a finance transaction.")
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
 
@@ -313,9 +289,9 @@ class make_account_data(BaseModel):
 @set_permission(permission=["accounts_add"])
 async def make_account(request: Request, data: make_account_data):
     token:str = route_prechecks(request)
-    username = authbook.token_owner(token)
+    username = request.state.auth.username
     logbook.info(f"IP {request.client.host} (user: {username}) has made a new finance account under the name {data.account_name}.")
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
@@ -336,8 +312,8 @@ class del_account_data(BaseModel):
 @set_permission(permission=["accounts_delete"])
 async def del_account(request: Request, data: del_account_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) has deleted the finance account with the ID {data.account_id}.")
-    with sqlite3.connect(DB_PATH) as conn:
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) has deleted the finance account with the ID {data.account_id}.")
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
@@ -354,7 +330,7 @@ async def del_account(request: Request, data: del_account_data):
 @set_permission(permission=["ledger", "FP_view"])
 async def planning(request: Request):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) has accessed the financial planning page.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) has accessed the financial planning page.")
     return templates.TemplateResponse(
         request,
         "planning.html",
@@ -370,8 +346,8 @@ class expense_data(BaseModel):
 @set_permission(permission=["ledger", "FP_edit"])
 async def add_fp_expense(request: Request, data: expense_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) has added an expense to the FP No. 1.")
-    with sqlite3.connect(DB_PATH) as conn:
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) has added an expense to the FP No. 1.")
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
@@ -391,8 +367,8 @@ class del_expense_data(BaseModel):
 @set_permission(permission=["ledger", "FP_edit"])
 async def delete_fp_expense(request: Request, data: del_expense_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) has deleted an expense from the FP No. 1.")
-    with sqlite3.connect(DB_PATH) as conn:
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) has deleted an expense from the FP No. 1.")
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
@@ -409,8 +385,8 @@ async def delete_fp_expense(request: Request, data: del_expense_data):
 @set_permission(permission=["ledger", "FP_view"])
 async def get_fp_expenses(request: Request):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) has accessed the FP No. 1.")
-    with sqlite3.connect(DB_PATH) as conn:
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) has accessed the FP No. 1.")
+    with database.read() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
@@ -434,7 +410,7 @@ async def get_fp_expenses(request: Request):
 @set_permission(permission=["ledger", "debt_viewing"])
 async def debts_page(request: Request):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) has accessed the debts record page.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) has accessed the debts record page.")
     return templates.TemplateResponse(
         request,
         "debts.html",
@@ -453,7 +429,7 @@ class debts:
 
     @staticmethod
     def check_exists(debt_id):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute(
@@ -472,7 +448,7 @@ class debts:
 
     @staticmethod
     def get_all_debts():
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute(
@@ -509,7 +485,7 @@ class debts:
 
     @staticmethod
     def get_debt_data(debt_id):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute(
@@ -548,7 +524,7 @@ class debts:
 
     @staticmethod
     def delete_debt(debt_id):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.write() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute(
@@ -569,31 +545,30 @@ class debts:
         
         amount_cents = debts._to_cents(amount)  # Convert to cents
 
-        conn = sqlite3.connect(DB_PATH)
-
-        try:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                INSERT INTO debts (debtor, debtee, amount, start_date, end_date, cfid)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (debtor, debtee, amount_cents, start_date, end_date, cfid)
-            )
-            debt_id = cursor.lastrowid
-            cursor.execute(
-                """
-                INSERT INTO debt_records (debt_id, amount, description, start_date, paid_off)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (debt_id, amount_cents, description, start_date, False)
-            )
-            conn.commit()
-            return debt_id
-        except sqlite3.OperationalError as err:
-            logbook.error(f"Database error occurred while creating a new debt: {err}", exception=err)
-            conn.rollback()
-            return False
+        with database.write() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    INSERT INTO debts (debtor, debtee, amount, start_date, end_date, cfid)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (debtor, debtee, amount_cents, start_date, end_date, cfid)
+                )
+                debt_id = cursor.lastrowid
+                cursor.execute(
+                    """
+                    INSERT INTO debt_records (debt_id, amount, description, start_date, paid_off)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (debt_id, amount_cents, description, start_date, False)
+                )
+                conn.commit()
+                return debt_id
+            except sqlite3.OperationalError as err:
+                logbook.error(f"Database error occurred while creating a new debt: {err}", exception=err)
+                conn.rollback()
+                return False
 
     @staticmethod
     def record_new_debt_instance(debt_id, amount: float, description, start_date=None):
@@ -602,7 +577,7 @@ class debts:
         
         amount_cents = debts._to_cents(amount)  # Convert to cents
         
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.write() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute(
@@ -627,7 +602,7 @@ class debts:
 
     @staticmethod
     def get_record_amount(record_id):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute(
@@ -662,98 +637,97 @@ class debts:
         debt_amount = Decimal(debt_amount_cents)
         paid_amount_decimal = Decimal(paid_cents)
 
-        conn = sqlite3.connect(DB_PATH)
-        try:
-            cur = conn.cursor()
-
-            # Update the main debt table (using float for SQLite compatibility)
-            cur.execute(
-                "UPDATE debts SET amount = amount - ? WHERE debt_id = ?",
-                (int(paid_cents), int(debt_id))
-            )
-
-            remaining = debt_amount - paid_amount_decimal
+        with database.write() as conn:
+            try:
+                cur = conn.cursor()
 
-            if remaining > 0:  # partial payment
+                # Update the main debt table (using float for SQLite compatibility)
                 cur.execute(
-                    "UPDATE debt_records SET amount = amount - ? WHERE record_id = ?",
-                    (int(paid_cents), int(record_id))
+                    "UPDATE debts SET amount = amount - ? WHERE debt_id = ?",
+                    (int(paid_cents), int(debt_id))
                 )
-                conn.commit()
-                return "SUB"
 
-            elif remaining < 0:  # overpayment
-                # pay off current record
-                cur.execute(
-                    "UPDATE debt_records SET amount = 0, paid_off = 1 WHERE record_id = ?",
-                    (int(record_id),)
-                )
-                conn.commit()
+                remaining = debt_amount - paid_amount_decimal
 
-                overpaid_amount_cents = -remaining  # positive Decimal
-
-                all_debts = debts.get_debt_records(debt_id)
-
-                for item in all_debts:
-                    if overpaid_amount_cents <= 0:
-                        debts.delete_debt(debt_id)
-                        break
-                    record_amount_cents = Decimal(all_debts[item]["amount"] * 100)  # Convert dollars back to cents
-                    if record_amount_cents <= overpaid_amount_cents:
-                        cur.execute(
-                            "UPDATE debt_records SET amount = 0, paid_off = 1 WHERE record_id = ?",
-                            (int(item),)
-                        )
-                        overpaid_amount_cents -= record_amount_cents
-                    else:
-                        cur.execute(
-                            "UPDATE debt_records SET amount = amount - ? WHERE record_id = ?",
-                            (int(overpaid_amount_cents), int(item))
-                        )
-                        overpaid_amount_cents = Decimal(0)
-
-                if overpaid_amount_cents > 0:
-                    logbook.info(f"Overpaid amount of {overpaid_amount_cents} cents could not be allocated.")
-                    if settings.get.debts_overpay_payback_tracking():
-                        debt_data = debts.get_debt_data(debt_id)
-                        debtee = debt_data["debtee"]
-                        debtor = debt_data["debtor"]  # reverse roles
-                        conn.commit()
-                        conn.close()
-                        # Convert cents back to dollars for new debt creation
-                        overpaid_dollars = float(overpaid_amount_cents / 100)
-                        debts.create_new_debt(
-                            debtor=debtee,
-                            debtee=debtor,
-                            amount=overpaid_dollars,
-                            description=f"A debt with record ID {record_id} overpaid by {overpaid_dollars}."
-                        )
-                        debts.delete_debt(debt_id)
-                        return "MULTI-PO"
-
-                conn.commit()
-                return "MULTI-PO"
+                if remaining > 0:  # partial payment
+                    cur.execute(
+                        "UPDATE debt_records SET amount = amount - ? WHERE record_id = ?",
+                        (int(paid_cents), int(record_id))
+                    )
+                    conn.commit()
+                    return "SUB"
+
+                elif remaining < 0:  # overpayment
+                    # pay off current record
+                    cur.execute(
+                        "UPDATE debt_records SET amount = 0, paid_off = 1 WHERE record_id = ?",
+                        (int(record_id),)
+                    )
+                    conn.commit()
+
+                    overpaid_amount_cents = -remaining  # positive Decimal
+
+                    all_debts = debts.get_debt_records(debt_id)
+
+                    for item in all_debts:
+                        if overpaid_amount_cents <= 0:
+                            debts.delete_debt(debt_id)
+                            break
+                        record_amount_cents = Decimal(all_debts[item]["amount"] * 100)  # Convert dollars back to cents
+                        if record_amount_cents <= overpaid_amount_cents:
+                            cur.execute(
+                                "UPDATE debt_records SET amount = 0, paid_off = 1 WHERE record_id = ?",
+                                (int(item),)
+                            )
+                            overpaid_amount_cents -= record_amount_cents
+                        else:
+                            cur.execute(
+                                "UPDATE debt_records SET amount = amount - ? WHERE record_id = ?",
+                                (int(overpaid_amount_cents), int(item))
+                            )
+                            overpaid_amount_cents = Decimal(0)
+
+                    if overpaid_amount_cents > 0:
+                        logbook.info(f"Overpaid amount of {overpaid_amount_cents} cents could not be allocated.")
+                        if settings.get.debts_overpay_payback_tracking():
+                            debt_data = debts.get_debt_data(debt_id)
+                            debtee = debt_data["debtee"]
+                            debtor = debt_data["debtor"]  # reverse roles
+                            conn.commit()
+                            # Convert cents back to dollars for new debt creation
+                            overpaid_dollars = float(overpaid_amount_cents / 100)
+                            debts.create_new_debt(
+                                debtor=debtee,
+                                debtee=debtor,
+                                amount=overpaid_dollars,
+                                description=f"A debt with record ID {record_id} overpaid by {overpaid_dollars}."
+                            )
+                            debts.delete_debt(debt_id)
+                            return "MULTI-PO"
+
+                    conn.commit()
+                    return "MULTI-PO"
+
+                else:  # exact payment
+                    cur.execute(
+                        "UPDATE debt_records SET amount = 0, paid_off = 1 WHERE record_id = ?",
+                        (int(record_id),)
+                    )
+                    conn.commit()
+                    debts.delete_debt(debt_id)
+                    return "PO"
 
-            else:  # exact payment
-                cur.execute(
-                    "UPDATE debt_records SET amount = 0, paid_off = 1 WHERE record_id = ?",
-                    (int(record_id),)
+            except sqlite3.OperationalError as err:
+                logbook.error(
+                    f"Database error subtracting {paid_amount} from debt {debt_id}, record {record_id}: {err}",
+                    exception=err
                 )
-                conn.commit()
-                debts.delete_debt(debt_id)
-                return "PO"
-
-        except sqlite3.OperationalError as err:
-            logbook.error(
-                f"Database error subtracting {paid_amount} from debt {debt_id}, record {record_id}: {err}",
-                exception=err
-            )
-            conn.rollback()
-            return False
+                conn.rollback()
+                return False
 
     @staticmethod
     def find_debt_id(debtor, debtee):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute(
@@ -772,7 +746,7 @@ class debts:
 
     @staticmethod
     def get_debt_records(debt_id):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute(
@@ -818,7 +792,7 @@ class debt_data(BaseModel):
 async def add_debt(request: Request, data: debt_data):
     token:str = route_prechecks(request)
     debt_id = debts.find_debt_id(data.debtor, data.debtee)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) has added a debt of {data.amount} from the debt with the ID {debt_id}.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) has added a debt of {data.amount} from the debt with the ID {debt_id}.")
 
     if data.cfid is not None:
         if data.cfid.isnumeric():
@@ -866,7 +840,7 @@ class subtract_debt_data(BaseModel):
 async def subtract_debt(request: Request, data: subtract_debt_data):
     token:str = route_prechecks(request)
     debt_id = debts.find_debt_id(data.debtor, data.debtee)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) has subtracted {data.amount} from the debt with ID {debt_id}.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) has subtracted {data.amount} from the debt with ID {debt_id}.")
     try:
         debt = debts.get_debt_data(debt_id)
         if debt is None:
@@ -901,7 +875,7 @@ async def subtract_debt(request: Request, data: subtract_debt_data):
 @set_permission(permission=["ledger", "debt_viewing"])
 async def get_debts(request: Request):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is listing all debts.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is listing all debts.")
     debt_list = debts.get_all_debts()
     return JSONResponse(debt_list, status_code=200)
 
@@ -913,7 +887,7 @@ class get_records_data(BaseModel):
 @set_permission(permission=["ledger", "debt_viewing"])
 async def get_all_records(request: Request, data: get_records_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is listing all debt records.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is listing all debt records.")
 
     debt_id = debts.find_debt_id(data.debtor, data.debtee)
     if not debt_id:
@@ -928,7 +902,7 @@ async def get_all_records(request: Request, data: get_records_data):
 @set_permission(permission=["ledger", "invoices_view"])
 async def invoices_page(request: Request):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) has accessed the invoices page.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) has accessed the invoices page.")
     return templates.TemplateResponse(
         request,
         "invoices.html",
@@ -942,8 +916,8 @@ class get_invoices_data(BaseModel):
 @set_permission(permission=["ledger", "invoices_view"])
 async def get_invoice_items(request: Request, data: get_invoices_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is listing all invoice items.")
-    with sqlite3.connect(DB_PATH) as conn:
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is listing all invoice items.")
+    with database.read() as conn:
         try:
             cursor = conn.cursor()
             if not data.searchTerm:
@@ -997,8 +971,8 @@ class del_item_data(BaseModel):
 @set_permission(permission=["ledger", "invoices_delete"])
 async def delete_item(request: Request, data: del_item_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is deleting an invoice item.")
-    with sqlite3.connect(DB_PATH) as conn:
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is deleting an invoice item.")
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
@@ -1018,7 +992,7 @@ class save_invoice_data(BaseModel):
     details: dict
 
 def get_cf_name(cfid):
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.read() as conn:
         cursor = conn.cursor()
         try:
             cursor.execute(
@@ -1038,7 +1012,7 @@ def get_cf_name(cfid):
 @set_permission(permission=["ledger", "invoices_create"])
 async def save_invoice(request: Request, data: save_invoice_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is saving the invoice (invoice  they just made.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is saving the invoice (invoice  they just made.")
     datenow = datetime.datetime.now().strftime("%d-%m-%Y")
 
     billing_name = data.details.get("billing_name", None)
@@ -1055,7 +1029,7 @@ async def save_invoice(request: Request, data: save_invoice_data):
     billing_phone = data.details.get("billing_phone", "")
     billing_notes = data.details.get("billing_notes", "")
 
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.write() as conn:
         try:
             cur = conn.cursor()
             cur.execute(
@@ -1095,8 +1069,8 @@ class del_invoice_data(BaseModel):
 @set_permission(permission=["ledger", "invoices_delete"])
 async def del_invoice(request: Request, data: del_invoice_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is deleting the invoice {data.invoice_id}.")
-    with sqlite3.connect(DB_PATH) as conn:
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is deleting the invoice {data.invoice_id}.")
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
@@ -1113,8 +1087,8 @@ async def del_invoice(request: Request, data: del_invoice_data):
 @set_permission(permission=["ledger", "invoices_view"])
 async def get_invoice(request: Request, invoice_id: int):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is fetching invoice {invoice_id}.")
-    with sqlite3.connect(DB_PATH) as conn:
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is fetching invoice {invoice_id}.")
+    with database.read() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
@@ -1167,8 +1141,8 @@ async def toggle_invoice_paid(request: Request, data: toggle_paid_data):
     token:str = route_prechecks(request)
     body = await request.json()
     new_status = bool(body.get("paid", False))
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is toggling invoice {data.invoice_id} paid={new_status}.")
-    with sqlite3.connect(DB_PATH) as conn:
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is toggling invoice {data.invoice_id} paid={new_status}.")
+    with database.write() as conn:
         try:
             cur = conn.cursor()
             cur.execute(
@@ -1190,8 +1164,8 @@ class add_item_data(BaseModel):
 @set_permission(permission=["ledger", "invoices_create"])
 async def add_possible_invoice_item(request: Request, data: add_item_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is adding invoice item {data.name} with value {data.price}.")
-    with sqlite3.connect(DB_PATH) as conn:
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is adding invoice item {data.name} with value {data.price}.")
+    with database.write() as conn:
         try:
             cur = conn.cursor()
             cur.execute(
@@ -1212,8 +1186,8 @@ async def add_possible_invoice_item(request: Request, data: add_item_data):
 @set_permission(permission=["ledger", "invoices_view"])
 async def get_invoice_items(request: Request):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is listing all invoice items.")
-    with sqlite3.connect(DB_PATH) as conn:
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is listing all invoice items.")
+    with database.read() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
@@ -1246,13 +1220,13 @@ class payment_data(BaseModel):
 @set_permission(permission=["ledger", "invoices_modify"])
 async def record_payment(request: Request, data: payment_data):
     token: str = route_prechecks(request)
-    user = authbook.token_owner(token)
+    user = request.state.auth.username
     logbook.info(f"IP {request.client.host} (user: {user}) is recording a payment of ${data.amount} for invoice {data.invoice_id}.")
     
     current_date = datetime.datetime.now().strftime("%Y-%m-%d")
     current_time = datetime.datetime.now().strftime("%H:%M:%S")
     
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
             
@@ -1313,9 +1287,9 @@ async def record_payment(request: Request, data: payment_data):
 @set_permission(permission=["ledger", "invoices_view"])
 async def get_invoice_payments(request: Request, invoice_id: int):
     token: str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is fetching payments for invoice {invoice_id}.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is fetching payments for invoice {invoice_id}.")
     
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.read() as conn:
         try:
             cursor = conn.cursor()
             cursor.execute(
@@ -1363,9 +1337,9 @@ class update_payment_status_data(BaseModel):
 @set_permission(permission=["ledger", "invoices_modify"])
 async def update_payment_status(request: Request, data: update_payment_status_data):
     token: str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is updating payment {data.payment_id} status to {data.payment_status}.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is updating payment {data.payment_id} status to {data.payment_status}.")
     
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
             
@@ -1431,9 +1405,9 @@ async def update_payment_status(request: Request, data: update_payment_status_da
 @set_permission(permission=["ledger", "invoices_modify"])
 async def delete_payment(request: Request, payment_id: int):
     token: str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is deleting payment {payment_id}.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) is deleting payment {payment_id}.")
     
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.write() as conn:
         try:
             cursor = conn.cursor()
             
@@ -1498,7 +1472,7 @@ async def delete_payment(request: Request, payment_id: int):
 class db_odometer:
     def get_last_odometer(user: str):
         """Returns the last odometer reading for the user, or None if none exist."""
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             cur = conn.cursor()
             cur.execute(
                 "SELECT odometer FROM odometer_entries WHERE user = ? ORDER BY entry_id DESC LIMIT 1",
@@ -1508,7 +1482,7 @@ class db_odometer:
         return row[0] if row else None
 
     def delete_entry(entry_id:int, user: str):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.write() as conn:
             cur = conn.cursor()
             cur.execute(
                 """
@@ -1526,7 +1500,7 @@ class db_odometer:
         if distance_travelled < 0:
             raise ValueError("Odometer cannot go backwards")
 
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.write() as conn:
             cur = conn.cursor()
             try:
                 cur.execute(
@@ -1544,7 +1518,7 @@ class db_odometer:
         return True
     
     def read_fuel_ml_usage(user:str):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             cur = conn.cursor()
             cur.execute(
                 """
@@ -1559,7 +1533,7 @@ class db_odometer:
             return 0
     
     def write_fuel_ml_usage(user:str, amount_ml:int):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.write() as conn:
             cur = conn.cursor()
             cur.execute(
                 """
@@ -1573,7 +1547,7 @@ class db_odometer:
         return True
 
     def read_odo_entries(user):
-        with sqlite3.connect(DB_PATH) as conn:
+        with database.read() as conn:
             cur = conn.cursor()
             cur.execute(
                 """
@@ -1599,7 +1573,7 @@ class db_odometer:
 @set_permission(permission=["ledger", "odometering"])
 async def show_odo_page(request: Request):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) has accessed the digitized odometer page.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) has accessed the digitized odometer page.")
     return templates.TemplateResponse(
         request,
         "odometering.html",
@@ -1609,7 +1583,7 @@ async def show_odo_page(request: Request):
 @set_permission(permission=["ledger", "odometering"])
 async def read_odo_entries(request: Request):
     token:str = route_prechecks(request)
-    user = authbook.token_owner(token)
+    user = request.state.auth.username
     logbook.info(f"IP {request.client.host} (user: {user}) Is reading all odometer entries.")
     entries = db_odometer.read_odo_entries(user)
     return JSONResponse(
@@ -1626,7 +1600,7 @@ class odo_entry_data(BaseModel):
 @set_permission(permission=["ledger", "odometering"])
 async def write_odo_entry(request: Request, data: odo_entry_data):
     token:str = route_prechecks(request)
-    user = authbook.token_owner(token)
+    user = request.state.auth.username
     logbook.info(f"IP {request.client.host} (user: {user}) Is adding a new odometer entry.")
     success = db_odometer.add_entry(
         date=data.date,
@@ -1644,7 +1618,7 @@ async def write_odo_entry(request: Request, data: odo_entry_data):
 @set_permission(permission=["ledger", "odometering"])
 async def delete_odo_entries(request: Request, entry_id):
     token:str = route_prechecks(request)
-    user = authbook.token_owner(token)
+    user = request.state.auth.username
     logbook.info(f"IP {request.client.host} (user: {user}) Is deleting an odometer entry.")
     success = db_odometer.delete_entry(entry_id, user)
     if success:
@@ -1656,7 +1630,7 @@ async def delete_odo_entries(request: Request, entry_id):
 @set_permission(permission=["ledger", "odometering"])
 async def get_fuel_rate(request: Request):
     token:str = route_prechecks(request)
-    user = authbook.token_owner(token)
+    user = request.state.auth.username
     logbook.info(f"IP {request.client.host} (user: {user}) Is getting their fuel rate.")
     return JSONResponse(
         content={
@@ -1672,7 +1646,7 @@ class put_fuel_rate(BaseModel):
 @set_permission(permission=["ledger", "odometering"])
 async def set_fuel_rate(request: Request, data: put_fuel_rate):
     token:str = route_prechecks(request)
-    user = authbook.token_owner(token)
+    user = request.state.auth.username
     logbook.info(f"IP {request.client.host} (user: {user}) Is setting their recorded fuel rate.")
     success = db_odometer.write_fuel_ml_usage(user=user, amount_ml=data.usage_ml)
     if success:
@@ -1684,7 +1658,7 @@ async def set_fuel_rate(request: Request, data: put_fuel_rate):
 @set_permission(permission=["ledger", "invoices_view"])
 async def view_invoice(request: Request, invoice_id:int):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) has accessed invoice {invoice_id}.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) has accessed invoice {invoice_id}.")
     return templates.TemplateResponse(
         request,
         "invoice.html",
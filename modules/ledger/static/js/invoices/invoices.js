@@ -682,29 +682,27 @@ class InvoiceManager {
       return;
     }
     
-    // First fetch the name
-    fetch(`/api/files/${cfid}/name`)
+    // Fetch the name and billing details in one request
+    fetch('/api/files/fields', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ cfids: [Number(cfid)], fields: ['name', 'address', 'email', 'phone'] })
+    })
       .then(response => {
         if (!response.ok) {
           throw new Error(`HTTP error! status: ${response.status}`);
         }
-        return response.text();
+        return response.json();
       })
       .then(data => {
-        const profileName = data;
+        const profile = data.profiles[String(Number(cfid))];
+        const profileName = profile ? profile.name : null;
         
         if (profileName && profileName.trim() !== '') {
           this.billingName.value = profileName;
           // Hide billing name field since we got it from CFID
           this.billingName.parentElement.style.display = 'none';
           this.billingName.required = false;
-          
-          // Now fetch address and email in parallel
-          return Promise.all([
-            fetch(`/api/files/${cfid}/address`),
-            fetch(`/api/files/${cfid}/email`),
-            fetch(`/api/files/${cfid}/phone`)
-          ]);
         } else {
           console.error('No name found in API response');
           this.billingName.value = "";
@@ -712,30 +710,17 @@ class InvoiceManager {
           this.billingName.required = true;
           throw new Error('No name found');
         }
-      })
-      .then(responses => {
-        // Handle all responses
-        return Promise.all([
-          responses[0].text(),
-          responses[1].text(),
-          responses[2].text()
-        ]);
-      })
-      .then(dataArray => {
-        const profileAddr = dataArray[0];
-        const profileEmail = dataArray[1];
-        const profilePhone = dataArray[2];
         
-        if (profileAddr && profileAddr.trim() !== '') {
-          this.billingAddress.value = profileAddr;
+        if (profile.address && profile.address.trim() !== '') {
+          this.billingAddress.value = profile.address;
         }
         
-        if (profileEmail && profileEmail.trim() !== '') {
-          this.billingEmail.value = profileEmail;
+        if (profile.email && profile.email.trim() !== '') {
+          this.billingEmail.value = profile.email;
         }
         
-        if (profilePhone && profilePhone.trim() !== '') {
-          this.billingPhone.value = profilePhone;
+        if (profile.phone && profile.phone.trim() !== '') {
+          this.billingPhone.value = profile.phone;
         }
       })
       .catch(error => {
@@ -1,7 +1,8 @@
 from fastapi.responses import HTMLResponse, JSONResponse
-from library.auth import authbook, autherrors, UserLogin
+from library.auth import authbook, autherrors, UserLogin, get_auth_context
 from fastapi.templating import Jinja2Templates
 from library.logbook import LogBookHandler
+from library.database import database
 from fastapi import APIRouter, Request
 from library.settings import get
 from pydantic import BaseModel
@@ -32,15 +33,15 @@ async def show_login(request: Request):
 
 @router.post("/api/token/check")
 async def verify_token(request: Request, data: TokenData):
-    verified = authbook.verify_token(data.token)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(data.token)}) has attempted to verify their token.")
+    verified = await database.run(authbook.verify_token, data.token)
+    logbook.info(f"IP {request.client.host} ({await database.run(authbook.token_owner, data.token)}) has attempted to verify their token.")
     return JSONResponse(content={'verified': verified}, status_code=200 if verified else 401)
 
 @router.post("/api/user/login")
 async def login_user(request: Request, data: LoginData):
     # Generates a key and returns it if it's okay.
     try:
-        user = UserLogin(details={
+        user = await database.run(UserLogin, details={
             "username": data.username,
             "password": data.password,
             "request_ip": request.client.host
@@ -59,4 +60,13 @@ async def login_user(request: Request, data: LoginData):
     return JSONResponse(
         content=data,
         status_code=200
-    )
\ No newline at end of file
+    )
+
+@router.post("/api/user/logout")
+async def logout_user(request: Request):
+    # Revokes the session server-side, so the token stops working even if a copy of it survives.
+    context = get_auth_context(request)
+    logbook.info(f"IP {request.client.host} ({context.username}) is ending their session.")
+    if context.token:
+        await database.run(authbook.revoke_token, context.token)
+    return JSONResponse(content={"success": True}, status_code=200)
@@ -1,5 +1,5 @@
 from fastapi.responses import HTMLResponse, JSONResponse
-from library.auth import authbook, route_prechecks
+from library.auth import route_prechecks
 from fastapi.templating import Jinja2Templates
 from fastapi import APIRouter, Request, Query
 from library.authperms import set_permission
@@ -13,7 +13,7 @@ templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), "t
 @set_permission("app_logs")
 async def show_login(request: Request):
     token:str = route_prechecks(request)
-    logging.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) has accessed the bot logs page.")
+    logging.info(f"IP {request.client.host} (user: {request.state.auth.username}) has accessed the bot logs page.")
     return templates.TemplateResponse(
         request,
         "loglist.html",
@@ -26,7 +26,7 @@ async def list_logs(
         search: str = Query(None, description="String to search for in logs"),
 ):
     token:str = route_prechecks(request)
-    logging.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is listing the bot logs.")
+    logging.info(f"IP {request.client.host} (user: {request.state.auth.username}) is listing the bot logs.")
 
     logs_dir = "logs"
     if not os.path.isdir(logs_dir):
@@ -80,7 +80,7 @@ async def list_logs(
 @set_permission("app_logs")
 async def get_log(request: Request, log_name: str):
     token:str = route_prechecks(request)
-    logging.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) is getting the bot log {log_name}.")
+    logging.info(f"IP {request.client.host} (user: {request.state.auth.username}) is getting the bot log {log_name}.")
 
     logs_dir = "logs"
     # Safe path prevents file traversing.
@@ -2,6 +2,7 @@ from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from library.auth import authbook, autherrors
 from library.logbook import LogBookHandler
+from library.database import database
 from fastapi import APIRouter, Request
 from pydantic import BaseModel
 from library import settings
@@ -24,7 +25,8 @@ async def register(request: Request, data: RegisterData):
     if not settings.get.allow_registration():
         return JSONResponse({"success": False, "error": "Registration has been disabled by administration."}, status_code=403)
     try:
-        success = authbook.create_account(
+        success = await database.run(
+            authbook.create_account,
             data.username,
             data.password,
         )
@@ -4,8 +4,7 @@ from library.authperms import set_permission
 from library.logbook import LogBookHandler
 from library.auth import route_prechecks
 from fastapi import APIRouter, Request
-from library.database import DB_PATH
-from library.auth import authbook
+from library.database import database
 from pydantic import BaseModel
 import importlib
 import datetime
@@ -20,14 +19,14 @@ logbook = LogBookHandler("Signal Server")
 @set_permission(permission="signal_server")
 async def show_page(request: Request):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} (user: {authbook.token_owner(token)}) has accessed the signal server.")
+    logbook.info(f"IP {request.client.host} (user: {request.state.auth.username}) has accessed the signal server.")
     return templates.TemplateResponse(
         request,
         "signals.html",
     )
 
 def make_new_signal(route, http_code, html_response, route_func):
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.write() as conn:
         cursor = conn.cursor()
         try:
             cursor.execute(
@@ -54,7 +53,7 @@ class mk_signal_data(BaseModel):
 @set_permission(permission="signal_server")
 async def mksignal(request: Request, signal: mk_signal_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)}) has made a new signal.")
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username}) has made a new signal.")
 
     if "/" in signal.signal_route or "\\" in signal.signal_route:
         return HTMLResponse(
@@ -67,7 +66,8 @@ async def mksignal(request: Request, signal: mk_signal_data):
             status_code=400,
         )
 
-    success = make_new_signal(
+    success = await database.run(
+        make_new_signal,
         route=signal.signal_route,
         http_code=signal.http_code,
         html_response=signal.html_response,
@@ -84,7 +84,7 @@ class SaveCodeSignalData(BaseModel):
     http_code: int
 
 def save_signal_code(signal_route: str, http_code: int):
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.write() as conn:
         cur = conn.cursor()
         try:
             cur.execute(
@@ -104,9 +104,9 @@ def save_signal_code(signal_route: str, http_code: int):
 @set_permission(permission="signal_server")
 async def route_signalcode_save(request: Request, signal: SaveCodeSignalData):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)}) has saved a signal for {signal.signal_route}.")
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username}) has saved a signal for {signal.signal_route}.")
 
-    success = save_signal_code(signal.signal_route, signal.http_code)
+    success = await database.run(save_signal_code, signal.signal_route, signal.http_code)
 
     return HTMLResponse(
         content="Success!" if success else "Failure! Couldn't save signal!",
@@ -114,7 +114,7 @@ async def route_signalcode_save(request: Request, signal: SaveCodeSignalData):
     )
 
 def save_html_response(signal_route: str, html_response: str):
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.write() as conn:
         cur = conn.cursor()
         try:
             cur.execute(
@@ -138,9 +138,9 @@ class SaveSignalData(BaseModel):
 @set_permission(permission="signal_server")
 async def route_save_html_response(request: Request, signal: SaveSignalData):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)}) Has saved the HTML response for {signal.signal_route} as:\n{signal.html_response}\n")
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username}) Has saved the HTML response for {signal.signal_route} as:\n{signal.html_response}\n")
 
-    success = save_html_response(signal.signal_route, signal.html_response)
+    success = await database.run(save_html_response, signal.signal_route, signal.html_response)
 
     return HTMLResponse(
         content="Success!" if success else "Failure! Couldn't save signal!",
@@ -148,7 +148,7 @@ async def route_save_html_response(request: Request, signal: SaveSignalData):
     )
 
 def get_route_response(route):
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.read() as conn:
         cur = conn.cursor()
         try:
             cur.execute(
@@ -166,7 +166,7 @@ def get_route_response(route):
     return {"http_code": data[0], "html_response": data[1], "route_func": data[2]} if data else None
 
 def get_signals_list():
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.read() as conn:
         cur = conn.cursor()
         try:
             cur.execute(
@@ -191,7 +191,7 @@ def get_signals_list():
     return sig_list
 
 def get_route_closed(route):
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.read() as conn:
         cur = conn.cursor()
         try:
             cur.execute(
@@ -212,9 +212,9 @@ def get_route_closed(route):
 @set_permission(permission="signal_server")
 async def list_signals(request: Request):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)}) has listed all routes.")
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username}) has listed all routes.")
 
-    data = get_signals_list()
+    data = await database.run(get_signals_list)
     return JSONResponse(
         content=data,
         status_code=200,
@@ -227,9 +227,9 @@ class loadSignalData(BaseModel):
 @set_permission(permission="signal_server")
 async def load_signal(request: Request, signal: loadSignalData):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)}) has loaded the signal {signal.signal_route}.")
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username}) has loaded the signal {signal.signal_route}.")
 
-    data = get_signals_list().get(signal.signal_route, None)
+    data = (await database.run(get_signals_list)).get(signal.signal_route, None)
 
     if not data:
         return JSONResponse(
@@ -259,7 +259,7 @@ def parse_placeholders(html_response:str, func_response:str="") -> str:
 async def read_route(request: Request, signal_route):
     logbook.info(f"IP {request.client.host} Is accessing signal route \"{signal_route}\"")
 
-    route_data = get_route_response(signal_route)
+    route_data = await database.run(get_route_response, signal_route)
 
     if not route_data:
         return HTMLResponse(
@@ -288,7 +288,7 @@ async def read_route(request: Request, signal_route):
                 status_code=500
             )
 
-    if get_route_closed(signal_route):
+    if await database.run(get_route_closed, signal_route):
         return HTMLResponse(
             content=f"Route {signal_route} is closed.",
             status_code=401
@@ -299,7 +299,7 @@ async def read_route(request: Request, signal_route):
     return HTMLResponse(content=html_response, status_code=route_data["http_code"] if func_code is None else func_code)
 
 def del_route(route):
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.write() as conn:
         cur = conn.cursor()
         try:
             cur.execute(
@@ -322,15 +322,15 @@ class del_data(BaseModel):
 @set_permission(permission="signal_server")
 async def delete_route(request: Request, data: del_data):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)}) Is deleting route \"{data.signal_route}\"")
-    success = del_route(data.signal_route)
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username}) Is deleting route \"{data.signal_route}\"")
+    success = await database.run(del_route, data.signal_route)
     return HTMLResponse(
         content="Deleted!" if success else "Failed to delete!",
         status_code=200 if success else 500,
     )
 
 def close_route(signal_route):
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.write() as conn:
         cur = conn.cursor()
         try:
             cur.execute(
@@ -350,9 +350,9 @@ def close_route(signal_route):
 @set_permission(permission="signal_server")
 async def route_close_route(request: Request, signal_route):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)} Closing route \"{signal_route}\"")
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username} Closing route \"{signal_route}\"")
 
-    success = close_route(signal_route)
+    success = await database.run(close_route, signal_route)
 
     return HTMLResponse(
         content="Closed!" if success else "Failed to close!",
@@ -360,7 +360,7 @@ async def route_close_route(request: Request, signal_route):
     )
 
 def open_route(signal_route):
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.write() as conn:
         cur = conn.cursor()
         try:
             cur.execute(
@@ -380,9 +380,9 @@ def open_route(signal_route):
 @set_permission(permission="signal_server")
 async def route_open_route(request: Request, signal_route):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)} opening route \"{signal_route}\"")
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username} opening route \"{signal_route}\"")
 
-    success = open_route(signal_route)
+    success = await database.run(open_route, signal_route)
 
     return HTMLResponse(
         content="Opened!" if success else "Failed to open!",
@@ -393,8 +393,8 @@ async def route_open_route(request: Request, signal_route):
 @set_permission(permission="signal_server")
 async def route_get_results(request: Request, signal_route):
     token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)}) is getting the data gathered or set by route function for \"{signal_route}\"")
-    route_data = get_route_response(signal_route)
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username}) is getting the data gathered or set by route function for \"{signal_route}\"")
+    route_data = await database.run(get_route_response, signal_route)
 
     if not route_data:
         return HTMLResponse(
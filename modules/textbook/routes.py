@@ -4,8 +4,7 @@ from library.authperms import set_permission
 from library.logbook import LogBookHandler
 from fastapi.responses import JSONResponse
 from library.auth import route_prechecks
-from library.database import DB_PATH
-from library.auth import authbook
+from library.database import database
 from pydantic import BaseModel
 import sqlite3
 import os
@@ -24,7 +23,7 @@ class LoadRequest(BaseModel):
     id: int
 
 def check_archive_exists(archive_id):
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.read() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "SELECT * FROM bulletin_archives WHERE archive_id = ?",
@@ -32,26 +31,15 @@ def check_archive_exists(archive_id):
         )
         return cursor.fetchone() is not None
 
-@router.get("/textbook")
-@set_permission(permission="bulletin_archives")
-async def load_index(request: Request):
-    token:str = route_prechecks(request)
-    logbook.info(f"IP {request.client.host} ({authbook.token_owner(token)}) has accessed the bulletins / tech memory section.")
-    return templates.TemplateResponse("index.html", {"request": request})
-
-# TODO: Need to change all "archive" to "textbook" later on.
-@set_permission(permission="bulletin_archives")
-@router.post("/api/archives/save")
-async def save_pdf(request: Request, data: SavePDFRequestWithID):
-    token:str = route_prechecks(request)
-    logged_user = authbook.token_owner(token)
-    logbook.info(f"IP {request.client.host} ({logged_user}) is saving a PDF to the archives.")
-
-    parsed_tags = ",".join(data.tags)
+def save_archive(archive_id, title: str, content: str, tags: list, owner: str):
+    """
+    Updates the archive if archive_id is given, otherwise inserts a new one. Returns the archive's id.
+    """
+    parsed_tags = ",".join(tags)
 
-    with sqlite3.connect(DB_PATH) as conn:
+    with database.write() as conn:
         cursor = conn.cursor()
-        if data.archive_id is not None:
+        if archive_id is not None:
             # Update the existing archive
             cursor.execute(
                 """
@@ -59,9 +47,8 @@ async def save_pdf(request: Request, data: SavePDFRequestWithID):
                 SET title = ?, content = ?, tags = ?
                 WHERE archive_id = ? AND owner = ?
                 """,
-                (data.title, data.content, parsed_tags, data.archive_id, logged_user)
+                (title, content, parsed_tags, archive_id, owner)
             )
-            archive_id = data.archive_id
         else:
             # Insert a new archive
             cursor.execute(
@@ -69,46 +56,78 @@ async def save_pdf(request: Request, data: SavePDFRequestWithID):
                 INSERT INTO bulletin_archives (title, content, owner, tags)
                 VALUES (?, ?, ?, ?)
                 """,
-                (data.title, data.content, logged_user, parsed_tags)
+                (title, content, owner, parsed_tags)
             )
             archive_id = cursor.lastrowid  # get new ID
+        conn.commit()
+    return archive_id
+
+def delete_archive(archive_id, owner: str):
+    with database.write() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM bulletin_archives WHERE archive_id = ? AND owner = ?",
+            (archive_id, owner)
+        )
+        conn.commit()
+
+def list_archives(owner: str):
+    with database.read() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT title, tags, archive_id FROM bulletin_archives WHERE owner = ?",
+            (owner,)
+        )
+        return cursor.fetchall()
+
+def load_archive(archive_id, owner: str):
+    with database.read() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT title, content, tags FROM bulletin_archives WHERE archive_id = ? AND owner = ?",
+            (archive_id, owner)
+        )
+        return cursor.fetchone()
+
+@router.get("/textbook")
+@set_permission(permission="bulletin_archives")
+async def load_index(request: Request):
+    token:str = route_prechecks(request)
+    logbook.info(f"IP {request.client.host} ({request.state.auth.username}) has accessed the bulletins / tech memory section.")
+    return templates.TemplateResponse("index.html", {"request": request})
+
+# TODO: Need to change all "archive" to "textbook" later on.
+@set_permission(permission="bulletin_archives")
+@router.post("/api/archives/save")
+async def save_pdf(request: Request, data: SavePDFRequestWithID):
+    token:str = route_prechecks(request)
+    logged_user = request.state.auth.username
+    logbook.info(f"IP {request.client.host} ({logged_user}) is saving a PDF to the archives.")
 
-    conn.commit()
+    archive_id = await database.run(save_archive, data.archive_id, data.title, data.content, data.tags, logged_user)
     return JSONResponse(content={"message": "PDF saved successfully.", "archive_id": archive_id})
 
 @set_permission(permission="bulletin_archives")
 @router.post("/api/archives/delete")
 async def del_pdf(data: LoadRequest, request: Request):
     token:str = route_prechecks(request)
-    logged_user = authbook.token_owner(token)
+    logged_user = request.state.auth.username
     logbook.info(f"IP {request.client.host} ({logged_user}) is deleting archive ID {data.id}.")
 
-    if check_archive_exists(data.id) is False:
+    if await database.run(check_archive_exists, data.id) is False:
         return JSONResponse(content={"message": None, "error": "Archive not found.", "success": False}, status_code=404)
 
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "DELETE FROM bulletin_archives WHERE archive_id = ? AND owner = ?",
-            (data.id, logged_user)
-        )
-        conn.commit()
-        return JSONResponse(content={"message": "PDF deleted successfully.", "error": None, "success": True}, status_code=200)
+    await database.run(delete_archive, data.id, logged_user)
+    return JSONResponse(content={"message": "PDF deleted successfully.", "error": None, "success": True}, status_code=200)
 
 @set_permission(permission="bulletin_archives")
 @router.get("/api/archives/get_all")
 async def get_all_pdfs(request: Request):
     token:str = route_prechecks(request)
-    logged_user = authbook.token_owner(token)
+    logged_user = request.state.auth.username
     logbook.info(f"IP {request.client.host} ({logged_user}) requested all PDF names in the archives.")
 
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT title, tags, archive_id FROM bulletin_archives WHERE owner = ?",
-            (logged_user,)
-        )
-        data = cursor.fetchall()
+    data = await database.run(list_archives, logged_user)
 
     pdfs = []
     tags_and_names = {}
@@ -133,16 +152,10 @@ async def get_all_pdfs(request: Request):
 @router.post("/api/archives/load")
 async def load_pdf(data: LoadRequest, request: Request):
     token:str = route_prechecks(request)
-    logged_user = authbook.token_owner(token)
+    logged_user = request.state.auth.username
     logbook.info(f"IP {request.client.host} ({logged_user}) is loading archive ID {data.id}.")
 
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT title, content, tags FROM bulletin_archives WHERE archive_id = ? AND owner = ?",
-            (data.id, logged_user)
-        )
-        row = cursor.fetchone()
+    row = await database.run(load_archive, data.id, logged_user)
 
     if row:
         parsed_tags = row[2].split(" ")